@@ -0,0 +1,97 @@
+"""
+Deterministic synthetic corpus and queries used by the benchmarks.
+"""
+
+import random
+
+from llama_index.core.schema import Document
+
+TOPICS = {
+    "billing": "invoice payment refund credit card charge subscription plan renewal",
+    "shipping": "delivery courier tracking parcel warehouse customs address dispatch",
+    "security": "password authentication token encryption access audit breach policy",
+    "onboarding": "account setup welcome tutorial profile workspace invitation team",
+    "hardware": "device battery firmware sensor cable charger warranty replacement",
+    "reporting": "dashboard export chart metric quarter revenue forecast analysis",
+}
+
+FILLER = (
+    "the a of to and in for with on by this that is are be as at from it "
+    "customer service product support request document section page note"
+).split()
+
+QUERIES = [
+    "How do I get a refund for a duplicate card charge?",
+    "Where can I track the delivery of my parcel?",
+    "What is the password policy for team accounts?",
+    "How do I invite a new member to my workspace?",
+    "Is a battery replacement covered by the warranty?",
+    "How can I export the quarterly revenue dashboard?",
+    "SKU-4821-B",
+    "firmware update",
+]
+
+
+def generate_text(rng: random.Random, topic: str, words: int) -> str:
+    """
+    Generate a paragraph mixing the words of a topic with filler words.
+
+    Args:
+        rng(random.Random): The seeded random generator.
+        topic(str): The topic of the paragraph.
+        words(int): The number of words to generate.
+
+    Returns:
+        (str): The paragraph.
+    """
+    vocabulary = TOPICS[topic].split()
+    return " ".join(
+        rng.choice(vocabulary) if rng.random() < 0.4 else rng.choice(FILLER)
+        for _ in range(words)
+    )
+
+
+def generate_documents(count: int, words: int = 150, seed: int = 42) -> list[Document]:
+    """
+    Generate chunk-sized documents spread across every topic.
+
+    Args:
+        count(int): The number of documents.
+        words(int): The number of words per document.
+        seed(int): The seed of the random generator.
+
+    Returns:
+        (list[Document]): The documents.
+    """
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    documents = []
+    for index in range(count):
+        topic = topics[index % len(topics)]
+        documents.append(
+            Document(
+                text=generate_text(rng, topic, words),
+                metadata={"filename": f"{topic}-{index}.txt", "topic": topic},
+                doc_id=f"doc-{index}",
+            )
+        )
+    return documents
+
+
+def generate_file_content(paragraphs: int, seed: int = 42) -> str:
+    """
+    Generate the content of a text file to ingest.
+
+    Args:
+        paragraphs(int): The number of paragraphs.
+        seed(int): The seed of the random generator.
+
+    Returns:
+        (str): The file content.
+    """
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    return "\n\n".join(
+        generate_text(rng, topics[index % len(topics)], 120)
+        for index in range(paragraphs)
+    )
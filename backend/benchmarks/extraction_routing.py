@@ -0,0 +1,256 @@
+"""
+Comparison of the extraction of every file by Unstructured with the `auto` strategy and of the
+routing of `services/extractors.py`: the text formats parsed in process, the PDFs with a text
+layer partitioned with `fast` and only the scanned ones with `hi_res`. The simulated API takes
+`--round-trip` seconds per request, plus a latency per page of a PDF that depends on the
+strategy: with `auto`, `--auto-page-latency` for a PDF with a text layer, by default the one of
+the layout model of `hi_res`, and the latency of `hi_res` for a scanned one, which needs the
+OCR anyway. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.extraction_routing
+    PYTHONPATH=./src python -m benchmarks.extraction_routing --auto-page-latency 0.1 \
+        --output data/benchmarks/extraction_routing.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from llama_index.core.schema import Document
+from llama_index.core.utils import get_tokenizer
+from pydantic import BaseModel
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    FloatObject,
+    NameObject,
+)
+
+from benchmarks.corpus import generate_documents
+from benchmarks.fakes import configure_offline_environment
+
+
+class FileResult(BaseModel):
+    """
+    Time taken to extract a file, by Unstructured and through the router.
+
+    Attributes:
+        file(str): The name of the file.
+        route(str): The extractor and strategy chosen by the router.
+        reason(str): Why the route was chosen.
+        chunks(int): The chunks extracted through the router.
+        unstructured_ms(float): The time of the extraction by Unstructured with `auto`.
+        routed_ms(float): The time of the extraction through the router.
+        saved_ms(float): The time saved by the router.
+    """
+
+    file: str
+    route: str
+    reason: str
+    chunks: int
+    unstructured_ms: float
+    routed_ms: float
+    saved_ms: float
+
+
+class SimulatedUnstructured:
+    """
+    Unstructured API answering after a round trip, plus a latency per page of a PDF that
+    depends on the strategy, and for `auto` on whether the PDF has a text layer.
+    """
+
+    def __init__(self, round_trip: float, page_latencies: dict[str, float]):
+        self.round_trip = round_trip
+        self.page_latencies = page_latencies
+
+    def reader(self, **kwargs: Any) -> "SimulatedUnstructured":
+        return self
+
+    def load_data(
+        self, unstructured_kwargs: dict[str, Any], **kwargs: Any
+    ) -> list[Document]:
+        from services.lanes import inspect_pdf
+
+        file = unstructured_kwargs["file"]
+        filename = unstructured_kwargs["metadata_filename"]
+        pages = len(PdfReader(file).pages) if filename.endswith(".pdf") else 0
+        strategy = unstructured_kwargs["strategy"]
+        if strategy == "auto" and pages and not inspect_pdf(file)[1]:
+            strategy = "hi_res"
+        time.sleep(self.round_trip + self.page_latencies[strategy] * pages)
+        return [Document(text=f"Text of {filename}", metadata={"filename": filename})]
+
+
+def write_pdf(file_path: Path, pages: int, text: bool) -> None:
+    """
+    Write a PDF of letter pages, with a line of text on every page or blank like a scan.
+
+    Args:
+        file_path(Path): The PDF.
+        pages(int): The pages of the PDF.
+        text(bool): Whether the pages have a text layer.
+    """
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    for page_number in range(1, pages + 1):
+        page = writer.add_blank_page(612, 792)
+        if not text:
+            continue
+        content = DecodedStreamObject()
+        content.set_data(
+            f"BT /F1 12 Tf 72 720 Td (Page {page_number} of the report) Tj ET".encode()
+        )
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        page[NameObject("/MediaBox")] = ArrayObject(
+            [FloatObject(0), FloatObject(0), FloatObject(612), FloatObject(792)]
+        )
+    writer.write(file_path)
+
+
+def write_files(directory: Path, pages: int) -> list[Path]:
+    """
+    Write a file of every routed format, from the benchmark corpus.
+
+    Args:
+        directory(Path): The folder of the files.
+        pages(int): The pages of the PDFs.
+
+    Returns:
+        (list[Path]): The files.
+    """
+    texts = [document.text for document in generate_documents(60)]
+    files = {
+        "notes.txt": "\n\n".join(texts),
+        "guide.md": "\n\n".join(
+            f"## Section {index}\n\n{text}" for index, text in enumerate(texts)
+        ),
+        "table.csv": "id,text\n"
+        + "".join(f'{index},"{text}"\n' for index, text in enumerate(texts)),
+        "page.html": "<html><body>"
+        + "".join(
+            f"<h2>Section {index}</h2><p>{text}</p>" for index, text in enumerate(texts)
+        )
+        + "</body></html>",
+    }
+    paths: list[Path] = []
+    for name, content in files.items():
+        (directory / name).write_text(content)
+        paths.append(directory / name)
+    for name, text in (("report.pdf", True), ("scan.pdf", False)):
+        write_pdf(directory / name, pages, text)
+        paths.append(directory / name)
+    return paths
+
+
+def extract(file_path: Path, routed: bool) -> tuple[float, Any]:
+    """
+    Extract a file through the router or with Unstructured only.
+
+    Args:
+        file_path(Path): The file.
+        routed(bool): Whether the router is enabled.
+
+    Returns:
+        (tuple[float, Any]): The time of the extraction in milliseconds, and its report.
+    """
+    from services.files import TextExtractor
+    from utils.config import get_config
+
+    os.environ["EXTRACTION_ROUTER_ENABLED"] = str(routed).lower()
+    get_config.cache_clear()
+    started_at = time.perf_counter()
+    _, report = TextExtractor().extract_file(file_path)
+    return (time.perf_counter() - started_at) * 1000, report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--round-trip", type=float, default=0.3)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--fast-page-latency", type=float, default=0.02)
+    parser.add_argument("--hi-res-page-latency", type=float, default=0.5)
+    parser.add_argument("--auto-page-latency", type=float, default=0.5)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    os.environ["PDF_SPLIT_MIN_PAGES"] = "0"
+    api = SimulatedUnstructured(
+        args.round_trip,
+        {
+            "fast": args.fast_page_latency,
+            "hi_res": args.hi_res_page_latency,
+            "auto": args.auto_page_latency,
+        },
+    )
+
+    # Load the tokenizer of the chunker outside of the measures
+    get_tokenizer()
+    results: list[FileResult] = []
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        patch("services.files.UnstructuredReader", api.reader),
+    ):
+        for file_path in write_files(Path(directory), args.pages):
+            unstructured_ms, _ = extract(file_path, routed=False)
+            routed_ms, report = extract(file_path, routed=True)
+            results.append(
+                FileResult(
+                    file=file_path.name,
+                    route=f"{report.extractor}/{report.strategy or 'none'}",
+                    reason=report.reason,
+                    chunks=report.chunks,
+                    unstructured_ms=round(unstructured_ms, 1),
+                    routed_ms=round(routed_ms, 1),
+                    saved_ms=round(unstructured_ms - routed_ms, 1),
+                )
+            )
+
+    print(
+        f"{'file':<12}{'route':<20}{'reason':<13}{'chunks':>7}{'auto ms':>10}"
+        f"{'routed ms':>11}{'saved ms':>10}"
+    )
+    for result in results:
+        print(
+            f"{result.file:<12}{result.route:<20}{result.reason:<13}{result.chunks:>7}"
+            f"{result.unstructured_ms:>10.1f}{result.routed_ms:>11.1f}"
+            f"{result.saved_ms:>10.1f}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "round_trip": args.round_trip,
+                    "pages": args.pages,
+                    "page_latencies": api.page_latencies,
+                    "results": [result.model_dump() for result in results],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,675 @@
+"""
+Deterministic, offline stand-ins for the external services used by the application.
+Every fake sleeps for a configurable amount of time to mimic the network latency
+of the real service, so the benchmarks measure our own overhead plus a known,
+reproducible latency.
+"""
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections.abc import Iterator, Sequence
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, Document
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from pydantic import BaseModel, Field, PrivateAttr
+
+OFFLINE_ENVIRONMENT = {
+    "UNSTRUCTURED_URL": "http://unstructured.offline/general/v0/general",
+    "UNSTRUCTURED_API_KEY": "offline",
+    "WEAVIATE_HOST": "weaviate.offline",
+    "WEAVIATE_PORT": "8080",
+    "WEAVIATE_GRPC_PORT": "50051",
+    "AZURE_OPENAI_API_KEY": "offline",
+    "AZURE_OPENAI_ENDPOINT": "http://azure-openai.offline",
+    "AZURE_OPENAI_EMBEDDINGS_MODEL": "fake-embeddings",
+    "AZURE_OPENAI_LLM_MODEL": "fake-llm",
+    "OPENAI_API_KEY": "offline",
+    "OPENAI_EMBEDDINGS_MODEL": "fake-embeddings",
+    "OPENAI_LLM_MODEL": "fake-llm",
+    "STORAGE_ACCESS_KEY": "offline",
+    "STORAGE_SECRET_KEY": "offline",
+    "STORAGE_BUCKET": "files",
+    "STORAGE_ENDPOINT_URL": "http://minio.offline:9000",
+    "TEMPORAL_HOST": "temporal.offline:7233",
+    "TEMPORAL_NAMESPACE": "default",
+    "TEMPORAL_QUEUE": "offline-queue",
+}
+
+EMBEDDING_DIMENSIONS = 256
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class OfflineLatency(BaseModel):
+    """
+    Artificial latency, in seconds, added to every call of the fake services.
+
+    Attributes:
+        llm(float): Latency of a chat completion.
+        embedding(float): Latency of an embedding request.
+        vector_store(float): Latency of a vector store query or insert.
+        extraction(float): Latency of an Unstructured partition request.
+        blob(float): Latency of a blob storage upload or download.
+        workflow(float): Latency of starting a Temporal workflow.
+    """
+
+    llm: float = 0.05
+    embedding: float = 0.01
+    vector_store: float = 0.005
+    extraction: float = 0.05
+    blob: float = 0.005
+    workflow: float = 0.005
+
+
+def _sleep(seconds: float) -> None:
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list[float]:
+    """
+    Build a deterministic, normalized bag-of-words embedding for a text.
+    Texts sharing words get similar vectors, so retrieval stays meaningful.
+
+    Args:
+        text(str): The text to embed.
+        dimensions(int): The number of dimensions of the vector.
+
+    Returns:
+        (list[float]): The embedding.
+    """
+    vector = [0.0] * dimensions
+    for token in _tokenize(text):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Stand-in for `AzureOpenAIEmbedding`.
+
+    Attributes:
+        latency(float): Seconds slept on every request.
+    """
+
+    latency: float = 0.0
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        _sleep(self.latency)
+        return fake_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        _sleep(self.latency)
+        return fake_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        # A single request per batch, like the real API
+        _sleep(self.latency)
+        return [fake_embedding(text) for text in texts]
+
+
+def _matches(metadata: dict[str, Any], filters: MetadataFilters) -> bool:
+    """
+    Check node metadata against LlamaIndex metadata filters, as Weaviate would.
+
+    Args:
+        metadata(dict[str, Any]): The metadata of the node.
+        filters(MetadataFilters): The filters.
+
+    Returns:
+        (bool): Whether the node matches.
+    """
+    results = []
+    for metadata_filter in filters.filters:
+        if isinstance(metadata_filter, MetadataFilters):
+            results.append(_matches(metadata, metadata_filter))
+            continue
+        value = metadata.get(metadata_filter.key)
+        expected = metadata_filter.value
+        operator = str(
+            getattr(metadata_filter.operator, "value", metadata_filter.operator)
+        )
+        if value is None:
+            results.append(False)
+        elif operator == "any":
+            results.append(value in (expected or []))
+        elif operator == ">=":
+            results.append(value >= expected)
+        elif operator == ">":
+            results.append(value > expected)
+        elif operator == "<=":
+            results.append(value <= expected)
+        elif operator == "<":
+            results.append(value < expected)
+        elif operator == "!=":
+            results.append(value != expected)
+        else:
+            results.append(value == expected)
+    condition = str(getattr(filters.condition, "value", filters.condition))
+    return any(results) if condition == "or" else all(results)
+
+
+class FakeVectorStore(BasePydanticVectorStore):
+    """
+    In-memory stand-in for `WeaviateVectorStore` supporting the vector, BM25-like and hybrid modes.
+
+    Attributes:
+        latency(float): Seconds slept on every query or insert.
+    """
+
+    stores_text: bool = True
+    latency: float = 0.0
+    _nodes: dict[str, BaseNode] = PrivateAttr(default_factory=dict)
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> list[str]:
+        _sleep(self.latency)
+        for node in nodes:
+            self._nodes[node.node_id] = node
+        return [node.node_id for node in nodes]
+
+    def get_nodes(self) -> list[BaseNode]:
+        return list(self._nodes.values())
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._nodes = {
+            node_id: node
+            for node_id, node in self._nodes.items()
+            if node.ref_doc_id != ref_doc_id
+        }
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        _sleep(self.latency)
+        mode = str(getattr(query.mode, "value", query.mode))
+        alpha = query.alpha if query.alpha is not None else 0.5
+        query_tokens = set(_tokenize(query.query_str or ""))
+
+        scored = []
+        for node in self._nodes.values():
+            if query.filters is not None and not _matches(node.metadata, query.filters):
+                continue
+            vector_score = 0.0
+            if query.query_embedding is not None and node.embedding is not None:
+                vector_score = sum(
+                    a * b
+                    for a, b in zip(query.query_embedding, node.embedding, strict=False)
+                )
+            keyword_score = 0.0
+            if query_tokens:
+                node_tokens = set(_tokenize(node.get_content()))
+                keyword_score = len(query_tokens & node_tokens) / len(query_tokens)
+
+            if mode == "text_search":
+                score = keyword_score
+            elif mode == "hybrid":
+                score = alpha * vector_score + (1 - alpha) * keyword_score
+            else:
+                score = vector_score
+            scored.append((score, node))
+
+        scored.sort(key=lambda item: (-item[0], item[1].node_id))
+        top = scored[: query.similarity_top_k]
+        return VectorStoreQueryResult(
+            nodes=[node for _, node in top],
+            similarities=[score for score, _ in top],
+            ids=[node.node_id for _, node in top],
+        )
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Stand-in for `AzureChatOpenAI` and `ChatOllama`.
+    When tools are bound, it first asks for the retriever tool and then answers, unless an
+    earlier turn of the conversation retrieved documents already.
+    Structured outputs are filled with deterministic values.
+
+    Attributes:
+        latency(float): Seconds slept on every completion.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        _sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        last_message = messages[-1]
+        schema = kwargs.get("structured_output_schema")
+
+        if schema is not None:
+            message = AIMessage(content=json.dumps(self.__fill_schema(schema)))
+        elif kwargs.get("tools") and not any(
+            isinstance(message, ToolMessage) for message in messages
+        ):
+            tool_name = kwargs["tools"][0]["function"]["name"]
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": tool_name,
+                        "args": {"query": str(last_message.content)},
+                        "id": f"call_{uuid.uuid5(uuid.NAMESPACE_OID, prompt).hex[:12]}",
+                    }
+                ],
+            )
+        else:
+            digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+            message = AIMessage(
+                content=f"Offline answer {digest} based on {len(prompt)} characters of context."
+            )
+
+        prompt_tokens = len(_tokenize(prompt))
+        completion_tokens = len(_tokenize(str(message.content))) or 1
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                "model_name": self._llm_type,
+            },
+        )
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):  # type: ignore[override]
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):  # type: ignore[override]
+        return self.bind(structured_output_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+    @staticmethod
+    def __fill_schema(schema: type[BaseModel]) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        for name, field in schema.model_fields.items():
+            if field.annotation is bool:
+                values[name] = True
+            elif field.annotation in (int, float):
+                values[name] = 1
+            else:
+                values[name] = "offline"
+        return values
+
+
+class FakeDocumentService:
+    """
+    Stand-in for the `DocumentService` lookups of the near-duplicate detection,
+    reading the nodes of a `FakeVectorStore`.
+    """
+
+    def __init__(self, vector_store: FakeVectorStore):
+        self.vector_store = vector_store
+
+    def get_documents_matching_any(
+        self,
+        property_name: str,
+        values: list[str],
+        fields: list[str] | None = None,
+        include_text: bool = False,
+        limit: int = 1000,
+    ) -> list[SimpleNamespace]:
+        _sleep(self.vector_store.latency)
+        wanted = set(values)
+        return [
+            SimpleNamespace(
+                uuid=node.node_id,
+                properties={**node.metadata, "text": node.get_content()},
+            )
+            for node in self.vector_store.get_nodes()
+            if wanted & set(node.metadata.get(property_name) or [])
+        ][:limit]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeUnstructuredReader:
+    """
+    Stand-in for the `UnstructuredReader` pointing to the Unstructured API.
+    It reads the file, or the stream of `unstructured_kwargs`, as text and splits it into
+    chunks of `max_chunk_size` characters.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        self.latency = latency
+
+    def load_data(
+        self,
+        file: Path | None = None,
+        unstructured_kwargs: dict[str, Any] | None = None,
+        split_documents: bool = True,
+        **kwargs: Any,
+    ) -> list[Document]:
+        _sleep(self.latency)
+        unstructured_kwargs = unstructured_kwargs or {}
+        chunk_size = unstructured_kwargs.get("max_chunk_size", 1000)
+        if file is None:
+            content = unstructured_kwargs["file"].read()
+            filename = unstructured_kwargs["metadata_filename"]
+        else:
+            content = Path(file).read_bytes()
+            filename = Path(file).name
+        text = content.decode(errors="ignore")
+        chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+        return [
+            Document(
+                text=chunk,
+                metadata={
+                    "filename": filename,
+                    "chunk_index": index,
+                },
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+
+
+class FakeBlobClient:
+    """
+    In-memory stand-in for the boto3 S3 client.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.metadata: dict[tuple[str, str], dict[str, str]] = {}
+
+    def upload_file(
+        self,
+        file_path: str,
+        bucket: str,
+        object_key: str,
+        ExtraArgs: dict[str, Any] | None = None,
+    ) -> None:
+        _sleep(self.latency)
+        self.objects[(bucket, object_key)] = Path(file_path).read_bytes()
+        self.metadata[(bucket, object_key)] = (ExtraArgs or {}).get("Metadata", {})
+
+    def head_object(self, Bucket: str, Key: str) -> dict[str, Any]:
+        _sleep(self.latency)
+        if (Bucket, Key) not in self.objects:
+            raise FileNotFoundError(f"{Bucket}/{Key}")
+        return {
+            "LastModified": datetime.datetime.now(datetime.UTC),
+            "Metadata": self.metadata.get((Bucket, Key), {}),
+        }
+
+    def upload_fileobj(self, file_obj: Any, bucket: str, object_key: str) -> None:
+        _sleep(self.latency)
+        self.objects[(bucket, object_key)] = file_obj.read()
+
+    def download_fileobj(self, bucket: str, object_key: str, file_obj: Any) -> None:
+        _sleep(self.latency)
+        file_obj.write(self.objects[(bucket, object_key)])
+
+
+class FakeWorkflowHandle:
+    """
+    Stand-in for a Temporal workflow handle: the started workflows run until they are
+    completed with `FakeTemporalClient.complete`.
+    """
+
+    def __init__(
+        self,
+        client: "FakeTemporalClient",
+        workflow_id: str,
+        result_type: type | None = None,
+    ):
+        self.client = client
+        self.workflow_id = workflow_id
+        self.result_type = result_type
+
+    async def describe(self) -> SimpleNamespace:
+        from temporalio.client import WorkflowExecutionStatus
+        from temporalio.service import RPCError, RPCStatusCode
+
+        _sleep(self.client.latency)
+        if not any(
+            started.get("id") == self.workflow_id
+            for started in self.client.started_workflows
+        ):
+            raise RPCError("workflow not found", RPCStatusCode.NOT_FOUND, b"")
+        if self.workflow_id in self.client.results:
+            return SimpleNamespace(status=WorkflowExecutionStatus.COMPLETED)
+        return SimpleNamespace(status=WorkflowExecutionStatus.RUNNING)
+
+    async def result(self) -> Any:
+        _sleep(self.client.latency)
+        result = self.client.results[self.workflow_id]
+        if isinstance(self.result_type, type) and issubclass(
+            self.result_type, BaseModel
+        ):
+            # Like the data converter, the result is decoded into the type of the handle
+            return self.result_type.model_validate(result)
+        return result
+
+
+class FakeTemporalClient:
+    """
+    Stand-in for the Temporal client that records the started workflows, and the results of
+    the completed ones.
+    """
+
+    started_workflows: list[dict[str, Any]] = []
+    results: dict[str, Any] = {}
+    latency: float = 0.0
+
+    @classmethod
+    async def connect(cls, *args: Any, **kwargs: Any) -> "FakeTemporalClient":
+        return cls()
+
+    async def start_workflow(self, workflow: Any, arg: Any, **kwargs: Any) -> None:
+        _sleep(self.latency)
+        self.started_workflows.append({"arg": arg, **kwargs})
+
+    def get_workflow_handle(
+        self, workflow_id: str, result_type: type | None = None, **kwargs: Any
+    ) -> FakeWorkflowHandle:
+        return FakeWorkflowHandle(self, workflow_id, result_type)
+
+    def complete(self, workflow_id: str, result: Any) -> None:
+        self.results[workflow_id] = result
+
+    async def count_workflows(self, query: str, **kwargs: Any) -> SimpleNamespace:
+        _sleep(self.latency)
+        # The workflows not completed are all running, counted in their queue
+        return SimpleNamespace(
+            count=sum(
+                f'TaskQueue="{started.get("task_queue")}"' in query
+                for started in self.started_workflows
+                if started.get("id") not in self.results
+            )
+        )
+
+
+class OfflineServices(BaseModel):
+    """
+    Handle on the fakes installed by `offline_services`, to seed or inspect them.
+
+    Attributes:
+        latency(OfflineLatency): The configured latency.
+        vector_stores(dict[str, FakeVectorStore]): The vector stores by index name.
+        blob_client(FakeBlobClient): The blob storage client.
+    """
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    latency: OfflineLatency
+    vector_stores: dict[str, FakeVectorStore] = Field(default_factory=dict)
+    blob_client: FakeBlobClient
+
+    def vector_store(self, index_name: str) -> FakeVectorStore:
+        """
+        Get, or create, the vector store of an index.
+
+        Args:
+            index_name(str): The name of the index.
+
+        Returns:
+            (FakeVectorStore): The vector store.
+        """
+        if index_name not in self.vector_stores:
+            self.vector_stores[index_name] = FakeVectorStore(
+                latency=self.latency.vector_store
+            )
+        return self.vector_stores[index_name]
+
+
+def configure_offline_environment() -> None:
+    """
+    Fill the required settings with offline values, keeping any value already set.
+    """
+    for key, value in OFFLINE_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+
+
+@contextmanager
+def temporary_working_directory() -> Iterator[Path]:
+    """
+    Run in a temporary folder, removed on exit, so the files the application writes under
+    `./data` (uploads, conversation checkpoints, query logs) do not pile up in the backend.
+
+    Yields:
+        (Path): The temporary folder.
+    """
+    previous = Path.cwd()
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as directory:
+        os.chdir(directory)
+        try:
+            yield Path(directory)
+        finally:
+            os.chdir(previous)
+
+
+@contextmanager
+def offline_services(
+    latency: OfflineLatency | None = None,
+) -> Iterator[OfflineServices]:
+    """
+    Replace every external service used by the application with its fake.
+
+    Args:
+        latency(OfflineLatency | None): The artificial latency of the fakes.
+
+    Yields:
+        (OfflineServices): Handle on the installed fakes.
+    """
+    configure_offline_environment()
+    latency = latency or OfflineLatency()
+    services = OfflineServices(
+        latency=latency,
+        blob_client=FakeBlobClient(latency=latency.blob),
+    )
+    FakeTemporalClient.latency = latency.workflow
+
+    def boto_session(**kwargs: Any) -> SimpleNamespace:
+        return SimpleNamespace(client=lambda **_: services.blob_client)
+
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch(
+                "services.embeddings.connect_to_local",
+                lambda **kwargs: SimpleNamespace(offline=True),
+            )
+        )
+        stack.enter_context(
+            patch(
+                "services.embeddings.ensure_collection", lambda *args, **kwargs: False
+            )
+        )
+        stack.enter_context(
+            patch(
+                "services.embeddings.resolve_index_name",
+                lambda client, index_name: index_name,
+            )
+        )
+        stack.enter_context(
+            patch(
+                "services.embeddings.WeaviateVectorStore",
+                lambda weaviate_client, index_name, **kwargs: services.vector_store(
+                    index_name
+                ),
+            )
+        )
+        stack.enter_context(
+            patch(
+                "services.dedup.DocumentService",
+                lambda index_name, **kwargs: FakeDocumentService(
+                    services.vector_store(index_name)
+                ),
+            )
+        )
+        stack.enter_context(
+            patch(
+                "services.embeddings.AzureOpenAIEmbedding",
+                lambda **kwargs: FakeEmbedding(latency=latency.embedding),
+            )
+        )
+        for chat_model in ("AzureChatOpenAI", "ChatOllama"):
+            stack.enter_context(
+                patch(
+                    f"services.llms.{chat_model}",
+                    lambda **kwargs: FakeChatModel(
+                        latency=latency.llm, callbacks=kwargs.get("callbacks")
+                    ),
+                )
+            )
+        stack.enter_context(
+            patch(
+                "services.files.UnstructuredReader",
+                lambda **kwargs: FakeUnstructuredReader(latency=latency.extraction),
+            )
+        )
+        stack.enter_context(
+            patch("services.files.boto3", SimpleNamespace(Session=boto_session))
+        )
+        stack.enter_context(
+            patch("temporalio.client.Client", FakeTemporalClient),
+        )
+        yield services
@@ -0,0 +1,462 @@
+"""
+Load generator for the FastAPI service.
+
+It replays a captured query log (see `QUERY_LOG_ENABLED`) or a synthetic mix of requests
+at several concurrency levels, against a running server or in-process against the offline fakes.
+Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.load --offline --concurrency 10 50 200
+    PYTHONPATH=./src python -m benchmarks.load --target http://localhost:8000 \\
+        --log data/query_logs/queries.jsonl --arrival replay --speed 2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Literal
+
+import httpx
+from pydantic import BaseModel
+
+from benchmarks.corpus import QUERIES, generate_documents, generate_file_content
+from benchmarks.fakes import (
+    OfflineLatency,
+    offline_services,
+    temporary_working_directory,
+)
+from benchmarks.run import percentile
+
+ENDPOINTS = {
+    "simple": "/v1/query/simple",
+    "agentic": "/v1/query/agentic",
+    "documents": "/v1/query/documents",
+    "embed": "/v1/embed/file",
+}
+
+DEFAULT_MIX = {"simple": 0.6, "agentic": 0.2, "documents": 0.15, "embed": 0.05}
+
+
+class LoadRequest(BaseModel):
+    """
+    A request to send to the service.
+
+    Attributes:
+        path(str): The path of the endpoint.
+        params(dict[str, str]): The query string parameters.
+        query(str | None): The user query, sent as JSON body when there is no body.
+        body(dict[str, Any] | None): The JSON body of a replayed request.
+        upload(bool): Whether to upload a file instead of sending a query.
+        offset(float): Seconds since the first request of the log, used by the replay arrival.
+    """
+
+    path: str
+    params: dict[str, str] = {}
+    query: str | None = None
+    body: dict[str, Any] | None = None
+    upload: bool = False
+    offset: float = 0.0
+
+
+class LevelResult(BaseModel):
+    """
+    Result of the load test at one concurrency level.
+
+    Attributes:
+        concurrency(int): The maximum number of in-flight requests.
+        requests(int): The number of sent requests.
+        errors(int): The number of failed requests (transport errors or 5xx).
+        error_rate(float): The ratio of failed requests.
+        p50_ms(float): The median latency in milliseconds.
+        p95_ms(float): The 95th percentile latency in milliseconds.
+        p99_ms(float): The 99th percentile latency in milliseconds.
+        throughput_per_second(float): The number of completed requests per second.
+        endpoints(dict[str, dict[str, float]]): The latency percentiles and errors per endpoint.
+    """
+
+    concurrency: int
+    requests: int
+    errors: int
+    error_rate: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput_per_second: float
+    endpoints: dict[str, dict[str, float]]
+
+
+class LoadReport(BaseModel):
+    """
+    Machine-readable report of a load test.
+
+    Attributes:
+        metadata(dict): The settings of the load test.
+        levels(list[LevelResult]): The result of every concurrency level.
+        saturation_concurrency(int | None): The concurrency after which throughput stops scaling.
+    """
+
+    metadata: dict
+    levels: list[LevelResult]
+    saturation_concurrency: int | None
+
+
+def requests_from_log(file_path: Path) -> list[LoadRequest]:
+    """
+    Load the requests captured in a query log.
+
+    Args:
+        file_path(Path): The JSONL query log.
+
+    Returns:
+        (list[LoadRequest]): The requests, in their original order.
+    """
+    entries = [
+        json.loads(line) for line in file_path.read_text().splitlines() if line.strip()
+    ]
+    if not entries:
+        return []
+    started_at = datetime.fromisoformat(entries[0]["timestamp"])
+    return [
+        LoadRequest(
+            path=entry["path"],
+            params=entry.get("params", {}),
+            # The logs captured before the bodies were logged only hold the query
+            query=entry.get("query", ""),
+            body=entry.get("body"),
+            offset=(
+                datetime.fromisoformat(entry["timestamp"]) - started_at
+            ).total_seconds(),
+        )
+        for entry in entries
+    ]
+
+
+def synthetic_requests(
+    mix: dict[str, float],
+    count: int,
+    seed: int = 42,
+) -> list[LoadRequest]:
+    """
+    Generate a synthetic mix of requests.
+
+    Args:
+        mix(dict[str, float]): The weight of each endpoint, keyed by the names in `ENDPOINTS`.
+        count(int): The number of requests.
+        seed(int): The seed of the random generator.
+
+    Returns:
+        (list[LoadRequest]): The requests.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    requests = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        requests.append(
+            LoadRequest(
+                path=ENDPOINTS[name],
+                query=None if name == "embed" else rng.choice(QUERIES),
+                upload=name == "embed",
+            )
+        )
+    return requests
+
+
+async def send(
+    client: httpx.AsyncClient,
+    request: LoadRequest,
+    file_content: bytes,
+) -> tuple[float, bool]:
+    """
+    Send a request and time it.
+
+    Args:
+        client(httpx.AsyncClient): The HTTP client.
+        request(LoadRequest): The request to send.
+        file_content(bytes): The content of the uploaded files.
+
+    Returns:
+        (tuple[float, bool]): The latency in seconds and whether the request failed.
+    """
+    started_at = time.perf_counter()
+    try:
+        if request.upload:
+            response = await client.post(
+                request.path,
+                params=request.params,
+                files={"file": (f"load-{random.getrandbits(32)}.txt", file_content)},
+            )
+        else:
+            response = await client.post(
+                request.path,
+                params=request.params,
+                json=request.body
+                if request.body is not None
+                else {"query": request.query},
+            )
+        failed = response.status_code >= 500
+    except httpx.HTTPError:
+        failed = True
+    return time.perf_counter() - started_at, failed
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    requests: list[LoadRequest],
+    concurrency: int,
+    arrival: Literal["closed", "poisson", "replay"],
+    rate: float,
+    speed: float,
+    file_content: bytes,
+) -> LevelResult:
+    """
+    Run the requests with at most `concurrency` requests in flight.
+
+    Args:
+        client(httpx.AsyncClient): The HTTP client.
+        requests(list[LoadRequest]): The requests to send.
+        concurrency(int): The maximum number of in-flight requests.
+        arrival(str): `closed` sends a new request as soon as one finishes, `poisson` sends
+            requests at `rate` per second, `replay` keeps the original timing of the log.
+        rate(float): The mean arrival rate for the `poisson` arrival.
+        speed(float): The replay speed factor for the `replay` arrival.
+        file_content(bytes): The content of the uploaded files.
+
+    Returns:
+        (LevelResult): The result of the level.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[tuple[str, float, bool]] = []
+    rng = random.Random(concurrency)
+
+    async def worker(request: LoadRequest) -> None:
+        async with semaphore:
+            latency, failed = await send(client, request, file_content)
+        samples.append((request.path, latency, failed))
+
+    started_at = time.perf_counter()
+    tasks = []
+    for request in requests:
+        if arrival == "poisson":
+            await asyncio.sleep(rng.expovariate(rate))
+        elif arrival == "replay":
+            delay = request.offset / speed - (time.perf_counter() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # Closed loop: wait for a free slot before creating the next request
+            await semaphore.acquire()
+            semaphore.release()
+        tasks.append(asyncio.create_task(worker(request)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started_at
+
+    latencies = [latency * 1000 for _, latency, _ in samples]
+    errors = sum(1 for _, _, failed in samples if failed)
+    by_endpoint: dict[str, list[tuple[float, bool]]] = defaultdict(list)
+    for path, latency, failed in samples:
+        by_endpoint[path].append((latency * 1000, failed))
+
+    return LevelResult(
+        concurrency=concurrency,
+        requests=len(samples),
+        errors=errors,
+        error_rate=round(errors / len(samples), 4),
+        p50_ms=round(percentile(latencies, 50), 3),
+        p95_ms=round(percentile(latencies, 95), 3),
+        p99_ms=round(percentile(latencies, 99), 3),
+        throughput_per_second=round(len(samples) / elapsed, 3),
+        endpoints={
+            path: {
+                "requests": len(values),
+                "errors": sum(1 for _, failed in values if failed),
+                "p50_ms": round(percentile([value for value, _ in values], 50), 3),
+                "p95_ms": round(percentile([value for value, _ in values], 95), 3),
+                "p99_ms": round(percentile([value for value, _ in values], 99), 3),
+            }
+            for path, values in sorted(by_endpoint.items())
+        },
+    )
+
+
+def find_saturation(
+    levels: list[LevelResult],
+    min_gain: float = 0.1,
+    max_error_rate: float = 0.01,
+) -> int | None:
+    """
+    Find the concurrency after which the service stops scaling: the next level gains
+    less than `min_gain` throughput, or fails more than `max_error_rate` of the requests.
+
+    Args:
+        levels(list[LevelResult]): The results, ordered by concurrency.
+        min_gain(float): The minimum relative throughput gain to keep scaling.
+        max_error_rate(float): The maximum acceptable error rate.
+
+    Returns:
+        (int | None): The saturation concurrency, or None if the service kept scaling.
+    """
+    for previous, current in zip(levels, levels[1:], strict=False):
+        if (
+            current.throughput_per_second
+            < previous.throughput_per_second * (1 + min_gain)
+            or current.error_rate > max_error_rate
+        ):
+            return previous.concurrency
+    return None
+
+
+@asynccontextmanager
+async def open_client(
+    target: str | None,
+    latency: OfflineLatency,
+    corpus_size: int,
+    timeout: float,
+) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Open a client to a running server, or to the app running in-process against the offline fakes.
+
+    Args:
+        target(str | None): The base URL of the server, or None to use the offline fakes.
+        latency(OfflineLatency): The latency of the offline fakes.
+        corpus_size(int): The number of documents indexed in the offline vector store.
+        timeout(float): The request timeout in seconds.
+
+    Yields:
+        (httpx.AsyncClient): The HTTP client.
+    """
+    if target:
+        async with httpx.AsyncClient(base_url=target, timeout=timeout) as client:
+            yield client
+        return
+
+    with temporary_working_directory(), offline_services(latency):
+        from main import app
+        from services.embeddings import VectorStoreHandler
+
+        VectorStoreHandler().from_documents(generate_documents(corpus_size))
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://offline",
+            timeout=timeout,
+        ) as client:
+            yield client
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """
+    Parse a mix such as `simple=0.6,agentic=0.4`.
+
+    Args:
+        value(str): The mix to parse.
+
+    Returns:
+        (dict[str, float]): The weight of each endpoint.
+    """
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def run(args: argparse.Namespace) -> LoadReport:
+    if args.log:
+        requests = requests_from_log(args.log)
+    else:
+        requests = synthetic_requests(args.mix, args.requests)
+    if args.requests and len(requests) > args.requests:
+        requests = requests[: args.requests]
+    file_content = generate_file_content(args.file_paragraphs).encode()
+
+    levels = []
+    async with open_client(
+        args.target,
+        OfflineLatency(llm=args.llm_latency, embedding=args.embedding_latency),
+        args.corpus_size,
+        args.timeout,
+    ) as client:
+        for concurrency in sorted(args.concurrency):
+            level = await run_level(
+                client,
+                requests,
+                concurrency,
+                args.arrival,
+                args.rate,
+                args.speed,
+                file_content,
+            )
+            print(
+                f"concurrency={level.concurrency:<5} requests={level.requests:<6} "
+                f"errors={level.error_rate:>6.1%} p50={level.p50_ms:>9.1f}ms "
+                f"p95={level.p95_ms:>9.1f}ms p99={level.p99_ms:>9.1f}ms "
+                f"throughput={level.throughput_per_second:>8.1f}/s"
+            )
+            levels.append(level)
+
+    return LoadReport(
+        metadata={
+            "target": args.target or "offline",
+            "source": str(args.log) if args.log else "synthetic",
+            "mix": None if args.log else args.mix,
+            "arrival": args.arrival,
+            "rate": args.rate,
+            "speed": args.speed,
+        },
+        levels=levels,
+        saturation_concurrency=find_saturation(levels),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--log", type=Path, help="Query log to replay")
+    source.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="Synthetic mix, e.g. simple=0.6,agentic=0.2,documents=0.15,embed=0.05",
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--target", help="Base URL of a running server")
+    target.add_argument(
+        "--offline", action="store_true", help="Run the app in-process with the fakes"
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--arrival", choices=["closed", "poisson", "replay"], default="closed"
+    )
+    parser.add_argument("--rate", type=float, default=50.0, help="Poisson arrivals/s")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--corpus-size", type=int, default=300)
+    parser.add_argument("--file-paragraphs", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=OfflineLatency().llm)
+    parser.add_argument(
+        "--embedding-latency", type=float, default=OfflineLatency().embedding
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"saturation concurrency: {report.saturation_concurrency or 'not reached'}")
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report.model_dump_json(indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
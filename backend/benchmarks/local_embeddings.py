@@ -0,0 +1,262 @@
+"""
+Comparison of the local CPU embedder of `services/local_embeddings.py` with the remote Azure
+OpenAI embedder, on concurrent query embeddings and on the chunk batches of an ingestion.
+The remote embedder is the real client against a simulated deployment answering after a
+network round trip; the local one runs the configured model, downloaded from Hugging Face or
+read from `--model-path`. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.local_embeddings --concurrency 1 8 32
+    PYTHONPATH=./src python -m benchmarks.local_embeddings --model-path data/models/all-MiniLM-L6-v2 \
+        --threads 4 --output data/benchmarks/local_embeddings.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+from pydantic import BaseModel
+
+from benchmarks.corpus import QUERIES, TOPICS, generate_text
+from benchmarks.fakes import configure_offline_environment
+from benchmarks.run import percentile
+
+# Dimensions of text-embedding-ada-002, the model of the simulated deployment
+REMOTE_DIMENSIONS = 1536
+
+
+class QueryResult(BaseModel):
+    """
+    Latency of the query embeddings sent by concurrent threads.
+
+    Attributes:
+        embedder(str): `remote`, `local_unbatched` or `local`.
+        concurrency(int): The number of threads embedding queries.
+        p50_ms(float): The median latency in milliseconds.
+        p95_ms(float): The 95th percentile latency in milliseconds.
+        queries_per_second(float): The query embeddings completed per second.
+    """
+
+    embedder: str
+    concurrency: int
+    p50_ms: float
+    p95_ms: float
+    queries_per_second: float
+
+
+class IngestionResult(BaseModel):
+    """
+    Throughput of the chunk embeddings of an ingestion.
+
+    Attributes:
+        embedder(str): `remote`, `local_unbatched` or `local`.
+        chunks_per_second(float): The chunks embedded per second.
+    """
+
+    embedder: str
+    chunks_per_second: float
+
+
+def simulate_deployment(latency: float) -> Callable[[httpx.Request], httpx.Response]:
+    """
+    Simulate an Azure OpenAI embeddings deployment answering after a network round trip.
+
+    Args:
+        latency(float): The seconds taken by every request.
+
+    Returns:
+        (Callable[[httpx.Request], httpx.Response]): The handler of the requests.
+    """
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        inputs = json.loads(request.content)["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                "model": "embeddings",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": index,
+                        "embedding": [0.01] * REMOTE_DIMENSIONS,
+                    }
+                    for index in range(len(inputs))
+                ],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            },
+        )
+
+    return handle
+
+
+def create_embedder(embedder: str, latency: float, batch_size: int):
+    """
+    Create the embedding model of a scenario.
+
+    Args:
+        embedder(str): `remote`, `local_unbatched` or `local`.
+        latency(float): The round trip of the remote embedder in seconds.
+        batch_size(int): The texts embedded at once by the local embedder.
+
+    Returns:
+        (BaseEmbedding): The embedding model.
+    """
+    from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
+
+    from services.local_embeddings import LocalEmbedding, get_embedding_batcher
+    from utils.config import get_config
+
+    if embedder == "remote":
+        return AzureOpenAIEmbedding(
+            api_key="offline",
+            endpoint="https://offline.openai.azure.com",
+            model="text-embedding-ada-002",
+            api_version="2024-10-21",
+            http_client=httpx.Client(
+                transport=httpx.MockTransport(simulate_deployment(latency)),
+                limits=httpx.Limits(max_connections=256),
+            ),
+        )
+
+    # Without batching, every call runs the model on its own
+    os.environ["LOCAL_EMBEDDING_BATCH_SIZE"] = (
+        "1" if embedder == "local_unbatched" else str(batch_size)
+    )
+    get_config.cache_clear()
+    get_embedding_batcher.cache_clear()
+    return LocalEmbedding(priority="interactive")
+
+
+def measure_queries(
+    embed_model, embedder: str, concurrency: int, calls: int
+) -> QueryResult:
+    """
+    Embed queries from concurrent threads.
+
+    Args:
+        embed_model(BaseEmbedding): The embedding model.
+        embedder(str): The name of the embedder.
+        concurrency(int): The number of threads.
+        calls(int): The number of query embeddings.
+
+    Returns:
+        (QueryResult): The latency percentiles and the throughput.
+    """
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def embed(call: int) -> None:
+        started_at = time.perf_counter()
+        embed_model.get_query_embedding(f"{QUERIES[call % len(QUERIES)]} {call}")
+        with lock:
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(embed, range(calls)))
+    elapsed = time.perf_counter() - started_at
+    return QueryResult(
+        embedder=embedder,
+        concurrency=concurrency,
+        p50_ms=round(percentile(latencies, 50), 1),
+        p95_ms=round(percentile(latencies, 95), 1),
+        queries_per_second=round(calls / elapsed, 1),
+    )
+
+
+def measure_ingestion(embed_model, embedder: str, chunks: list[str]) -> IngestionResult:
+    """
+    Embed the chunks of an ingestion, in the batches of `VectorStoreHandler.from_documents`.
+
+    Args:
+        embed_model(BaseEmbedding): The embedding model.
+        embedder(str): The name of the embedder.
+        chunks(list[str]): The texts of the chunks.
+
+    Returns:
+        (IngestionResult): The throughput.
+    """
+    started_at = time.perf_counter()
+    embed_model.get_text_embedding_batch(chunks)
+    elapsed = time.perf_counter() - started_at
+    return IngestionResult(
+        embedder=embedder, chunks_per_second=round(len(chunks) / elapsed, 1)
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--chunk-words", type=int, default=150)
+    parser.add_argument("--remote-latency", type=float, default=0.08)
+    parser.add_argument("--model-path", type=Path, default=None)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    os.environ["EMBEDDING_BACKEND"] = "local"
+    os.environ["LOCAL_EMBEDDING_THREADS"] = str(args.threads)
+    if args.model_path:
+        os.environ["LOCAL_EMBEDDING_MODEL_PATH"] = str(args.model_path)
+
+    rng = random.Random(42)
+    chunks = [
+        generate_text(rng, rng.choice(list(TOPICS)), args.chunk_words)
+        for _ in range(args.chunks)
+    ]
+    queries: list[QueryResult] = []
+    ingestions: list[IngestionResult] = []
+    for embedder in ("remote", "local_unbatched", "local"):
+        embed_model = create_embedder(embedder, args.remote_latency, args.batch_size)
+        # Load the model and warm up the runtime
+        embed_model.get_text_embedding_batch(chunks[:8])
+        queries.extend(
+            measure_queries(embed_model, embedder, concurrency, args.calls)
+            for concurrency in args.concurrency
+        )
+        ingestions.append(measure_ingestion(embed_model, embedder, chunks))
+
+    print(
+        f"{'embedder':<18}{'threads':>8}{'p50 ms':>10}{'p95 ms':>10}{'queries/s':>12}"
+    )
+    for result in queries:
+        print(
+            f"{result.embedder:<18}{result.concurrency:>8}{result.p50_ms:>10.1f}"
+            f"{result.p95_ms:>10.1f}{result.queries_per_second:>12.1f}"
+        )
+    print(f"\n{'embedder':<18}{'chunks/s':>10}")
+    for result in ingestions:
+        print(f"{result.embedder:<18}{result.chunks_per_second:>10.1f}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "remote_latency": args.remote_latency,
+                    "threads": args.threads,
+                    "queries": [result.model_dump() for result in queries],
+                    "ingestions": [result.model_dump() for result in ingestions],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Comparison of the LLM tiers of the agentic RAG graph: every node on the main model, and the
+grading and rewriting on a cheaper deployment or on a small local model served by Ollama.
+The chat models are fakes answering after the latency of their tier; the latency and cost of
+every node are read from the metrics recorded by `services/llms.py`. Run it from the backend
+folder:
+
+    PYTHONPATH=./src python -m benchmarks.model_tiering --queries 50
+    PYTHONPATH=./src python -m benchmarks.model_tiering --large-latency 1.2 --small-latency 0.4 \
+        --output data/benchmarks/model_tiering.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from unittest.mock import patch
+
+from pydantic import BaseModel
+
+from benchmarks.corpus import QUERIES, generate_documents
+from benchmarks.fakes import (
+    FakeChatModel,
+    OfflineLatency,
+    configure_offline_environment,
+    offline_services,
+)
+from benchmarks.run import percentile
+
+LARGE_MODEL = "gpt-4o"
+SMALL_MODEL = "gpt-4o-mini"
+LOCAL_MODEL = "qwen2.5:3b"
+
+# The tiers of the grading and rewriting nodes, the agent and the answer stay on the main model
+SCENARIOS = {
+    "single": "azure_openai",
+    "small": "azure_openai_small",
+    "local": "ollama",
+}
+
+
+class ScenarioResult(BaseModel):
+    """
+    Latency and cost of the agentic queries of a scenario.
+
+    Attributes:
+        scenario(str): `single`, `small` or `local`.
+        p50_ms(float): The median latency of a query in milliseconds.
+        p95_ms(float): The 95th percentile latency of a query in milliseconds.
+        cost_per_1k_queries_usd(float): The estimated cost of a thousand queries.
+    """
+
+    scenario: str
+    p50_ms: float
+    p95_ms: float
+    cost_per_1k_queries_usd: float
+
+
+class NodeResult(BaseModel):
+    """
+    Latency and cost of the LLM calls of a node in a scenario.
+
+    Attributes:
+        scenario(str): `single`, `small` or `local`.
+        node(str): The node of the graph.
+        model(str): The model of the node.
+        calls(int): The number of LLM calls.
+        mean_ms(float): The mean latency of a call in milliseconds.
+        cost_per_1k_queries_usd(float): The estimated cost of the node for a thousand queries.
+    """
+
+    scenario: str
+    node: str
+    model: str
+    calls: int
+    mean_ms: float
+    cost_per_1k_queries_usd: float
+
+
+def read_llm_metrics() -> dict[tuple[str, str], dict[str, float]]:
+    """
+    Read the cumulated LLM metrics of the process, by node and model.
+
+    Returns:
+        (dict[tuple[str, str], dict[str, float]]): The seconds, calls and cost by node and
+            model.
+    """
+    from utils.metrics import LLM_CALL_SECONDS, LLM_COST_USD
+
+    values: dict[tuple[str, str], dict[str, float]] = defaultdict(
+        lambda: {"seconds": 0.0, "calls": 0.0, "cost": 0.0}
+    )
+    for metric, suffix, key in (
+        (LLM_CALL_SECONDS, "_sum", "seconds"),
+        (LLM_CALL_SECONDS, "_count", "calls"),
+        (LLM_COST_USD, "_total", "cost"),
+    ):
+        for family in metric.collect():
+            for sample in family.samples:
+                if sample.name.endswith(suffix):
+                    labels = (sample.labels["node"], sample.labels["model"])
+                    values[labels][key] += sample.value
+    return values
+
+
+def run_scenario(
+    scenario: str, queries: int
+) -> tuple[ScenarioResult, list[NodeResult]]:
+    """
+    Run agentic queries with the grading and rewriting on the tier of a scenario.
+
+    Args:
+        scenario(str): The name of the scenario.
+        queries(int): The number of queries.
+
+    Returns:
+        (tuple[ScenarioResult, list[NodeResult]]): The latency and cost of the queries, and
+            of every node.
+    """
+    from langchain_core.messages import HumanMessage
+
+    from services.rag import AgenticRagService
+    from utils.config import get_config
+
+    os.environ["GRADE_LLM_TIER"] = SCENARIOS[scenario]
+    os.environ["REWRITE_LLM_TIER"] = SCENARIOS[scenario]
+    get_config.cache_clear()
+    graph = AgenticRagService().generate_rag_graph()
+    # Warm up the graph outside of the measures
+    graph.invoke({"messages": [HumanMessage(content=QUERIES[0])]})
+
+    before = read_llm_metrics()
+    latencies: list[float] = []
+    for query in range(queries):
+        started_at = time.perf_counter()
+        graph.invoke(
+            {"messages": [HumanMessage(content=QUERIES[query % len(QUERIES)])]}
+        )
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    after = read_llm_metrics()
+
+    nodes: list[NodeResult] = []
+    for (node, model), values in sorted(after.items()):
+        calls = values["calls"] - before[(node, model)]["calls"]
+        if calls == 0:
+            continue
+        seconds = values["seconds"] - before[(node, model)]["seconds"]
+        cost = values["cost"] - before[(node, model)]["cost"]
+        nodes.append(
+            NodeResult(
+                scenario=scenario,
+                node=node,
+                model=model,
+                calls=int(calls),
+                mean_ms=round(seconds / calls * 1000, 1),
+                cost_per_1k_queries_usd=round(cost / queries * 1000, 4),
+            )
+        )
+    return (
+        ScenarioResult(
+            scenario=scenario,
+            p50_ms=round(percentile(latencies, 50), 1),
+            p95_ms=round(percentile(latencies, 95), 1),
+            cost_per_1k_queries_usd=round(
+                sum(node.cost_per_1k_queries_usd for node in nodes), 4
+            ),
+        ),
+        nodes,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--corpus-size", type=int, default=300)
+    parser.add_argument("--large-latency", type=float, default=0.8)
+    parser.add_argument("--small-latency", type=float, default=0.3)
+    parser.add_argument("--local-latency", type=float, default=0.15)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    os.environ["AZURE_OPENAI_LLM_MODEL"] = LARGE_MODEL
+    os.environ["AZURE_OPENAI_SMALL_LLM_MODEL"] = SMALL_MODEL
+    os.environ["OLLAMA_LLM_MODEL"] = LOCAL_MODEL
+    configure_offline_environment()
+    latencies = {
+        LARGE_MODEL: args.large_latency,
+        SMALL_MODEL: args.small_latency,
+        LOCAL_MODEL: args.local_latency,
+    }
+
+    def create_chat_model(**kwargs) -> FakeChatModel:
+        return FakeChatModel(
+            latency=latencies[kwargs["model"]], callbacks=kwargs.get("callbacks")
+        )
+
+    scenarios: list[ScenarioResult] = []
+    nodes: list[NodeResult] = []
+    with (
+        offline_services(OfflineLatency(llm=args.large_latency)),
+        patch("services.llms.AzureChatOpenAI", create_chat_model),
+        patch("services.llms.ChatOllama", create_chat_model),
+    ):
+        from services.embeddings import VectorStoreHandler
+
+        VectorStoreHandler().from_documents(generate_documents(args.corpus_size))
+        for scenario in SCENARIOS:
+            result, node_results = run_scenario(scenario, args.queries)
+            scenarios.append(result)
+            nodes.extend(node_results)
+
+    print(f"{'scenario':<10}{'p50 ms':>10}{'p95 ms':>10}{'USD/1k queries':>16}")
+    for result in scenarios:
+        print(
+            f"{result.scenario:<10}{result.p50_ms:>10.1f}{result.p95_ms:>10.1f}"
+            f"{result.cost_per_1k_queries_usd:>16.4f}"
+        )
+    print(
+        f"\n{'scenario':<10}{'node':<18}{'model':<14}{'calls':>7}{'mean ms':>10}"
+        f"{'USD/1k queries':>16}"
+    )
+    for result in nodes:
+        print(
+            f"{result.scenario:<10}{result.node:<18}{result.model:<14}{result.calls:>7}"
+            f"{result.mean_ms:>10.1f}{result.cost_per_1k_queries_usd:>16.4f}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "latencies": latencies,
+                    "scenarios": [result.model_dump() for result in scenarios],
+                    "nodes": [result.model_dump() for result in nodes],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Micro-benchmarks of the Temporal payload conversion: encode and decode speed and payload size
+of the JSON encoder converter, the pydantic-core converter, and the latter with compression.
+Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.payloads --iterations 200
+    PYTHONPATH=./src python -m benchmarks.payloads --output data/benchmarks/payloads.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+from temporalio.converter import DataConverter
+
+from benchmarks.corpus import TOPICS, generate_text
+from benchmarks.fakes import EMBEDDING_DIMENSIONS, configure_offline_environment
+from benchmarks.run import percentile
+
+
+class Chunk(BaseModel):
+    """
+    Chunk with its embedding, as an activity would pass it to another.
+
+    Attributes:
+        id(str): The ID of the chunk.
+        text(str): The text of the chunk.
+        metadata(dict[str, Any]): The metadata of the chunk.
+        embedding(list[float]): The embedding of the chunk.
+    """
+
+    id: str
+    text: str
+    metadata: dict[str, Any]
+    embedding: list[float]
+
+
+class PayloadResult(BaseModel):
+    """
+    Speed and size of a converter on a payload.
+
+    Attributes:
+        payload(str): The name of the payload.
+        converter(str): The name of the converter.
+        encode_p50_us(float): The median encoding time in microseconds.
+        decode_p50_us(float): The median decoding time in microseconds.
+        size_bytes(int): The size of the encoded payload.
+    """
+
+    payload: str
+    converter: str
+    encode_p50_us: float
+    decode_p50_us: float
+    size_bytes: int
+
+
+def generate_payloads(chunks: int) -> dict[str, tuple[Any, type]]:
+    """
+    Generate the benchmarked values, with the type they are decoded into.
+
+    Args:
+        chunks(int): The number of chunks of the chunk list payload.
+
+    Returns:
+        (dict[str, tuple[Any, type]]): The value and type of every payload.
+    """
+    from utils.types import EmbeddingResponse, ReindexPlan
+
+    rng = random.Random(42)
+    topics = sorted(TOPICS)
+    return {
+        "embedding_response": (
+            EmbeddingResponse(
+                status="success",
+                message="Embeddings created successfully",
+                details={
+                    "blob_path": f"{uuid.uuid4().hex}/handbook.pdf",
+                    "documents": 42,
+                },
+            ),
+            EmbeddingResponse,
+        ),
+        "reindex_plan": (
+            ReindexPlan(
+                source_index="Documents",
+                target_index="Documents_20250101000000",
+                cursors=[None]
+                + [uuid.UUID(int=rng.getrandbits(128)) for _ in range(999)],
+            ),
+            ReindexPlan,
+        ),
+        "chunks": (
+            [
+                Chunk(
+                    id=str(uuid.UUID(int=rng.getrandbits(128))),
+                    text=generate_text(rng, topics[index % len(topics)], 150),
+                    metadata={"filename": "handbook.pdf", "page_number": index // 4},
+                    embedding=[rng.uniform(-1, 1) for _ in range(EMBEDDING_DIMENSIONS)],
+                )
+                for index in range(chunks)
+            ],
+            list[Chunk],
+        ),
+    }
+
+
+def get_converters() -> dict[str, DataConverter]:
+    """
+    Get the compared data converters.
+
+    Returns:
+        (dict[str, DataConverter]): The converters by name.
+    """
+    from jobs.converter import (
+        CompressionCodec,
+        PydanticCorePayloadConverter,
+        pydantic_data_converter,
+    )
+    from utils.config import get_config
+
+    return {
+        "json_encoder": pydantic_data_converter,
+        "pydantic_core": DataConverter(
+            payload_converter_class=PydanticCorePayloadConverter
+        ),
+        "pydantic_core_zlib": DataConverter(
+            payload_converter_class=PydanticCorePayloadConverter,
+            payload_codec=CompressionCodec(get_config().temporal_compression_threshold),
+        ),
+    }
+
+
+def measure(function: Callable[[], Any], iterations: int) -> float:
+    """
+    Measure the median duration of a function.
+
+    Args:
+        function(Callable[[], Any]): The function.
+        iterations(int): The number of calls.
+
+    Returns:
+        (float): The median duration in microseconds.
+    """
+    durations = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started_at) * 1e6)
+    return percentile(durations, 50)
+
+
+def benchmark(
+    name: str,
+    converter_name: str,
+    converter: DataConverter,
+    value: Any,
+    type_hint: type,
+    iterations: int,
+) -> PayloadResult:
+    """
+    Measure a converter on a payload, including the codec like a client or worker would.
+
+    Args:
+        name(str): The name of the payload.
+        converter_name(str): The name of the converter.
+        converter(DataConverter): The converter.
+        value(Any): The value to convert.
+        type_hint(type): The type the payload is decoded into.
+        iterations(int): The number of conversions.
+
+    Returns:
+        (PayloadResult): The speed and size of the converter.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        encode = lambda: loop.run_until_complete(converter.encode([value]))  # noqa: E731
+        payloads = encode()
+        decode = lambda: loop.run_until_complete(  # noqa: E731
+            converter.decode(payloads, [type_hint])
+        )
+        decoded = decode()[0]
+        if decoded != value and not isinstance(decoded, dict | list):
+            raise ValueError(f"{converter_name} does not round-trip {name}")
+        return PayloadResult(
+            payload=name,
+            converter=converter_name,
+            encode_p50_us=round(measure(encode, iterations), 1),
+            decode_p50_us=round(measure(decode, iterations), 1),
+            size_bytes=payloads[0].ByteSize(),
+        )
+    finally:
+        loop.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    converters = get_converters()
+    results = [
+        benchmark(name, converter_name, converter, value, type_hint, args.iterations)
+        for name, (value, type_hint) in generate_payloads(args.chunks).items()
+        for converter_name, converter in converters.items()
+    ]
+
+    print(
+        f"{'payload':<20}{'converter':<20}{'encode us':>12}{'decode us':>12}{'bytes':>12}"
+    )
+    for result in results:
+        print(
+            f"{result.payload:<20}{result.converter:<20}{result.encode_p50_us:>12.1f}"
+            f"{result.decode_p50_us:>12.1f}{result.size_bytes:>12}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "iterations": args.iterations,
+                    "chunks": args.chunks,
+                    "results": [result.model_dump() for result in results],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
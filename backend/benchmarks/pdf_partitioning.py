@@ -0,0 +1,198 @@
+"""
+Simulation of the partitioning of a large PDF by an Unstructured API with several workers,
+sent as one request or split into page ranges partitioned in parallel by `services/files.py`.
+The simulated API takes `--page-latency` seconds per page on a free worker and fails a
+request with the probability `--failure-rate`; a failed file is partitioned again as a whole,
+like a retried ingestion activity. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.pdf_partitioning --pages 500 --workers 4
+    PYTHONPATH=./src python -m benchmarks.pdf_partitioning --failure-rate 0.1 \
+        --output data/benchmarks/pdf_partitioning.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from llama_index.core.schema import TextNode
+from pydantic import BaseModel
+from pypdf import PdfReader, PdfWriter
+
+from benchmarks.fakes import configure_offline_environment
+
+
+class PartitionResult(BaseModel):
+    """
+    Time taken to partition the PDF.
+
+    Attributes:
+        mode(str): `single` or `split`.
+        seconds(float): The time to partition the whole file.
+        pages_per_second(float): The pages partitioned per second.
+        requests(int): The requests sent to the API.
+        pages_sent(int): The pages sent to the API, including the retries.
+    """
+
+    mode: str
+    seconds: float
+    pages_per_second: float
+    requests: int
+    pages_sent: int
+
+
+class SimulatedUnstructured:
+    """
+    Unstructured API partitioning one request per worker, page by page, failing at random.
+    """
+
+    def __init__(
+        self, workers: int, page_latency: float, failure_rate: float, seed: int
+    ):
+        self.page_latency = page_latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.pages_sent = 0
+        self.__workers = threading.Semaphore(workers)
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    def reader(self, **kwargs: Any) -> "SimulatedUnstructured":
+        return self
+
+    def load_data(
+        self, unstructured_kwargs: dict[str, Any], **kwargs: Any
+    ) -> list[TextNode]:
+        pages = len(PdfReader(unstructured_kwargs["file"]).pages)
+        with self.__lock:
+            self.requests += 1
+            self.pages_sent += pages
+            # A failure happens at a random page of the request
+            failed_page = (
+                self.__random.randint(1, pages)
+                if self.__random.random() < self.failure_rate
+                else None
+            )
+        with self.__workers:
+            time.sleep(self.page_latency * (failed_page or pages))
+        if failed_page is not None:
+            raise ValueError("Receive unexpected status code 502 from the API.")
+        return [
+            TextNode(
+                text=f"Text of page {page}",
+                metadata={
+                    "filename": unstructured_kwargs["metadata_filename"],
+                    "page_number": page,
+                    "sequence_number": page - 1,
+                },
+            )
+            for page in range(1, pages + 1)
+        ]
+
+
+def partition(
+    file_path: Path, mode: str, api: SimulatedUnstructured, pages: int
+) -> PartitionResult:
+    """
+    Partition the PDF until it succeeds, the whole file being retried after a failure.
+
+    Args:
+        file_path(Path): The PDF.
+        mode(str): `single` or `split`.
+        api(SimulatedUnstructured): The simulated API.
+        pages(int): The pages of the PDF.
+
+    Returns:
+        (PartitionResult): The time taken and the requests sent.
+    """
+    from services.files import TextExtractor
+    from utils.config import get_config
+
+    os.environ["PDF_SPLIT_MIN_PAGES"] = "0" if mode == "single" else "1"
+    get_config.cache_clear()
+    started_at = time.perf_counter()
+    with patch("services.files.UnstructuredReader", api.reader):
+        extractor = TextExtractor()
+        while True:
+            try:
+                documents = extractor.extract_text_from_file(file_path)
+                break
+            except ValueError:
+                continue
+    elapsed = time.perf_counter() - started_at
+    assert [document.metadata["page_number"] for document in documents] == list(
+        range(1, pages + 1)
+    )
+    return PartitionResult(
+        mode=mode,
+        seconds=round(elapsed, 2),
+        pages_per_second=round(pages / elapsed, 1),
+        requests=api.requests,
+        pages_sent=api.pages_sent,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-latency", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--split-pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    os.environ["PDF_SPLIT_PAGES"] = str(args.split_pages)
+    os.environ["PDF_SPLIT_CONCURRENCY"] = str(args.workers)
+    os.environ["PDF_SPLIT_MAX_ATTEMPTS"] = "5"
+
+    results: list[PartitionResult] = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = Path(directory) / "large.pdf"
+        writer = PdfWriter()
+        for _ in range(args.pages):
+            writer.add_blank_page(612, 792)
+        writer.write(file_path)
+        for mode in ("single", "split"):
+            api = SimulatedUnstructured(
+                args.workers, args.page_latency, args.failure_rate, args.seed
+            )
+            results.append(partition(file_path, mode, api, args.pages))
+
+    print(
+        f"{'mode':<8}{'seconds':>10}{'pages/s':>10}{'requests':>10}{'pages sent':>12}"
+    )
+    for result in results:
+        print(
+            f"{result.mode:<8}{result.seconds:>10.2f}{result.pages_per_second:>10.1f}"
+            f"{result.requests:>10}{result.pages_sent:>12}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "pages": args.pages,
+                    "workers": args.workers,
+                    "page_latency": args.page_latency,
+                    "failure_rate": args.failure_rate,
+                    "results": [result.model_dump() for result in results],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Simulation of query and ingestion traffic sharing an Azure OpenAI embeddings deployment,
+with and without the client-side rate limiter of `utils/rate_limiter.py`.
+Bulk threads embed batches as fast as they can while an interactive thread embeds queries;
+the simulated deployment throttles above its limit with 429 responses, retried by the
+OpenAI client. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.rate_limit --duration 20
+    PYTHONPATH=./src python -m benchmarks.rate_limit --output data/benchmarks/rate_limit.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from pydantic import BaseModel
+
+from benchmarks.fakes import EMBEDDING_DIMENSIONS, configure_offline_environment
+from benchmarks.run import percentile
+
+
+class SimulationResult(BaseModel):
+    """
+    Outcome of a traffic simulation.
+
+    Attributes:
+        scenario(str): `unlimited` or `rate_limited`.
+        interactive_p50_ms(float): The median latency of the query embeddings in milliseconds.
+        interactive_p95_ms(float): The 95th percentile latency of the query embeddings.
+        interactive_failures(int): The query embeddings failing after the client retries.
+        bulk_per_second(float): The batch embeddings completed per second.
+        bulk_failures(int): The batch embeddings failing after the client retries.
+        throttled(int): The requests throttled by the deployment.
+    """
+
+    scenario: str
+    interactive_p50_ms: float
+    interactive_p95_ms: float
+    interactive_failures: int
+    bulk_per_second: float
+    bulk_failures: int
+    throttled: int
+
+
+class SimulatedDeployment:
+    """
+    Embeddings deployment throttling the requests above its per-minute limit, enforced over
+    10-second windows like Azure OpenAI.
+
+    Attributes:
+        requests_per_minute(int): The requests allowed per minute.
+        latency(float): Seconds taken by every accepted request.
+        throttled(int): The number of throttled requests.
+    """
+
+    def __init__(self, requests_per_minute: int, latency: float):
+        self.requests_per_minute = requests_per_minute
+        self.latency = latency
+        self.throttled = 0
+        self.__lock = threading.Lock()
+        self.__allowance = requests_per_minute / 6
+        self.__updated_at = time.monotonic()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        with self.__lock:
+            now = time.monotonic()
+            rate = self.requests_per_minute / 60
+            self.__allowance = min(
+                self.requests_per_minute / 6,
+                self.__allowance + (now - self.__updated_at) * rate,
+            )
+            self.__updated_at = now
+            accepted = self.__allowance >= 1
+            if accepted:
+                self.__allowance -= 1
+            else:
+                self.throttled += 1
+                retry_after = (1 - self.__allowance) / rate
+        if not accepted:
+            return httpx.Response(
+                429,
+                headers={"retry-after-ms": str(int(retry_after * 1000) + 1)},
+                json={"error": {"code": "429", "message": "Rate limit exceeded"}},
+            )
+
+        time.sleep(self.latency)
+        inputs = json.loads(request.content)["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                "model": "embeddings",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": index,
+                        "embedding": [0.0] * EMBEDDING_DIMENSIONS,
+                    }
+                    for index in range(len(inputs))
+                ],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            },
+        )
+
+
+def simulate(
+    scenario: str,
+    duration: float,
+    bulk_threads: int,
+    query_interval: float,
+    requests_per_minute: int,
+    latency: float,
+) -> SimulationResult:
+    """
+    Run the bulk and interactive traffic against a simulated deployment.
+
+    Args:
+        scenario(str): `unlimited` or `rate_limited`.
+        duration(float): The seconds the bulk traffic runs for.
+        bulk_threads(int): The number of threads embedding batches.
+        query_interval(float): The mean seconds between two query embeddings.
+        requests_per_minute(int): The limit of the simulated deployment.
+        latency(float): The seconds taken by every accepted request.
+
+    Returns:
+        (SimulationResult): The latency of the queries and the throughput of the batches.
+    """
+    from openai import AzureOpenAI
+
+    from utils.config import get_config
+    from utils.rate_limiter import (
+        RateLimitedTransport,
+        get_bucket_store,
+        get_limiter,
+    )
+
+    get_bucket_store.cache_clear()
+    get_limiter.cache_clear()
+    deployment = SimulatedDeployment(requests_per_minute, latency)
+    model = get_config().azure_openai_embeddings_model
+
+    def get_client(priority: str) -> AzureOpenAI:
+        transport: httpx.BaseTransport = httpx.MockTransport(deployment.handle)
+        if scenario == "rate_limited":
+            transport = RateLimitedTransport(priority, transport)  # type: ignore[arg-type]
+        return AzureOpenAI(
+            api_key="offline",
+            api_version="2024-10-21",
+            azure_endpoint="https://offline.openai.azure.com",
+            http_client=httpx.Client(transport=transport),
+        )
+
+    stop = threading.Event()
+    bulk_done, bulk_failures = [0], [0]
+    interactive_ms: list[float] = []
+    interactive_failures = [0]
+
+    def bulk() -> None:
+        client = get_client("bulk")
+        while not stop.is_set():
+            try:
+                client.embeddings.create(model=model, input=["chunk text"] * 16)
+                bulk_done[0] += 1
+            except Exception:
+                bulk_failures[0] += 1
+
+    def interactive() -> None:
+        client = get_client("interactive")
+        rng = random.Random(42)
+        while not stop.is_set():
+            started_at = time.perf_counter()
+            try:
+                client.embeddings.create(model=model, input="user query")
+                interactive_ms.append((time.perf_counter() - started_at) * 1000)
+            except Exception:
+                interactive_failures[0] += 1
+            time.sleep(rng.expovariate(1 / query_interval))
+
+    threads = [threading.Thread(target=bulk) for _ in range(bulk_threads)]
+    threads.append(threading.Thread(target=interactive))
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    return SimulationResult(
+        scenario=scenario,
+        interactive_p50_ms=round(percentile(interactive_ms, 50), 1)
+        if interactive_ms
+        else 0.0,
+        interactive_p95_ms=round(percentile(interactive_ms, 95), 1)
+        if interactive_ms
+        else 0.0,
+        interactive_failures=interactive_failures[0],
+        bulk_per_second=round(bulk_done[0] / elapsed, 1),
+        bulk_failures=bulk_failures[0],
+        throttled=deployment.throttled,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--bulk-threads", type=int, default=16)
+    parser.add_argument("--query-interval", type=float, default=0.5)
+    parser.add_argument("--requests-per-minute", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    # The limiter is configured with the limit of the simulated deployment
+    os.environ["RATE_LIMIT_EMBEDDINGS_RPM"] = str(args.requests_per_minute)
+    os.environ["RATE_LIMIT_EMBEDDINGS_TPM"] = str(10_000_000)
+    os.environ["RATE_LIMIT_STATE_PATH"] = ""
+
+    results = [
+        simulate(
+            scenario,
+            args.duration,
+            args.bulk_threads,
+            args.query_interval,
+            args.requests_per_minute,
+            args.latency,
+        )
+        for scenario in ("unlimited", "rate_limited")
+    ]
+
+    print(
+        f"{'scenario':<16}{'query p50':>12}{'query p95':>12}{'query err':>12}"
+        f"{'bulk/s':>10}{'bulk err':>10}{'429s':>8}"
+    )
+    for result in results:
+        print(
+            f"{result.scenario:<16}{result.interactive_p50_ms:>12.1f}"
+            f"{result.interactive_p95_ms:>12.1f}{result.interactive_failures:>12}"
+            f"{result.bulk_per_second:>10.1f}{result.bulk_failures:>10}{result.throttled:>8}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "duration": args.duration,
+                    "bulk_threads": args.bulk_threads,
+                    "requests_per_minute": args.requests_per_minute,
+                    "results": [result.model_dump() for result in results],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Recall evaluation of the vector index settings on our own corpus.
+
+It loads a snapshot (see `src/snapshot.py`), holds out some vectors as queries, builds one
+throwaway collection per setting in the local Weaviate and compares its results with an exact
+search. Reduced dimensions are emulated by truncating the stored vectors, as the
+text-embedding-3 models do when asked for fewer dimensions. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.recall --snapshot data/snapshots/documents
+    PYTHONPATH=./src python -m benchmarks.recall --snapshot data/snapshots/documents \\
+        --settings benchmarks/index_settings.json --output data/benchmarks/recall.json
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+from weaviate import WeaviateClient, connect_to_local
+
+from benchmarks.fakes import configure_offline_environment
+from benchmarks.run import percentile
+from services.collections import IndexSettings, create_collection
+from services.snapshots import DOCUMENTS_FILE, VECTORS_FILE, read_manifest
+from utils.config import get_config
+
+DEFAULT_SETTINGS = [
+    {"name": "hnsw"},
+    {"name": "hnsw-m16-ef64", "max_connections": 16, "ef_construction": 64},
+    {"name": "hnsw-pq", "quantization": "pq"},
+    {"name": "hnsw-sq", "quantization": "sq"},
+    {"name": "hnsw-bq", "quantization": "bq"},
+    {"name": "flat-bq", "index_type": "flat", "quantization": "bq"},
+    {"name": "hnsw-1024d", "dimensions": 1024},
+    {"name": "hnsw-512d", "dimensions": 512},
+    {"name": "hnsw-512d-sq", "dimensions": 512, "quantization": "sq"},
+]
+
+
+class RecallResult(BaseModel):
+    """
+    Recall, latency and memory of an index setting.
+
+    Attributes:
+        name(str): The name of the setting.
+        settings(dict): The index settings.
+        dimensions(int): The dimensions of the stored vectors.
+        recall_at_k(float): The mean ratio of the exact top k found by the index.
+        p50_ms(float): The median query latency in milliseconds.
+        p95_ms(float): The 95th percentile query latency in milliseconds.
+        build_seconds(float): The time to insert and index the corpus.
+        estimated_memory_mb(float): The estimated memory of the vectors and the graph.
+    """
+
+    name: str
+    settings: dict
+    dimensions: int
+    recall_at_k: float
+    p50_ms: float
+    p95_ms: float
+    build_seconds: float
+    estimated_memory_mb: float
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scale vectors to unit length.
+
+    Args:
+        vectors(np.ndarray): The vectors, one per row.
+
+    Returns:
+        (np.ndarray): The normalized vectors.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Find the exact nearest neighbours by cosine similarity.
+
+    Args:
+        corpus(np.ndarray): The normalized corpus vectors.
+        queries(np.ndarray): The normalized query vectors.
+        k(int): The number of neighbours.
+
+    Returns:
+        (np.ndarray): The row indexes of the neighbours of every query.
+    """
+    scores = queries @ corpus.T
+    top_k = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(-scores, top_k, axis=1).argsort(axis=1)
+    return np.take_along_axis(top_k, order, axis=1)
+
+
+def estimate_memory(
+    count: int,
+    dimensions: int,
+    settings: IndexSettings,
+    pq_segments: int | None,
+) -> int:
+    """
+    Estimate the memory held by the vector index, from the Weaviate sizing guidelines:
+    the (compressed) vectors plus about 2 * max_connections links of 8 bytes per HNSW node.
+
+    Args:
+        count(int): The number of vectors.
+        dimensions(int): The dimensions of the vectors.
+        settings(IndexSettings): The index settings.
+        pq_segments(int | None): The number of product quantization segments, if known.
+
+    Returns:
+        (int): The estimated memory in bytes.
+    """
+    bytes_per_vector = {
+        "none": dimensions * 4,
+        "sq": dimensions,
+        "bq": dimensions / 8,
+        "pq": pq_segments or dimensions,
+    }[settings.quantization]
+    graph = 0
+    if settings.index_type == "hnsw" or (
+        settings.index_type == "dynamic" and count > settings.dynamic_threshold
+    ):
+        graph = settings.max_connections * 2 * 8
+    return int(count * (bytes_per_vector + graph))
+
+
+def wait_until_indexed(
+    client: WeaviateClient, index_name: str, compressed: bool, timeout: float
+) -> None:
+    """
+    Wait until the vector index of a collection is built, and compressed if requested.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        index_name(str): The name of the collection.
+        compressed(bool): Whether to wait for the quantization to be applied.
+        timeout(float): The maximum time to wait in seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        shards = [
+            shard
+            for node in client.cluster.nodes(collection=index_name, output="verbose")
+            for shard in node.shards or []
+        ]
+        if all(
+            shard.vector_queue_length == 0
+            and shard.vector_indexing_status == "READY"
+            and (shard.compressed or not compressed)
+            for shard in shards
+        ):
+            return
+        time.sleep(0.5)
+    print(f"{index_name}: index not ready after {timeout:.0f}s, measuring anyway")
+
+
+def evaluate(
+    client: WeaviateClient,
+    name: str,
+    settings: IndexSettings,
+    dimensions: int,
+    ids: list[str],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    expected: np.ndarray,
+    k: int,
+    timeout: float,
+) -> RecallResult:
+    """
+    Build a throwaway collection with a setting and measure its recall and latency.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        name(str): The name of the setting.
+        settings(IndexSettings): The index settings.
+        dimensions(int): The dimensions to truncate the vectors to.
+        ids(list[str]): The IDs of the corpus documents.
+        corpus(np.ndarray): The corpus vectors, at full dimensionality.
+        queries(np.ndarray): The query vectors, at full dimensionality.
+        expected(np.ndarray): The exact top k of every query, as corpus row indexes.
+        k(int): The number of results per query.
+        timeout(float): The maximum time to wait for the index in seconds.
+
+    Returns:
+        (RecallResult): The result of the setting.
+    """
+    index_name = "RecallEval" + "".join(part.title() for part in name.split("-"))
+    if client.collections.exists(index_name):
+        client.collections.delete(index_name)
+    create_collection(client, index_name, settings, property_types={})
+    collection = client.collections.get(index_name)
+
+    try:
+        corpus_vectors = normalize(corpus[:, :dimensions])
+        started_at = time.perf_counter()
+        with collection.batch.fixed_size(
+            batch_size=500, concurrent_requests=4
+        ) as batch:
+            for doc_id, vector in zip(ids, corpus_vectors.tolist(), strict=True):
+                batch.add_object(properties={}, uuid=doc_id, vector=vector)
+        if collection.batch.failed_objects:
+            raise Exception(f"Failed to insert {index_name} vectors")
+        wait_until_indexed(
+            client, index_name, settings.quantization in ("pq", "sq"), timeout
+        )
+        build_seconds = time.perf_counter() - started_at
+
+        positions = {doc_id: position for position, doc_id in enumerate(ids)}
+        latencies = []
+        hits = 0
+        for query, exact in zip(
+            normalize(queries[:, :dimensions]).tolist(), expected, strict=True
+        ):
+            started_at = time.perf_counter()
+            result = collection.query.near_vector(query, limit=k, return_properties=[])
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            found = {positions[str(document.uuid)] for document in result.objects}
+            hits += len(found & set(exact.tolist()))
+
+        quantizer = getattr(
+            collection.config.get().vector_index_config, "quantizer", None
+        )
+        return RecallResult(
+            name=name,
+            settings=settings.model_dump(),
+            dimensions=dimensions,
+            recall_at_k=round(hits / (len(expected) * k), 4),
+            p50_ms=round(percentile(latencies, 50), 3),
+            p95_ms=round(percentile(latencies, 95), 3),
+            build_seconds=round(build_seconds, 3),
+            estimated_memory_mb=round(
+                estimate_memory(
+                    len(ids),
+                    dimensions,
+                    settings,
+                    getattr(quantizer, "segments", None),
+                )
+                / 1024**2,
+                3,
+            ),
+        )
+    finally:
+        client.collections.delete(index_name)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--snapshot", type=Path, required=True)
+    parser.add_argument(
+        "--settings",
+        type=Path,
+        default=None,
+        help="JSON list of settings: a name, the dimensions and any IndexSettings field",
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    manifest = read_manifest(args.snapshot)
+    vectors = np.load(args.snapshot / VECTORS_FILE, mmap_mode="r")
+    ids = pq.read_table(args.snapshot / DOCUMENTS_FILE, columns=["id"])[
+        "id"
+    ].to_pylist()
+    if len(ids) <= args.queries:
+        raise ValueError(f"The snapshot needs more than {args.queries} documents")
+
+    # The last vectors are held out as queries, so they are not their own nearest neighbour
+    corpus_ids = [str(uuid.UUID(doc_id)) for doc_id in ids[: -args.queries]]
+    corpus = np.asarray(vectors[: -args.queries], dtype=np.float32)
+    queries = np.asarray(vectors[-args.queries :], dtype=np.float32)
+    expected = exact_top_k(normalize(corpus), normalize(queries), args.k)
+
+    settings_list = (
+        json.loads(args.settings.read_text()) if args.settings else DEFAULT_SETTINGS
+    )
+    client = connect_to_local(
+        host=get_config().weaviate_host,
+        port=get_config().weaviate_port,
+        grpc_port=get_config().weaviate_grpc_port,
+    )
+    results = []
+    try:
+        for entry in settings_list:
+            entry = dict(entry)
+            name = entry.pop("name")
+            dimensions = entry.pop("dimensions", None) or manifest.dimensions
+            if dimensions > manifest.dimensions:
+                print(
+                    f"{name}: skipped, the snapshot has {manifest.dimensions} dimensions"
+                )
+                continue
+            # Train the quantizers on the corpus, which may be smaller than the default limit
+            entry.setdefault("pq_training_limit", min(len(corpus_ids), 100000))
+            results.append(
+                evaluate(
+                    client,
+                    name,
+                    IndexSettings(**entry),
+                    dimensions,
+                    corpus_ids,
+                    corpus,
+                    queries,
+                    expected,
+                    args.k,
+                    args.timeout,
+                )
+            )
+    finally:
+        client.close()
+
+    print(
+        f"{'setting':<20}{'dims':>6}{f'recall@{args.k}':>12}{'p50 ms':>10}"
+        f"{'p95 ms':>10}{'build s':>10}{'memory MB':>12}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<20}{result.dimensions:>6}{result.recall_at_k:>12.4f}"
+            f"{result.p50_ms:>10.2f}{result.p95_ms:>10.2f}{result.build_seconds:>10.1f}"
+            f"{result.estimated_memory_mb:>12.1f}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "snapshot": str(args.snapshot),
+                    "corpus_size": len(corpus_ids),
+                    "queries": args.queries,
+                    "k": args.k,
+                    "results": [result.model_dump() for result in results],
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
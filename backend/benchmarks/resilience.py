@@ -0,0 +1,205 @@
+"""
+Simulation of a dependency with a heavy latency tail, called with and without hedging
+through `utils/resilience.py`, and of the failing fast of its circuit breaker during an outage.
+Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.resilience --calls 400
+    PYTHONPATH=./src python -m benchmarks.resilience --output data/benchmarks/resilience.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from benchmarks.fakes import configure_offline_environment
+from benchmarks.run import percentile
+
+
+class HedgingResult(BaseModel):
+    """
+    Latency of the calls to a dependency with a heavy tail.
+
+    Attributes:
+        scenario(str): `plain` or `hedged`.
+        p50_ms(float): The median latency in milliseconds.
+        p95_ms(float): The 95th percentile latency in milliseconds.
+        p99_ms(float): The 99th percentile latency in milliseconds.
+        extra_requests(float): The ratio of duplicate requests sent.
+    """
+
+    scenario: str
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    extra_requests: float
+
+
+class OutageResult(BaseModel):
+    """
+    Latency of the calls to a dependency that hangs until its timeout.
+
+    Attributes:
+        calls(int): The number of calls.
+        timed_out(int): The calls abandoned at the timeout.
+        failed_fast(int): The calls rejected by the open circuit breaker.
+        mean_ms(float): The mean latency of the failed calls in milliseconds.
+    """
+
+    calls: int
+    timed_out: int
+    failed_fast: int
+    mean_ms: float
+
+
+class SlowDependency:
+    """
+    Dependency answering in `latency` seconds, and in `slow_latency` seconds for a share of
+    the calls, e.g. a replica pausing for garbage collection.
+
+    Attributes:
+        latency(float): The usual latency in seconds.
+        slow_latency(float): The latency of the slow calls in seconds.
+        slow_ratio(float): The share of slow calls.
+        requests(int): The number of requests received.
+    """
+
+    def __init__(self, latency: float, slow_latency: float, slow_ratio: float):
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.slow_ratio = slow_ratio
+        self.requests = 0
+        self.__rng = random.Random(42)
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> str:
+        with self.__lock:
+            self.requests += 1
+            slow = self.__rng.random() < self.slow_ratio
+        time.sleep(self.slow_latency if slow else self.latency)
+        return key
+
+
+def measure_hedging(
+    scenario: str, calls: int, dependency: SlowDependency
+) -> HedgingResult:
+    """
+    Call a slow dependency one call at a time.
+
+    Args:
+        scenario(str): `plain` or `hedged`.
+        calls(int): The number of calls.
+        dependency(SlowDependency): The dependency.
+
+    Returns:
+        (HedgingResult): The latency percentiles and the share of duplicates.
+    """
+    from utils.resilience import get_dependency
+
+    get_dependency.cache_clear()
+    resilient = get_dependency("weaviate")
+    dependency.requests = 0
+    latencies = []
+    for call in range(calls):
+        started_at = time.perf_counter()
+        resilient.call(
+            "get", dependency.get, str(call), hedge=scenario == "hedged", timeout=10.0
+        )
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return HedgingResult(
+        scenario=scenario,
+        p50_ms=round(percentile(latencies, 50), 1),
+        p95_ms=round(percentile(latencies, 95), 1),
+        p99_ms=round(percentile(latencies, 99), 1),
+        extra_requests=round(dependency.requests / calls - 1, 3),
+    )
+
+
+def measure_outage(calls: int, timeout: float) -> OutageResult:
+    """
+    Call a dependency hanging past its timeout.
+
+    Args:
+        calls(int): The number of calls.
+        timeout(float): The timeout of the calls in seconds.
+
+    Returns:
+        (OutageResult): How the calls failed and how long they took.
+    """
+    from utils.resilience import (
+        CircuitOpenError,
+        DependencyTimeoutError,
+        get_dependency,
+    )
+
+    get_dependency.cache_clear()
+    resilient = get_dependency("unstructured")
+    timed_out = failed_fast = 0
+    latencies = []
+    for _ in range(calls):
+        started_at = time.perf_counter()
+        try:
+            resilient.call("partition", time.sleep, timeout * 2, timeout=timeout)
+        except DependencyTimeoutError:
+            timed_out += 1
+        except CircuitOpenError:
+            failed_fast += 1
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return OutageResult(
+        calls=calls,
+        timed_out=timed_out,
+        failed_fast=failed_fast,
+        mean_ms=round(sum(latencies) / len(latencies), 1),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--slow-latency", type=float, default=0.3)
+    parser.add_argument("--slow-ratio", type=float, default=0.03)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+    dependency = SlowDependency(args.latency, args.slow_latency, args.slow_ratio)
+    hedging = [
+        measure_hedging(scenario, args.calls, dependency)
+        for scenario in ("plain", "hedged")
+    ]
+    outage = measure_outage(calls=50, timeout=0.1)
+
+    print(f"{'scenario':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'extra':>10}")
+    for result in hedging:
+        print(
+            f"{result.scenario:<12}{result.p50_ms:>10.1f}{result.p95_ms:>10.1f}"
+            f"{result.p99_ms:>10.1f}{result.extra_requests:>10.1%}"
+        )
+    print(
+        f"outage: {outage.timed_out} timed out, {outage.failed_fast} failed fast "
+        f"out of {outage.calls}, {outage.mean_ms:.1f} ms per call"
+    )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps(
+                {
+                    "calls": args.calls,
+                    "hedging": [result.model_dump() for result in hedging],
+                    "outage": outage.model_dump(),
+                },
+                indent=2,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
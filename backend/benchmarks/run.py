@@ -0,0 +1,384 @@
+"""
+Offline benchmark suite for the query and ingestion paths.
+
+Every external service is replaced by a deterministic fake with a configurable latency,
+so the suite runs without network access. Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.run --output data/benchmarks/results.json
+    PYTHONPATH=./src python -m benchmarks.run --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import platform
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from benchmarks.corpus import QUERIES, generate_documents, generate_file_content
+from benchmarks.fakes import (
+    FakeTemporalClient,
+    OfflineLatency,
+    OfflineServices,
+    configure_offline_environment,
+    offline_services,
+    temporary_working_directory,
+)
+
+
+class BenchmarkResult(BaseModel):
+    """
+    Latency percentiles and throughput of a benchmark.
+
+    Attributes:
+        name(str): The name of the benchmark.
+        iterations(int): The number of measured operations.
+        concurrency(int): The number of concurrent callers.
+        p50_ms(float): The median latency in milliseconds.
+        p95_ms(float): The 95th percentile latency in milliseconds.
+        p99_ms(float): The 99th percentile latency in milliseconds.
+        mean_ms(float): The mean latency in milliseconds.
+        throughput_per_second(float): The number of operations per second.
+        items_per_second(float | None): The number of processed items (e.g. chunks) per second.
+    """
+
+    name: str
+    iterations: int
+    concurrency: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    throughput_per_second: float
+    items_per_second: float | None = None
+
+
+class BenchmarkReport(BaseModel):
+    """
+    Machine-readable report of a benchmark run.
+
+    Attributes:
+        metadata(dict): The settings and environment of the run.
+        results(list[BenchmarkResult]): The result of every benchmark.
+    """
+
+    metadata: dict
+    results: list[BenchmarkResult]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """
+    Compute a percentile using the nearest-rank method.
+
+    Args:
+        samples(list[float]): The samples.
+        pct(float): The percentile, between 0 and 100.
+
+    Returns:
+        (float): The percentile value.
+    """
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def measure(
+    name: str,
+    operation: Callable[[int], int | None],
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 2,
+) -> BenchmarkResult:
+    """
+    Measure the latency and throughput of an operation.
+
+    Args:
+        name(str): The name of the benchmark.
+        operation(Callable[[int], int | None]): The operation, receiving the iteration number
+            and optionally returning the number of processed items.
+        iterations(int): The number of measured operations.
+        concurrency(int): The number of concurrent callers.
+        warmup(int): The number of operations run before measuring.
+
+    Returns:
+        (BenchmarkResult): The benchmark result.
+    """
+    for iteration in range(warmup):
+        operation(iteration)
+
+    def timed(iteration: int) -> tuple[float, int | None]:
+        started_at = time.perf_counter()
+        items = operation(iteration)
+        return time.perf_counter() - started_at, items
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started_at
+
+    latencies = [latency * 1000 for latency, _ in samples]
+    items = [count for _, count in samples if count is not None]
+    return BenchmarkResult(
+        name=name,
+        iterations=iterations,
+        concurrency=concurrency,
+        p50_ms=round(percentile(latencies, 50), 3),
+        p95_ms=round(percentile(latencies, 95), 3),
+        p99_ms=round(percentile(latencies, 99), 3),
+        mean_ms=round(sum(latencies) / len(latencies), 3),
+        throughput_per_second=round(iterations / elapsed, 3),
+        items_per_second=round(sum(items) / elapsed, 3) if items else None,
+    )
+
+
+def build_benchmarks(
+    services: OfflineServices,
+    file_paragraphs: int,
+) -> dict[str, Callable[[int], int | None]]:
+    """
+    Build the operations to benchmark, once the fakes are installed.
+
+    Args:
+        services(OfflineServices): The installed fakes.
+        file_paragraphs(int): The number of paragraphs of the ingested files.
+
+    Returns:
+        (dict[str, Callable[[int], int | None]]): The operations by benchmark name.
+    """
+    from fastapi.testclient import TestClient
+    from langchain_core.messages import HumanMessage
+    from temporalio.testing import ActivityEnvironment
+
+    from jobs.activities import embed_file
+    from main import app
+    from services.conversations import get_conversation_store
+    from services.rag import AgenticRagService, RagService
+    from utils.config import get_config
+    from utils.types import EmbeddingFileWorkflowRequest, EmbeddingResponse
+
+    rag_service = RagService()
+    agentic_graph = AgenticRagService().generate_rag_graph()
+    client = TestClient(app)
+    activity_environment = ActivityEnvironment()
+    file_content = generate_file_content(file_paragraphs)
+
+    def query(iteration: int) -> None:
+        rag_service.query(QUERIES[iteration % len(QUERIES)])
+
+    def agentic(iteration: int) -> None:
+        agentic_graph.invoke(
+            {"messages": [HumanMessage(content=QUERIES[iteration % len(QUERIES)])]}
+        )
+
+    # A conversation whose first turn retrieved the documents, continued by every iteration
+    conversation = {"configurable": {"thread_id": f"benchmark-{uuid.uuid4().hex}"}}
+    conversation_graph = AgenticRagService().generate_rag_graph(
+        checkpointer=get_conversation_store().checkpointer
+    )
+    conversation_graph.invoke(
+        {"messages": [HumanMessage(content=QUERIES[0])]}, conversation
+    )
+
+    def follow_up(iteration: int) -> None:
+        conversation_graph.invoke(
+            {"messages": [HumanMessage(content=QUERIES[iteration % len(QUERIES)])]},
+            conversation,
+        )
+
+    def ingest(iteration: int) -> int:
+        blob_path = f"benchmark-{iteration}.txt"
+        # A new file every time, as the chunks of a file already ingested are dropped as duplicates
+        services.blob_client.objects[(get_config().storage_bucket, blob_path)] = (
+            generate_file_content(file_paragraphs, seed=iteration).encode()
+        )
+        response = activity_environment.run(
+            embed_file,
+            EmbeddingFileWorkflowRequest(blob_path=blob_path),
+        )
+        return int(response.details["documents"])
+
+    def route(path: str) -> Callable[[int], None]:
+        def call(iteration: int) -> None:
+            response = client.post(
+                path, json={"query": QUERIES[iteration % len(QUERIES)]}
+            )
+            response.raise_for_status()
+
+        return call
+
+    def route_embed_file(iteration: int) -> None:
+        # New bytes every time, as the upload of a file already ingested returns at once
+        response = client.post(
+            "/v1/embed/file",
+            files={
+                "file": (
+                    f"route-{iteration}.txt",
+                    f"{file_content}\n\n{iteration}".encode(),
+                )
+            },
+        )
+        response.raise_for_status()
+
+    # A file whose ingestion completed, uploaded again by every iteration
+    duplicate_file = {
+        "file": ("duplicate.txt", f"{file_content}\n\nduplicate".encode())
+    }
+    response = client.post("/v1/embed/file", files=duplicate_file)
+    response.raise_for_status()
+    FakeTemporalClient().complete(
+        response.json()["details"]["workflow_id"],
+        EmbeddingResponse(
+            status="success",
+            message="Embeddings created successfully",
+            details={"documents": 1},
+        ).model_dump(mode="json"),
+    )
+
+    def route_embed_file_duplicate(iteration: int) -> None:
+        response = client.post("/v1/embed/file", files=duplicate_file)
+        response.raise_for_status()
+        assert response.json()["message"] == "File already ingested"
+
+    return {
+        "rag_query": query,
+        "agentic_graph": agentic,
+        "agentic_follow_up": follow_up,
+        "embed_file": ingest,
+        "route_query_simple": route("/v1/query/simple"),
+        "route_query_agentic": route("/v1/query/agentic"),
+        "route_query_documents": route("/v1/query/documents"),
+        "route_embed_file": route_embed_file,
+        "route_embed_duplicate": route_embed_file_duplicate,
+    }
+
+
+def compare(
+    report: BenchmarkReport,
+    baseline: BenchmarkReport,
+    tolerance: float,
+) -> list[str]:
+    """
+    Compare a report against a baseline.
+
+    Args:
+        report(BenchmarkReport): The current report.
+        baseline(BenchmarkReport): The stored baseline.
+        tolerance(float): The allowed relative regression, e.g. 0.2 for 20%.
+
+    Returns:
+        (list[str]): A description of every regression found.
+    """
+    baseline_results = {result.name: result for result in baseline.results}
+    regressions = []
+    for result in report.results:
+        reference = baseline_results.get(result.name)
+        if reference is None:
+            continue
+        if result.p95_ms > reference.p95_ms * (1 + tolerance):
+            regressions.append(
+                f"{result.name}: p95 {result.p95_ms:.1f}ms > baseline {reference.p95_ms:.1f}ms"
+            )
+        if result.throughput_per_second < reference.throughput_per_second * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{result.name}: throughput {result.throughput_per_second:.1f}/s "
+                f"< baseline {reference.throughput_per_second:.1f}/s"
+            )
+    return regressions
+
+
+def print_report(report: BenchmarkReport) -> None:
+    """
+    Print a report as a table.
+
+    Args:
+        report(BenchmarkReport): The report to print.
+    """
+    print(
+        f"{'benchmark':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'items/s':>10}"
+    )
+    for result in report.results:
+        items = f"{result.items_per_second:.1f}" if result.items_per_second else "-"
+        print(
+            f"{result.name:<24}{result.p50_ms:>10.1f}{result.p95_ms:>10.1f}"
+            f"{result.p99_ms:>10.1f}{result.throughput_per_second:>10.1f}{items:>10}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--corpus-size", type=int, default=300)
+    parser.add_argument("--file-paragraphs", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=OfflineLatency().llm)
+    parser.add_argument(
+        "--embedding-latency", type=float, default=OfflineLatency().embedding
+    )
+    parser.add_argument(
+        "--vector-store-latency", type=float, default=OfflineLatency().vector_store
+    )
+    parser.add_argument(
+        "--extraction-latency", type=float, default=OfflineLatency().extraction
+    )
+    parser.add_argument(
+        "--only", nargs="*", default=None, help="Names of the benchmarks to run"
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    configure_offline_environment()
+
+    latency = OfflineLatency(
+        llm=args.llm_latency,
+        embedding=args.embedding_latency,
+        vector_store=args.vector_store_latency,
+        extraction=args.extraction_latency,
+    )
+    with temporary_working_directory(), offline_services(latency) as services:
+        from services.embeddings import VectorStoreHandler
+
+        VectorStoreHandler().from_documents(generate_documents(args.corpus_size))
+        benchmarks = build_benchmarks(services, args.file_paragraphs)
+        results = [
+            measure(name, operation, args.iterations, args.concurrency)
+            for name, operation in benchmarks.items()
+            if not args.only or name in args.only
+        ]
+
+    report = BenchmarkReport(
+        metadata={
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "corpus_size": args.corpus_size,
+            "file_paragraphs": args.file_paragraphs,
+            "latency": latency.model_dump(),
+        },
+        results=results,
+    )
+    print_report(report)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report.model_dump_json(indent=2))
+
+    if args.baseline:
+        baseline = BenchmarkReport.model_validate_json(args.baseline.read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
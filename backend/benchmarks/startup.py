@@ -0,0 +1,138 @@
+"""
+Startup profiler: reports the import cost of every module and checks the API startup budget.
+Run it from the backend folder:
+
+    PYTHONPATH=./src python -m benchmarks.startup --top 20 --budget-ms 1500
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from pydantic import BaseModel
+
+from benchmarks.fakes import OFFLINE_ENVIRONMENT
+
+_IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+HEALTH_CHECK_SCRIPT = """
+from fastapi.testclient import TestClient
+from main import app
+with TestClient(app) as client:
+    client.get("/health").raise_for_status()
+"""
+
+
+class ModuleImportTime(BaseModel):
+    """
+    Import cost of a module.
+
+    Attributes:
+        name(str): The name of the module.
+        self_ms(float): The time spent importing the module itself.
+        cumulative_ms(float): The time spent importing the module and its dependencies.
+    """
+
+    name: str
+    self_ms: float
+    cumulative_ms: float
+
+
+def profile_imports(module: str, env: dict[str, str]) -> list[ModuleImportTime]:
+    """
+    Import a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module(str): The module to import.
+        env(dict[str, str]): The environment of the interpreter.
+
+    Returns:
+        (list[ModuleImportTime]): The import cost of every loaded module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME_PATTERN.match(line)
+        if match:
+            modules.append(
+                ModuleImportTime(
+                    name=match.group(4),
+                    self_ms=int(match.group(1)) / 1000,
+                    cumulative_ms=int(match.group(2)) / 1000,
+                )
+            )
+    return modules
+
+
+def time_to_health_check(env: dict[str, str]) -> float:
+    """
+    Measure the time from the interpreter start to the first served health check.
+
+    Args:
+        env(dict[str, str]): The environment of the interpreter.
+
+    Returns:
+        (float): The elapsed time in milliseconds.
+    """
+    started_at = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", HEALTH_CHECK_SCRIPT],
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    return (time.perf_counter() - started_at) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="main", help="Module to profile")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="Fail if the first health check takes longer than this",
+    )
+    args = parser.parse_args()
+
+    env = {**OFFLINE_ENVIRONMENT, **os.environ}
+    modules = profile_imports(args.module, env)
+
+    print(f"{'module':<60}{'self ms':>10}{'cumul. ms':>12}")
+    for module in sorted(modules, key=lambda m: m.cumulative_ms, reverse=True)[
+        : args.top
+    ]:
+        print(f"{module.name:<60}{module.self_ms:>10.1f}{module.cumulative_ms:>12.1f}")
+
+    packages: dict[str, float] = defaultdict(float)
+    for module in modules:
+        packages[module.name.split(".")[0]] += module.self_ms
+    print(f"\n{'package':<60}{'self ms':>10}")
+    for package, self_ms in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"{package:<60}{self_ms:>10.1f}")
+
+    total_ms = sum(module.self_ms for module in modules)
+    health_ms = time_to_health_check(env)
+    print(f"\nimport {args.module}: {total_ms:.1f}ms")
+    print(f"first health check: {health_ms:.1f}ms")
+    if args.budget_ms is not None and health_ms > args.budget_ms:
+        print(f"OVER BUDGET: {health_ms:.1f}ms > {args.budget_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Command line tool to create, describe and delete the Weaviate collections with explicit index settings.
+Run it from the src folder:
+
+    python collection.py create --index Documents --quantization pq --max-connections 16
+    python collection.py describe --index Documents
+"""
+
+import argparse
+import json
+
+from weaviate import connect_to_local
+
+from services.collections import IndexSettings, create_collection
+from utils.config import get_config
+
+
+def main() -> None:
+    settings = IndexSettings.from_config()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Create a collection")
+    create_parser.add_argument("--index", default="Documents")
+    create_parser.add_argument(
+        "--index-type", choices=["hnsw", "flat", "dynamic"], default=settings.index_type
+    )
+    create_parser.add_argument(
+        "--quantization",
+        choices=["none", "pq", "bq", "sq"],
+        default=settings.quantization,
+    )
+    create_parser.add_argument(
+        "--ef-construction", type=int, default=settings.ef_construction
+    )
+    create_parser.add_argument(
+        "--max-connections", type=int, default=settings.max_connections
+    )
+    create_parser.add_argument("--ef", type=int, default=settings.ef)
+    create_parser.add_argument(
+        "--pq-training-limit", type=int, default=settings.pq_training_limit
+    )
+
+    describe_parser = subparsers.add_parser("describe", help="Describe a collection")
+    describe_parser.add_argument("--index", default="Documents")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete a collection")
+    delete_parser.add_argument("--index", required=True)
+    args = parser.parse_args()
+
+    client = connect_to_local(
+        host=get_config().weaviate_host,
+        port=get_config().weaviate_port,
+        grpc_port=get_config().weaviate_grpc_port,
+    )
+    try:
+        if args.command == "create":
+            create_collection(
+                client,
+                args.index,
+                IndexSettings(
+                    index_type=args.index_type,
+                    quantization=args.quantization,
+                    ef_construction=args.ef_construction,
+                    max_connections=args.max_connections,
+                    ef=args.ef,
+                    pq_training_limit=args.pq_training_limit,
+                ),
+            )
+            print(f"Created collection {args.index}")
+        elif args.command == "describe":
+            config = client.collections.get(args.index).config.get()
+            print(json.dumps(config.to_dict(), indent=2, default=str))
+        else:
+            client.collections.delete(args.index)
+            print(f"Deleted collection {args.index}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
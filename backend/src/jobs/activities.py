@@ -2,20 +2,74 @@
 Set of temporal activities to execute asynchronously.
 """
 
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 
 from temporalio import activity
+from temporalio.exceptions import ApplicationError
+from weaviate import connect_to_local
 
+from services.aliases import set_index_alias
+from services.dedup import DedupService
 from services.embeddings import VectorStoreHandler
 from services.files import FileHandler, TextExtractor
+from services.reindex import ReindexService
 from utils.config import get_config
-from utils.types import EmbeddingFileWorkflowRequest, EmbeddingResponse
+from utils.metrics import INGESTION_STAGE_SECONDS, RETRIES
+from utils.profiling import profile
+from utils.tracing import get_tracer
+from utils.types import (
+    EmbeddingFileWorkflowRequest,
+    EmbeddingResponse,
+    IndexAliasRequest,
+    ReindexChunksRequest,
+    ReindexPlan,
+    ReindexSyncResult,
+    ReindexValidationRequest,
+    ReindexWorkflowRequest,
+)
+
+
+@contextmanager
+def _ingestion_stage(stage: str) -> Iterator[None]:
+    """
+    Trace and time a stage of the ingestion.
+
+    Args:
+        stage (str): The name of the stage.
+    """
+    with (
+        get_tracer().start_as_current_span(stage),
+        INGESTION_STAGE_SECONDS.labels(stage=stage).time(),
+    ):
+        yield
 
 
 @activity.defn
 def embed_file(request: EmbeddingFileWorkflowRequest) -> EmbeddingResponse:
     """
-    Embed a file.
+    Embed a file, profiled into `embed_file-<workflow ID>-<attempt>.prof` when asked by
+    the request.
+
+    Args:
+        request (EmbeddingFileRequest): The request to embed a file.
+
+    Returns:
+        (EmbeddingResponse): The response from the activity.
+    """
+    info = activity.info()
+    if info.attempt > 1:
+        RETRIES.labels(operation="embed_file").inc()
+    if not request.profile:
+        return _embed_file(request)
+    with profile("embed_file", f"{info.workflow_id}-{info.attempt}"):
+        return _embed_file(request)
+
+
+def _embed_file(request: EmbeddingFileWorkflowRequest) -> EmbeddingResponse:
+    """
+    Download, extract, deduplicate, embed and index a file.
 
     Args:
         request (EmbeddingFileRequest): The request to embed a file.
@@ -25,22 +79,43 @@ def embed_file(request: EmbeddingFileWorkflowRequest) -> EmbeddingResponse:
     """
     blob_path = request.blob_path
 
-    # Download the file from the blob storage
-    file_path = Path(f"./data/tmp/{blob_path}")
+    # Stream the file from the blob storage into a spooled buffer, released once extracted
     file_handler = FileHandler()
-    file_handler.download_from_blob(
-        get_config().storage_bucket,
-        blob_path,
-        str(file_path),
-    )
-
-    # Extract the text from the file
     text_extractor = TextExtractor()
-    documents = text_extractor.extract_text_from_file(file_path)
+    with ExitStack() as stack:
+        with _ingestion_stage("download"):
+            blob = stack.enter_context(
+                file_handler.open_blob(get_config().storage_bucket, blob_path)
+            )
+            blob_info = file_handler.get_blob_info(
+                get_config().storage_bucket, blob_path
+            )
+
+        # Extract the text from the file
+        with _ingestion_stage("extract"):
+            documents, extraction = text_extractor.extract_stream(
+                blob, Path(blob_path).name
+            )
+
+    # Add the filterable metadata: the uploaded one and the origin of the chunks
+    for document in documents:
+        document.metadata.update(blob_info.metadata)
+        document.metadata["blob_path"] = blob_path
+        document.metadata["uploaded_at"] = int(blob_info.uploaded_at.timestamp())
+        document.excluded_embed_metadata_keys.extend(["blob_path", "uploaded_at"])
+        document.excluded_llm_metadata_keys.extend(["blob_path", "uploaded_at"])
+
+    # Drop, or link, the near-duplicates of each other and of the indexed chunks
+    with _ingestion_stage("dedup"):
+        unique_documents, dedup_stats = DedupService(
+            index_name=request.index_name
+        ).deduplicate(documents)
 
     # Create embeddings for the documents
-    vector_store = VectorStoreHandler()
-    vector_store.from_documents(documents)
+    vector_store = VectorStoreHandler(index_name=request.index_name)
+    with _ingestion_stage("embed_and_index"):
+        if unique_documents:
+            vector_store.from_documents(unique_documents)
 
     return EmbeddingResponse(
         status="success",
@@ -48,5 +123,124 @@ def embed_file(request: EmbeddingFileWorkflowRequest) -> EmbeddingResponse:
         details={
             "blob_path": blob_path,
             "documents": len(documents),
+            "indexed": len(unique_documents),
+            "extractor": extraction.extractor,
+            "extraction_strategy": extraction.strategy or "none",
+            "extraction_reason": extraction.reason,
+            "extraction_seconds": extraction.seconds,
+            "dedup_mode": dedup_stats.mode,
+            "duplicates_in_file": dedup_stats.duplicates_in_file,
+            "duplicates_in_index": dedup_stats.duplicates_in_index,
         },
     )
+
+
+@activity.defn
+def plan_reindex(request: ReindexWorkflowRequest) -> ReindexPlan:
+    """
+    Plan the rebuild of an index: create the new collection and list the work units.
+
+    Args:
+        request (ReindexWorkflowRequest): The re-index request, with its target index.
+
+    Returns:
+        (ReindexPlan): The work units of the backfill.
+    """
+    try:
+        return ReindexService().plan(request)
+    except ValueError as error:
+        raise ApplicationError(str(error), non_retryable=True) from error
+
+
+@activity.defn
+def list_blob_paths() -> list[str]:
+    """
+    List the files of the blob storage, to catch up with the files uploaded during a re-index.
+
+    Returns:
+        (list[str]): The paths of the files.
+    """
+    return ReindexService().list_blob_paths()
+
+
+@activity.defn
+def list_unindexed_blob_paths(index_name: str) -> list[str]:
+    """
+    List the files of the blob storage without any chunk in a collection, to catch up with
+    the files ingested into the previous collection after a re-index switched to it.
+
+    Args:
+        index_name (str): The collection.
+
+    Returns:
+        (list[str]): The paths of the files.
+    """
+    return ReindexService().list_unindexed_blob_paths(index_name)
+
+
+@activity.defn
+def copy_chunks(request: ReindexChunksRequest) -> int:
+    """
+    Copy a range of chunks to the collection being rebuilt.
+
+    Args:
+        request (ReindexChunksRequest): The range to copy.
+
+    Returns:
+        (int): The number of copied chunks.
+    """
+    return ReindexService().copy_chunks(request, on_batch=activity.heartbeat)
+
+
+@activity.defn
+def sync_chunks(request: ReindexChunksRequest) -> ReindexSyncResult:
+    """
+    Copy the chunks ingested into the current collection during a re-index from chunks,
+    and delete the ones deleted from it when asked.
+
+    Args:
+        request (ReindexChunksRequest): The collections.
+
+    Returns:
+        (ReindexSyncResult): The numbers of copied and deleted chunks.
+    """
+    return ReindexService().sync_chunks(request, on_batch=activity.heartbeat)
+
+
+@activity.defn
+def validate_reindex(request: ReindexValidationRequest) -> int:
+    """
+    Check a rebuilt collection can replace the current one.
+
+    Args:
+        request (ReindexValidationRequest): The collections to compare.
+
+    Returns:
+        (int): The number of chunks of the rebuilt collection.
+    """
+    try:
+        return ReindexService().validate_target(request)
+    except ValueError as error:
+        raise ApplicationError(str(error), non_retryable=True) from error
+
+
+@activity.defn
+def switch_index_alias(request: IndexAliasRequest) -> str:
+    """
+    Point an index alias to a collection.
+
+    Args:
+        request (IndexAliasRequest): The alias and its new collection.
+
+    Returns:
+        (str): The collection the alias pointed to before.
+    """
+    client = connect_to_local(
+        host=get_config().weaviate_host,
+        port=get_config().weaviate_port,
+        grpc_port=get_config().weaviate_grpc_port,
+    )
+    try:
+        return set_index_alias(client, request.alias, request.target_index)
+    finally:
+        client.close()
@@ -1,12 +1,21 @@
 """
 Set of converters to convert Pydantic models to Temporal payloads.
-Taken from:
+The JSON encoder based ones are taken from:
 https://github.com/temporalio/samples-python/blob/2f3f2ac03d75e854e592b476354c0d692eb23f3b/pydantic_converter/converter.py
+
+`get_data_converter` is the one used by the clients and the worker: it serializes with
+pydantic-core, validates the payloads back into the expected types, and compresses
+the large payloads.
 """
 
 import json
+import zlib
+from collections.abc import Sequence
+from functools import lru_cache
 from typing import Any
 
+import pydantic_core
+from pydantic import TypeAdapter
 from pydantic.json import pydantic_encoder
 from temporalio.api.common.v1 import Payload
 from temporalio.converter import (
@@ -14,8 +23,11 @@ from temporalio.converter import (
     DataConverter,
     DefaultPayloadConverter,
     JSONPlainPayloadConverter,
+    PayloadCodec,
 )
 
+from utils.config import get_config
+
 
 class PydanticJSONPayloadConverter(JSONPlainPayloadConverter):
     """Pydantic JSON payload converter.
@@ -62,3 +74,168 @@ pydantic_data_converter = DataConverter(
     payload_converter_class=PydanticPayloadConverter
 )
 """Data converter using Pydantic JSON conversion."""
+
+
+@lru_cache(maxsize=256)
+def get_type_adapter(type_hint: Any) -> TypeAdapter:
+    """
+    Get the adapter validating a type, built once per type as it compiles a validator.
+
+    Args:
+        type_hint(Any): The type, e.g. a Pydantic model or `list[str]`.
+
+    Returns:
+        (TypeAdapter): The adapter of the type.
+    """
+    return TypeAdapter(type_hint)
+
+
+class PydanticCoreJSONPayloadConverter(JSONPlainPayloadConverter):
+    """
+    JSON payload converter using the pydantic-core serializer, which handles the models,
+    dataclasses, dates and UUIDs natively instead of calling back into Python for every object.
+    The payloads are validated back into the type hint of the activity or workflow, if any.
+    """
+
+    def to_payload(self, value: Any) -> Payload | None:
+        """
+        Convert a value to JSON or fail, as the last converter of the chain.
+
+        Args:
+            value(Any): The value to convert.
+
+        Returns:
+            (Payload | None): The JSON payload.
+        """
+        return Payload(
+            metadata={"encoding": self.encoding.encode()},
+            data=pydantic_core.to_json(value),
+        )
+
+    def from_payload(self, payload: Payload, type_hint: type | None = None) -> Any:
+        """
+        Parse a JSON payload, into the type hint if given.
+
+        Args:
+            payload(Payload): The payload.
+            type_hint(type | None): The expected type.
+
+        Returns:
+            (Any): The value.
+        """
+        if type_hint is None or type_hint is Any:
+            return pydantic_core.from_json(payload.data)
+        try:
+            adapter = get_type_adapter(type_hint)
+        except TypeError:
+            # Unhashable type hint, not worth caching
+            adapter = TypeAdapter(type_hint)
+        return adapter.validate_json(payload.data)
+
+
+class PydanticCorePayloadConverter(CompositePayloadConverter):
+    """
+    Payload converter that replaces Temporal JSON conversion with pydantic-core JSON conversion.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            *(
+                (
+                    c
+                    if not isinstance(c, JSONPlainPayloadConverter)
+                    else PydanticCoreJSONPayloadConverter()
+                )
+                for c in DefaultPayloadConverter.default_encoding_payload_converters
+            )
+        )
+
+
+class CompressionCodec(PayloadCodec):
+    """
+    Compresses the payloads from a size with zlib, to stay below the Temporal payload limits
+    and keep the workflow histories small. The smaller payloads are left as they are,
+    so they stay readable in the Temporal UI.
+
+    Attributes:
+        threshold(int): The size in bytes from which a payload is compressed.
+        level(int): The zlib compression level. The fastest one compresses the JSON
+            of the embeddings about as well as the default one, in a fifth of the time.
+    """
+
+    encoding = b"binary/zlib"
+
+    def __init__(self, threshold: int = 4096, level: int = 1) -> None:
+        self.threshold = threshold
+        self.level = level
+
+    async def encode(self, payloads: Sequence[Payload]) -> list[Payload]:
+        """
+        Compress the payloads above the threshold.
+
+        Args:
+            payloads(Sequence[Payload]): The payloads.
+
+        Returns:
+            (list[Payload]): The payloads, compressed when it saves space.
+        """
+        return [self.encode_payload(payload) for payload in payloads]
+
+    async def decode(self, payloads: Sequence[Payload]) -> list[Payload]:
+        """
+        Decompress the compressed payloads.
+
+        Args:
+            payloads(Sequence[Payload]): The payloads.
+
+        Returns:
+            (list[Payload]): The original payloads.
+        """
+        return [self.decode_payload(payload) for payload in payloads]
+
+    def encode_payload(self, payload: Payload) -> Payload:
+        """
+        Compress a payload, with its metadata, if it is large enough.
+
+        Args:
+            payload(Payload): The payload.
+
+        Returns:
+            (Payload): The compressed payload, or the payload itself.
+        """
+        if payload.ByteSize() < self.threshold:
+            return payload
+        data = payload.SerializeToString()
+        compressed = zlib.compress(data, self.level)
+        if len(compressed) >= len(data):
+            return payload
+        return Payload(metadata={"encoding": self.encoding}, data=compressed)
+
+    def decode_payload(self, payload: Payload) -> Payload:
+        """
+        Decompress a payload compressed by this codec.
+
+        Args:
+            payload(Payload): The payload.
+
+        Returns:
+            (Payload): The original payload.
+        """
+        if payload.metadata.get("encoding") != self.encoding:
+            return payload
+        return Payload.FromString(zlib.decompress(payload.data))
+
+
+@lru_cache
+def get_data_converter() -> DataConverter:
+    """
+    Get the data converter of the Temporal clients and worker.
+    Payloads written by the default converter are still read, as they are plain JSON.
+
+    Returns:
+        (DataConverter): The pydantic-core converter with the compression codec.
+    """
+    return DataConverter(
+        payload_converter_class=PydanticCorePayloadConverter,
+        payload_codec=CompressionCodec(get_config().temporal_compression_threshold),
+    )
@@ -2,6 +2,8 @@
 Set of temporal workflows to orchestrate embedding activities.
 """
 
+import asyncio
+import uuid
 from datetime import timedelta
 
 from temporalio import workflow
@@ -9,9 +11,43 @@ from temporalio import workflow
 # Import our activity, passing it through the sandbox
 with workflow.unsafe.imports_passed_through():
     from temporalio.common import RetryPolicy
+    from temporalio.exceptions import ActivityError, ApplicationError
 
-    from jobs.activities import embed_file
-    from utils.types import EmbeddingFileWorkflowRequest, EmbeddingResponse
+    from jobs.activities import (
+        copy_chunks,
+        embed_file,
+        list_blob_paths,
+        list_unindexed_blob_paths,
+        plan_reindex,
+        switch_index_alias,
+        sync_chunks,
+        validate_reindex,
+    )
+    from utils.types import (
+        EmbeddingFileWorkflowRequest,
+        EmbeddingResponse,
+        IndexAliasRequest,
+        IngestionLane,
+        ReindexChunksRequest,
+        ReindexPlan,
+        ReindexProgress,
+        ReindexValidationRequest,
+        ReindexWorkflowRequest,
+    )
+
+
+def get_embed_timeout(lane: IngestionLane | None) -> timedelta:
+    """
+    Get the time a file may wait in its lane and be embedded in.
+    The heavy files queue behind each other and may need OCR, so they are given longer.
+
+    Args:
+        lane (IngestionLane | None): The lane of the file, None if it was not classified.
+
+    Returns:
+        (timedelta): The schedule-to-close timeout of the embedding activity.
+    """
+    return timedelta(hours=6) if lane == "heavy" else timedelta(minutes=10)
 
 
 @workflow.defn
@@ -24,6 +60,7 @@ class EmbedFilesWorkflow:
     async def run(self, request: EmbeddingFileWorkflowRequest) -> EmbeddingResponse:
         """
         Run the workflow to embed files.
+        The activity runs on the task queue of the workflow, i.e. in the lane of the file.
 
         Args:
             request (EmbeddingFileWorkflowRequest): The request to embed files.
@@ -34,7 +71,7 @@ class EmbedFilesWorkflow:
         result = await workflow.execute_activity(
             embed_file,
             request,
-            schedule_to_close_timeout=timedelta(minutes=10),
+            schedule_to_close_timeout=get_embed_timeout(request.lane),
             retry_policy=RetryPolicy(
                 maximum_attempts=10,
             ),
@@ -45,3 +82,258 @@ class EmbedFilesWorkflow:
             status="error",
             message="Failed to embed file",
         )
+
+
+@workflow.defn
+class ReindexWorkflow:
+    """
+    Workflow to rebuild an index in a new collection, from the stored files or chunks,
+    and switch its alias to it once validated. The current collection serves the queries
+    until the switch, and is kept afterwards to roll back.
+    """
+
+    def __init__(self) -> None:
+        self.__progress = ReindexProgress()
+        self.__semaphore = asyncio.Semaphore(1)
+        # The files embedded, or attempted, into the new collection
+        self.__blob_paths: set[str] = set()
+
+    @workflow.query
+    def progress(self) -> ReindexProgress:
+        """
+        Get the progress of the re-index.
+
+        Returns:
+            (ReindexProgress): The progress.
+        """
+        return self.__progress
+
+    @workflow.run
+    async def run(self, request: ReindexWorkflowRequest) -> ReindexProgress:
+        """
+        Run the workflow to rebuild an index.
+        After the switch, the processes keep writing to the current collection until their
+        cached alias expires, so the new collection catches up with it once more.
+
+        Args:
+            request (ReindexWorkflowRequest): The re-index request.
+
+        Returns:
+            (ReindexProgress): The final progress.
+        """
+        target_index = (
+            request.target_index
+            or f"{request.alias}_{workflow.now().strftime('%Y%m%d%H%M%S')}"
+        )
+        self.__semaphore = asyncio.Semaphore(request.parallelism)
+        try:
+            plan = await workflow.execute_activity(
+                plan_reindex,
+                request.model_copy(update={"target_index": target_index}),
+                start_to_close_timeout=timedelta(minutes=30),
+                retry_policy=RetryPolicy(maximum_attempts=3),
+            )
+            self.__progress = ReindexProgress(
+                phase="backfill",
+                source_index=plan.source_index,
+                target_index=plan.target_index,
+                # The files are counted as they are listed
+                total=len(plan.cursors),
+            )
+            if request.source == "blobs":
+                self.__progress.warnings.append(
+                    "Chunks deleted from the current collection during the re-index are "
+                    "not deleted from the new one, which is rebuilt from the stored files"
+                )
+            await self.__backfill(request, plan)
+
+            self.__progress.phase = "validation"
+            self.__progress.documents = await workflow.execute_activity(
+                validate_reindex,
+                ReindexValidationRequest(
+                    source_index=plan.source_index,
+                    target_index=plan.target_index,
+                    min_document_ratio=request.min_document_ratio
+                    if request.source == "chunks"
+                    else 0.0,
+                ),
+                start_to_close_timeout=timedelta(minutes=5),
+            )
+
+            if request.switch_alias:
+                self.__progress.phase = "switch"
+                await workflow.execute_activity(
+                    switch_index_alias,
+                    IndexAliasRequest(
+                        alias=request.alias, target_index=plan.target_index
+                    ),
+                    start_to_close_timeout=timedelta(minutes=1),
+                )
+
+                self.__progress.phase = "catch-up"
+                await asyncio.sleep(plan.alias_cache_ttl)
+                await self.__catch_up(request, plan)
+        except (ActivityError, ApplicationError) as error:
+            cause = error.cause if isinstance(error, ActivityError) else None
+            self.__progress.phase = "failed"
+            self.__progress.message = str(cause or error)
+            raise ApplicationError(
+                f"Re-index failed: {self.__progress.message}"
+            ) from error
+
+        self.__progress.phase = "done"
+        return self.__progress
+
+    async def __backfill(
+        self,
+        request: ReindexWorkflowRequest,
+        plan: ReindexPlan,
+    ) -> None:
+        """
+        Fill the new collection, running `parallelism` work units at once, then catch up
+        with the changes made to the current collection meanwhile.
+
+        Args:
+            request (ReindexWorkflowRequest): The re-index request.
+            plan (ReindexPlan): The work units.
+
+        Raises:
+            ApplicationError: If more files than allowed failed.
+        """
+
+        async def copy(after: uuid.UUID | None, before: uuid.UUID | None) -> None:
+            async with self.__semaphore:
+                self.__progress.documents += await workflow.execute_activity(
+                    copy_chunks,
+                    ReindexChunksRequest(
+                        source_index=plan.source_index,
+                        target_index=plan.target_index,
+                        after=after,
+                        before=before,
+                        reembed=request.reembed,
+                        batch_size=request.batch_size,
+                    ),
+                    start_to_close_timeout=timedelta(minutes=30),
+                    heartbeat_timeout=timedelta(minutes=2),
+                    retry_policy=RetryPolicy(maximum_attempts=5),
+                )
+                self.__progress.completed += 1
+
+        if request.source == "chunks":
+            await asyncio.gather(
+                *(
+                    copy(after, before)
+                    for after, before in zip(
+                        plan.cursors, plan.cursors[1:] + [None], strict=True
+                    )
+                )
+            )
+            # Catch up with the chunks ingested or deleted during the copy, in ranges already copied
+            await self.__sync_chunks(request, plan, delete_missing=True)
+            return
+
+        await self.__embed_files(plan, plan.blob_paths)
+        # Catch up with the files uploaded during the backfill, which went to the current collection
+        blob_paths = await workflow.execute_activity(
+            list_blob_paths,
+            start_to_close_timeout=timedelta(minutes=5),
+        )
+        await self.__embed_files(plan, blob_paths)
+
+        if self.__progress.failed > request.max_failures:
+            raise ApplicationError(
+                f"{self.__progress.failed} files failed, "
+                f"more than the {request.max_failures} allowed"
+            )
+
+    async def __catch_up(
+        self,
+        request: ReindexWorkflowRequest,
+        plan: ReindexPlan,
+    ) -> None:
+        """
+        Copy to the new collection what was ingested into the current one since the last
+        catch-up, including by the processes holding the previous alias after the switch.
+        The new collection serves the queries by then, so deletions are not synced any more.
+
+        Args:
+            request (ReindexWorkflowRequest): The re-index request.
+            plan (ReindexPlan): The work units.
+        """
+        if request.source == "chunks":
+            await self.__sync_chunks(request, plan, delete_missing=False)
+            return
+
+        # Files ingested into the new collection after the switch have chunks there already
+        blob_paths = await workflow.execute_activity(
+            list_unindexed_blob_paths,
+            plan.target_index,
+            start_to_close_timeout=timedelta(minutes=30),
+        )
+        await self.__embed_files(plan, blob_paths)
+
+    async def __sync_chunks(
+        self,
+        request: ReindexWorkflowRequest,
+        plan: ReindexPlan,
+        delete_missing: bool,
+    ) -> None:
+        """
+        Copy the chunks of the current collection missing from the new one.
+
+        Args:
+            request (ReindexWorkflowRequest): The re-index request.
+            plan (ReindexPlan): The work units.
+            delete_missing (bool): Whether to delete the chunks of the new collection
+                missing from the current one.
+        """
+        result = await workflow.execute_activity(
+            sync_chunks,
+            ReindexChunksRequest(
+                source_index=plan.source_index,
+                target_index=plan.target_index,
+                reembed=request.reembed,
+                batch_size=request.batch_size,
+                delete_missing=delete_missing,
+            ),
+            start_to_close_timeout=timedelta(minutes=30),
+            heartbeat_timeout=timedelta(minutes=2),
+            retry_policy=RetryPolicy(maximum_attempts=5),
+        )
+        self.__progress.documents += result.copied
+        self.__progress.deleted += result.deleted
+
+    async def __embed_files(self, plan: ReindexPlan, blob_paths: list[str]) -> None:
+        """
+        Embed the files not embedded yet into the new collection, `parallelism` at once.
+
+        Args:
+            plan (ReindexPlan): The work units.
+            blob_paths (list[str]): The paths of the files.
+        """
+        # Planned by a previous version without lanes when there is no queue
+        lane: IngestionLane | None = "heavy" if plan.embed_task_queue else None
+
+        async def embed(blob_path: str) -> None:
+            async with self.__semaphore:
+                try:
+                    result = await workflow.execute_activity(
+                        embed_file,
+                        EmbeddingFileWorkflowRequest(
+                            blob_path=blob_path,
+                            index_name=plan.target_index,
+                            lane=lane,
+                        ),
+                        task_queue=plan.embed_task_queue,
+                        schedule_to_close_timeout=get_embed_timeout(lane),
+                        retry_policy=RetryPolicy(maximum_attempts=3),
+                    )
+                    self.__progress.documents += int(result.details.get("documents", 0))
+                    self.__progress.completed += 1
+                except ActivityError:
+                    self.__progress.failed += 1
+
+        new_blob_paths = sorted(set(blob_paths) - self.__blob_paths)
+        self.__blob_paths.update(new_blob_paths)
+        self.__progress.total += len(new_blob_paths)
+        await asyncio.gather(*(embed(blob_path) for blob_path in new_blob_paths))
@@ -1,13 +1,54 @@
-from fastapi import FastAPI
+import importlib
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
 from routes.router import router
 from utils.config import get_config
+from utils.profiling import profiling_middleware
+from utils.query_log import get_query_logger, query_log_middleware
+from utils.resilience import CircuitOpenError, DependencyTimeoutError
+from utils.tracing import setup_tracing
+
+setup_tracing("rag-api")
+
+# Heavy modules imported lazily by the routes
+PRELOADED_MODULES = [
+    "services.rag",
+    "services.documents",
+    "services.files",
+    "jobs.workflows",
+]
+
+
+def preload_modules() -> None:
+    """
+    Import the modules loaded lazily by the routes, so the first request does not pay for them.
+    """
+    for module in PRELOADED_MODULES:
+        importlib.import_module(module)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the API and preload the heavy modules in the background,
+    so health checks are served while they load.
+    """
+    if get_config().preload_modules:
+        threading.Thread(target=preload_modules, daemon=True).start()
+    yield
+
 
 app = FastAPI(
     title=get_config().app_name,
     description="API for creating embeddings from files and folders",
     version=get_config().version,
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -19,4 +60,39 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Compress the large responses, e.g. sources with their text or document exports
+app.add_middleware(GZipMiddleware, minimum_size=get_config().gzip_minimum_size)
+
+# Capture the query traffic for later replay
+query_logger = get_query_logger()
+if query_logger is not None:
+    app.middleware("http")(query_log_middleware(query_logger))
+
+# Profile the query requests asking for it
+if get_config().profiling_enabled:
+    app.middleware("http")(profiling_middleware())
+
 app.include_router(router)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, error: CircuitOpenError):
+    """
+    Answer 503 while a dependency fails fast, with the time until it is tried again.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(error), "dependency": error.dependency},
+        headers={"Retry-After": str(int(error.retry_after))},
+    )
+
+
+@app.exception_handler(DependencyTimeoutError)
+async def dependency_timeout_handler(request: Request, error: DependencyTimeoutError):
+    """
+    Answer 504 when a dependency did not answer in time.
+    """
+    return JSONResponse(
+        status_code=504,
+        content={"detail": str(error), "dependency": error.dependency},
+    )
@@ -0,0 +1,131 @@
+"""
+Command line tool to summarize the hot spots of a batch of request profiles.
+Run it from the src folder:
+
+    python profiles.py --path ../data/profiles --name v1_query_simple --top 20
+    python profiles.py --name embed_file --sort cumtime --packages
+
+The profiles are written by `utils/profiling.py` for the query requests sending `X-Profile: 1`
+and the ingestions started with it. The times are wall-clock seconds summed over the profiles,
+so the waits on the dependencies show up as the time of the socket and lock calls.
+"""
+
+import argparse
+import pstats
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from utils.config import get_config
+
+SORT_KEYS = {"tottime": 2, "cumtime": 3, "calls": 1}
+
+
+def get_location(filename: str, line: int, function: str) -> str:
+    """
+    Get a short location of a function, relative to its package.
+
+    Args:
+        filename(str): The file of the function, `~` for the built-in functions.
+        line(int): The line of the function.
+        function(str): The name of the function.
+
+    Returns:
+        (str): The location, e.g. `pydantic/main.py:212(model_validate)`.
+    """
+    if filename == "~":
+        return function
+    return f"{get_module_path(filename)}:{line}({function})"
+
+
+def get_module_path(filename: str) -> str:
+    """
+    Get the path of a file relative to its installation folder.
+
+    Args:
+        filename(str): The path of the file.
+
+    Returns:
+        (str): The relative path, e.g. `llama_index/core/indices/base.py`.
+    """
+    path = Path(filename)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in path.parts:
+            return "/".join(path.parts[path.parts.index(marker) + 1 :])
+    source = Path(__file__).resolve().parent
+    if path.is_relative_to(source):
+        return str(path.relative_to(source))
+    for index, part in enumerate(path.parts):
+        if part.startswith("python3"):
+            return "/".join(path.parts[index + 1 :])
+    return filename
+
+
+def get_package(filename: str) -> str:
+    """
+    Get the package of a file, `builtins` for the built-in functions.
+
+    Args:
+        filename(str): The path of the file.
+
+    Returns:
+        (str): The top-level package, or module, of the file.
+    """
+    if filename == "~":
+        return "builtins"
+    return get_module_path(filename).split("/")[0].removesuffix(".py")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--path", type=Path, default=Path(get_config().profiling_path))
+    parser.add_argument(
+        "--name",
+        default="",
+        help="Only the profiles of an operation, e.g. `v1_query_agentic` or `embed_file`",
+    )
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="tottime")
+    parser.add_argument(
+        "--packages", action="store_true", help="Also sum the own time by package"
+    )
+    args = parser.parse_args()
+
+    files = sorted(args.path.glob(f"{args.name}*.prof"))
+    if not files:
+        print(f"No profiles matching {args.name or '*'} in {args.path}")
+        return 1
+    stats = pstats.Stats(*(str(file) for file in files))
+    total = stats.total_tt or 1.0  # type: ignore[attr-defined]
+    entries = stats.stats.items()  # type: ignore[attr-defined]
+
+    print(f"{len(files)} profiles, {total:.3f} s in total\n")
+    print(
+        f"{'own s':>10}{'own %':>8}{'cum s':>10}{'per profile':>13}{'calls':>10}  function"
+    )
+    ranked = sorted(entries, key=lambda entry: entry[1][SORT_KEYS[args.sort]])
+    for (filename, line, function), (_, calls, own, cumulative, _) in reversed(
+        ranked[-args.top :]
+    ):
+        print(
+            f"{own:>10.3f}{own / total:>8.1%}{cumulative:>10.3f}"
+            f"{own / len(files):>13.4f}{calls:>10}  "
+            f"{get_location(filename, line, function)}"
+        )
+
+    if args.packages:
+        by_package: dict[str, float] = defaultdict(float)
+        for (filename, _, _), (_, _, own, _, _) in entries:
+            by_package[get_package(filename)] += own
+        print(f"\n{'own s':>10}{'own %':>8}  package")
+        for package, own in sorted(
+            by_package.items(), key=lambda item: item[1], reverse=True
+        )[: args.top]:
+            print(f"{own:>10.3f}{own / total:>8.1%}  {package}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,8 @@
 Set of routes for the API.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from routes.v1.v1router import router as v1_router
 
@@ -31,3 +32,14 @@ async def health():
         dict: Status message
     """
     return {"status": "ok"}
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Metrics endpoint in the Prometheus text format.
+
+    Returns:
+        Response: The current value of every registered metric
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
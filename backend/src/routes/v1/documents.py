@@ -0,0 +1,170 @@
+"""
+Set of routes to browse and export the documents stored in the vector database.
+The document service is imported within the handlers, so the API starts without loading Weaviate.
+"""
+
+import uuid
+from collections.abc import Iterator
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from utils.types import DocumentResponse, GetDocumentsResponse
+
+router = APIRouter(
+    prefix="/documents",
+    tags=["documents"],
+)
+
+
+def to_document_response(document: Any) -> DocumentResponse:
+    """
+    Convert a Weaviate object to a document response.
+
+    Args:
+        document(Object): The Weaviate object.
+
+    Returns:
+        (DocumentResponse): The document response.
+    """
+    properties = dict(document.properties)
+    text = properties.pop("text", None)
+    vector = document.vector
+    if isinstance(vector, dict):
+        vector = vector.get("default") or next(iter(vector.values()), None)
+    return DocumentResponse(
+        id=document.uuid,
+        text=text,
+        metadata=properties,
+        vector=vector or None,
+    )
+
+
+@router.get("")
+async def get_documents(
+    after: uuid.UUID | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    fields: list[str] | None = Query(default=None),
+    include_text: bool = False,
+    include_vector: bool = False,
+) -> GetDocumentsResponse:
+    """
+    Get a page of documents, using the ID of the last document of the previous page as cursor.
+
+    Args:
+        after(uuid.UUID | None): The cursor returned by the previous page.
+        limit(int): Maximum number of documents to return.
+        fields(list[str] | None): The metadata fields to return, all of them if not set.
+        include_text(bool): Whether to return the text of the documents.
+        include_vector(bool): Whether to return the vectors of the documents.
+
+    Returns:
+        (GetDocumentsResponse): The page of documents and the cursor of the next page.
+    """
+    from services.documents import DocumentService
+
+    document_service = DocumentService()
+    try:
+        result = document_service.get_documents_after(
+            after=after,
+            limit=limit,
+            fields=fields,
+            include_text=include_text,
+            include_vector=include_vector,
+        )
+        total_documents = document_service.get_document_count()
+    finally:
+        document_service.close()
+    documents = [to_document_response(document) for document in result.objects]
+    return GetDocumentsResponse(
+        documents=documents,
+        total_documents=total_documents,
+        next_cursor=documents[-1].id if len(documents) == limit else None,
+    )
+
+
+@router.get("/export")
+async def export_documents(
+    fields: list[str] | None = Query(default=None),
+    include_text: bool = True,
+    include_vector: bool = False,
+) -> StreamingResponse:
+    """
+    Stream every document of the collection as newline-delimited JSON.
+
+    Args:
+        fields(list[str] | None): The metadata fields to return, all of them if not set.
+        include_text(bool): Whether to return the text of the documents.
+        include_vector(bool): Whether to return the vectors of the documents.
+
+    Returns:
+        (StreamingResponse): One JSON document per line.
+    """
+    from services.documents import DocumentService
+
+    document_service = DocumentService()
+    documents = document_service.iter_documents(
+        fields=fields,
+        include_text=include_text,
+        include_vector=include_vector,
+    )
+
+    def generate_lines() -> Iterator[str]:
+        # Closed once the export is sent, or the client disconnected
+        try:
+            for document in documents:
+                yield (
+                    to_document_response(document).model_dump_json(exclude_none=True)
+                    + "\n"
+                )
+        finally:
+            document_service.close()
+
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
+
+
+@router.get("/count")
+async def get_document_count() -> dict[str, int]:
+    """
+    Get the total number of documents, cached for a short time.
+
+    Returns:
+        (dict[str, int]): The total number of documents.
+    """
+    from services.documents import DocumentService
+
+    document_service = DocumentService()
+    try:
+        return {"total_documents": document_service.get_document_count()}
+    finally:
+        document_service.close()
+
+
+@router.get("/{doc_id}")
+async def get_document(
+    doc_id: uuid.UUID,
+    include_vector: bool = False,
+) -> DocumentResponse:
+    """
+    Get a document by its ID.
+
+    Args:
+        doc_id(uuid.UUID): The ID of the document.
+        include_vector(bool): Whether to return the vector of the document.
+
+    Returns:
+        (DocumentResponse): The document.
+    """
+    from services.documents import DocumentService
+
+    document_service = DocumentService()
+    try:
+        document = document_service.get_document_by_id(
+            doc_id, include_vector=include_vector
+        )
+    except LookupError as error:
+        raise HTTPException(status_code=404, detail=str(error)) from error
+    finally:
+        document_service.close()
+    return to_document_response(document)
@@ -1,63 +1,261 @@
 """
 Set of routes to create embeddings for files and folders.
+Temporal, the workflows and the file services are imported within the handlers,
+so the API starts without loading them.
 """
 
-import uuid
+import asyncio
+import hashlib
+import json
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from fastapi import APIRouter, File, UploadFile
-from temporalio.client import Client
+from fastapi import APIRouter, File, Form, Header, HTTPException, UploadFile
+from pydantic import TypeAdapter, ValidationError
 
-from jobs.workflows import EmbedFilesWorkflow
-from services.files import FileHandler
 from utils.config import get_config
+from utils.profiling import is_profile_requested
+from utils.tracing import get_temporal_interceptors, get_tracer
 from utils.types import (
+    DocumentMetadata,
     EmbeddingFileWorkflowRequest,
     EmbeddingResponse,
 )
 
+if TYPE_CHECKING:
+    from temporalio.client import Client
+
+# S3 limits the user metadata of an object to 2 KB
+MAX_METADATA_SIZE = 2000
+
 router = APIRouter(
     prefix="/embed",
     tags=["embeddings"],
 )
 
 
+def parse_document_metadata(metadata: str | None) -> dict:
+    """
+    Parse and validate the metadata uploaded with a file.
+
+    Args:
+        metadata (str | None): The metadata as a JSON object of scalar values
+
+    Returns:
+        dict: The metadata, empty if not given
+
+    Raises:
+        HTTPException: If the metadata is invalid or too large
+    """
+    if not metadata:
+        return {}
+    if len(metadata.encode()) > MAX_METADATA_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"The metadata must not exceed {MAX_METADATA_SIZE} bytes",
+        )
+    try:
+        return TypeAdapter(DocumentMetadata).validate_python(json.loads(metadata))
+    except (json.JSONDecodeError, ValidationError) as error:
+        raise HTTPException(
+            status_code=422, detail=f"Invalid metadata: {error}"
+        ) from error
+
+
+async def get_existing_ingestion(
+    temporal_client: "Client", workflow_id: str
+) -> EmbeddingResponse | None:
+    """
+    Get the status of a previous ingestion of the same bytes.
+
+    Args:
+        temporal_client (Client): The Temporal client
+        workflow_id (str): The ID of the ingestion workflow
+
+    Returns:
+        EmbeddingResponse | None: The status of the ingestion, None if there is none
+            or if it failed, so the file is ingested again
+    """
+    from temporalio.client import WorkflowExecutionStatus
+    from temporalio.service import RPCError, RPCStatusCode
+
+    handle = temporal_client.get_workflow_handle(
+        workflow_id, result_type=EmbeddingResponse
+    )
+    try:
+        description = await handle.describe()
+    except RPCError as error:
+        if error.status == RPCStatusCode.NOT_FOUND:
+            return None
+        raise
+
+    if description.status == WorkflowExecutionStatus.RUNNING:
+        return EmbeddingResponse(
+            status="success",
+            message="File already being ingested",
+            details={"workflow_id": workflow_id, "duplicate": True},
+        )
+    if description.status == WorkflowExecutionStatus.COMPLETED:
+        result = await handle.result()
+        return EmbeddingResponse(
+            status=result.status,
+            message="File already ingested",
+            details={**result.details, "workflow_id": workflow_id, "duplicate": True},
+        )
+    return None
+
+
+def store_file(
+    content: bytes,
+    digest: str,
+    filename: str,
+    document_metadata: DocumentMetadata,
+) -> str:
+    """
+    Save an uploaded file under its content hash and upload it to the blob storage.
+    Blocking, so it runs in a thread of the event loop.
+
+    Args:
+        content (bytes): The content of the file
+        digest (str): The SHA-256 of the content
+        filename (str): The name of the file
+        document_metadata (DocumentMetadata): The metadata stored with the blob
+
+    Returns:
+        str: The path of the blob
+    """
+    from services.files import FileHandler, get_blob_key
+
+    # Save the file to the ./data/files directory
+    with get_tracer().start_as_current_span("save_file"):
+        file_path = Path(f"./data/files/{get_blob_key(digest, filename)}")
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+    # Upload file to Minio, overwriting the same bytes if a previous ingestion failed
+    with get_tracer().start_as_current_span("upload_to_blob"):
+        return FileHandler().upload_to_blob(file_path, document_metadata, digest)
+
+
 @router.post("/file")
-async def create_embeddings_file(file: UploadFile = File(...)) -> EmbeddingResponse:
+async def create_embeddings_file(
+    file: UploadFile = File(...),
+    metadata: str | None = Form(default=None),
+    x_profile: str | None = Header(default=None),
+) -> EmbeddingResponse:
     """
     Create embeddings from an uploaded file.
+    The file is stored and ingested under its content hash: uploading the same bytes again
+    returns the status of the existing ingestion, unless it failed or Temporal no longer
+    keeps its history.
+    The hashing, the classification and the storage of the file run in threads, so they do
+    not block the event loop.
+    The small text files go to the fast lane, the large or scanned ones to the heavy lane.
 
     Args:
         file (UploadFile): The file to process
-        metadata (Optional[dict]): Additional metadata for the document
+        metadata (str | None): Additional metadata for the document, as a JSON object
+            of scalar values, added to every chunk and filterable at query time
+        x_profile (str | None): `1` to profile the ingestion, when `PROFILING_ENABLED` is set
 
     Returns:
         EmbeddingResponse: The embedding results
     """
-    # Read file content
-    content = await file.read()
+    from temporalio.client import Client
+    from temporalio.common import WorkflowIDReusePolicy
+    from temporalio.exceptions import WorkflowAlreadyStartedError
 
-    # Save the file to the ./data/files directory
-    file_path = Path(f"./data/files/{file.filename}")
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    # Upload file to Minio
-    file_handler = FileHandler()
-    blob_path = file_handler.upload_to_blob(file_path)
-
-    # Create client connected to server at the given address
-    temporal_client = await Client.connect(get_config().temporal_host)
-
-    # Create workflow
-    await temporal_client.start_workflow(
-        EmbedFilesWorkflow.run,
-        EmbeddingFileWorkflowRequest(blob_path=blob_path),
-        id=f"embeddings-file-{uuid.uuid4()}",
-        task_queue=get_config().temporal_queue,
-    )
+    from jobs.converter import get_data_converter
+    from jobs.workflows import EmbedFilesWorkflow
+    from services.lanes import classify_ingestion, get_lane_queue
+
+    document_metadata = parse_document_metadata(metadata)
+    profile = get_config().profiling_enabled and is_profile_requested(x_profile)
+
+    with get_tracer().start_as_current_span(
+        "create_embeddings_file",
+        attributes={"file.name": str(file.filename)},
+    ) as span:
+        # Read file content
+        content = await file.read()
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        workflow_id = f"embeddings-file-{digest}"
+        span.set_attribute("file.size", len(content))
+        span.set_attribute("file.sha256", digest)
+
+        # Create client connected to server at the given address
+        temporal_client = await Client.connect(
+            get_config().temporal_host,
+            interceptors=get_temporal_interceptors(),
+            data_converter=get_data_converter(),
+        )
+        existing = await get_existing_ingestion(temporal_client, workflow_id)
+        if existing:
+            span.set_attribute("file.duplicate", True)
+            return existing
+
+        classification = await asyncio.to_thread(
+            classify_ingestion, content, str(file.filename), file.content_type
+        )
+        span.set_attribute("file.mime_type", classification.mime_type)
+        span.set_attribute("ingestion.lane", classification.lane)
+        span.set_attribute("ingestion.reason", classification.reason)
+        if classification.pages is not None:
+            span.set_attribute("file.pages", classification.pages)
+
+        blob_path = await asyncio.to_thread(
+            store_file, content, digest, str(file.filename), document_metadata
+        )
+        span.set_attribute("blob.path", blob_path)
+
+        # Create workflow, the trace context travels in the workflow headers.
+        # A completed or running ingestion of the same bytes is never started again
+        try:
+            await temporal_client.start_workflow(
+                EmbedFilesWorkflow.run,
+                EmbeddingFileWorkflowRequest(
+                    blob_path=blob_path, lane=classification.lane, profile=profile
+                ),
+                id=workflow_id,
+                task_queue=get_lane_queue(classification.lane),
+                id_reuse_policy=WorkflowIDReusePolicy.ALLOW_DUPLICATE_FAILED_ONLY,
+            )
+        except WorkflowAlreadyStartedError:
+            # Uploaded concurrently
+            existing = await get_existing_ingestion(temporal_client, workflow_id)
+            if existing:
+                return existing
+            raise
 
     return EmbeddingResponse(
         status="success",
         message="Embeddings created successfully",
+        details={
+            "workflow_id": workflow_id,
+            "blob_path": blob_path,
+            "lane": classification.lane,
+            "profiled": profile,
+        },
+    )
+
+
+@router.get("/lanes")
+async def get_ingestion_lanes() -> dict[str, int]:
+    """
+    Get the number of ingestions pending or running in every lane.
+
+    Returns:
+        dict[str, int]: The depth of the fast and heavy lanes
+    """
+    from temporalio.client import Client
+
+    from jobs.converter import get_data_converter
+    from services.lanes import get_lane_depths
+
+    temporal_client = await Client.connect(
+        get_config().temporal_host,
+        interceptors=get_temporal_interceptors(),
+        data_converter=get_data_converter(),
     )
+    return await get_lane_depths(temporal_client)
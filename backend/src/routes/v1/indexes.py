@@ -0,0 +1,108 @@
+"""
+Set of routes to rebuild the indexes and follow the progress of the rebuilds.
+Temporal, the workflows and Weaviate are imported within the handlers, so the API starts without loading them.
+"""
+
+from fastapi import APIRouter, HTTPException
+
+from utils.config import get_config
+from utils.tracing import get_temporal_interceptors
+from utils.types import ReindexProgress, ReindexWorkflowRequest
+
+router = APIRouter(
+    prefix="/indexes",
+    tags=["indexes"],
+)
+
+
+@router.post("/reindex")
+async def start_reindex(request: ReindexWorkflowRequest) -> dict[str, str]:
+    """
+    Start rebuilding an index in a new collection. Only one rebuild per alias runs at a time.
+
+    Args:
+        request (ReindexWorkflowRequest): The re-index request.
+
+    Returns:
+        dict[str, str]: The ID of the workflow, to follow its progress.
+    """
+    from temporalio.client import Client
+    from temporalio.exceptions import WorkflowAlreadyStartedError
+
+    from jobs.converter import get_data_converter
+    from jobs.workflows import ReindexWorkflow
+
+    temporal_client = await Client.connect(
+        get_config().temporal_host,
+        interceptors=get_temporal_interceptors(),
+        data_converter=get_data_converter(),
+    )
+    workflow_id = f"reindex-{request.alias}"
+    try:
+        await temporal_client.start_workflow(
+            ReindexWorkflow.run,
+            request,
+            id=workflow_id,
+            task_queue=get_config().temporal_queue,
+        )
+    except WorkflowAlreadyStartedError as error:
+        raise HTTPException(
+            status_code=409,
+            detail=f"A re-index of {request.alias} is already running",
+        ) from error
+    return {"workflow_id": workflow_id}
+
+
+@router.get("/reindex/{workflow_id}")
+async def get_reindex_progress(workflow_id: str) -> ReindexProgress:
+    """
+    Get the progress of a re-index.
+
+    Args:
+        workflow_id (str): The ID of the re-index workflow.
+
+    Returns:
+        ReindexProgress: The progress of the re-index.
+    """
+    from temporalio.client import Client
+    from temporalio.service import RPCError, RPCStatusCode
+
+    from jobs.converter import get_data_converter
+    from jobs.workflows import ReindexWorkflow
+
+    temporal_client = await Client.connect(
+        get_config().temporal_host,
+        interceptors=get_temporal_interceptors(),
+        data_converter=get_data_converter(),
+    )
+    try:
+        return await temporal_client.get_workflow_handle(workflow_id).query(
+            ReindexWorkflow.progress
+        )
+    except RPCError as error:
+        if error.status != RPCStatusCode.NOT_FOUND:
+            raise
+        raise HTTPException(status_code=404, detail=str(error)) from error
+
+
+@router.get("/aliases")
+async def get_aliases() -> dict[str, str]:
+    """
+    Get every index alias with the collection it points to.
+
+    Returns:
+        dict[str, str]: The collection of every alias.
+    """
+    from weaviate import connect_to_local
+
+    from services.aliases import get_index_aliases
+
+    client = connect_to_local(
+        host=get_config().weaviate_host,
+        port=get_config().weaviate_port,
+        grpc_port=get_config().weaviate_grpc_port,
+    )
+    try:
+        return get_index_aliases(client)
+    finally:
+        client.close()
@@ -1,11 +1,12 @@
 """
 Set of routes to create embeddings for files and folders.
+The services are imported within the handlers, so the API starts without loading
+LangChain, LangGraph, LlamaIndex and Weaviate.
 """
 
-from fastapi import APIRouter
-from langchain_core.messages import HumanMessage
+from fastapi import APIRouter, Query
 
-from services.rag import AgenticRagService, RagService
+from utils.snippets import shape_sources
 from utils.types import (
     QueryRequest,
     QueryResponse,
@@ -20,18 +21,31 @@ router = APIRouter(
 @router.post("/simple")
 async def execute_simple_query(
     query: QueryRequest,
+    fields: list[str] | None = Query(default=None),
+    include_text: bool = False,
+    snippet_length: int = Query(default=300, ge=0, le=5000),
 ) -> QueryResponse:
     """
     Execute a simple query against the vector store.
 
     Args:
         query(QueryRequest): The query to execute.
+        fields(list[str] | None): The metadata fields of the sources to return, all of them if not set.
+        include_text(bool): Whether to return the full text of the sources.
+        snippet_length(int): The maximum length of the source snippets, 0 to leave them out.
 
     Returns:
         (QueryResponse): The response containing the status and message.
     """
+    from services.rag import RagService
+
     rag_service = RagService()
-    response = rag_service.query(query.query)
+    response = rag_service.query(
+        query.query, query.query_mode, alpha=query.alpha, filters=query.filters
+    )
+    response.sources = shape_sources(
+        response.sources, query.query, fields, include_text, snippet_length
+    )
     return response
 
 
@@ -41,6 +55,8 @@ async def execute_agentic_query(
 ) -> QueryResponse:
     """
     Execute a query to get the documents that match the query.
+    With a `thread_id`, the query is a turn of that conversation: the agent sees the previous
+    turns and may answer from the documents they retrieved.
 
     Args:
         query(QueryRequest): The query to execute.
@@ -48,11 +64,25 @@ async def execute_agentic_query(
     Returns:
         (QueryResponse): The response containing the sources and message.
     """
+    from langchain_core.messages import HumanMessage
+    from langchain_core.runnables import RunnableConfig
+
+    from services.conversations import get_conversation_store
+    from services.rag import AgenticRagService
+
     rag_service = AgenticRagService()
-    graph = rag_service.generate_rag_graph()
-    response = graph.invoke({"messages": [HumanMessage(content=query.query)]})
+    checkpointer = None
+    config: RunnableConfig | None = None
+    if query.thread_id is not None:
+        conversation_store = get_conversation_store()
+        conversation_store.touch(query.thread_id)
+        checkpointer = conversation_store.checkpointer
+        config = RunnableConfig(configurable={"thread_id": query.thread_id})
+    graph = rag_service.generate_rag_graph(query.filters, checkpointer)
+    response = graph.invoke({"messages": [HumanMessage(content=query.query)]}, config)
     return QueryResponse(
         message=response["messages"][-1].content,
+        thread_id=query.thread_id,
     )
 
 
@@ -60,6 +90,9 @@ async def execute_agentic_query(
 async def execute_documents_query(
     query: QueryRequest,
     top_k: int = 10,
+    fields: list[str] | None = Query(default=None),
+    include_text: bool = False,
+    snippet_length: int = Query(default=300, ge=0, le=5000),
 ) -> QueryResponse:
     """
     Execute a query to get the documents that match the query.
@@ -67,12 +100,25 @@ async def execute_documents_query(
     Args:
         query(QueryRequest): The query to execute.
         top_k(int): The number of documents to return.
+        fields(list[str] | None): The metadata fields of the sources to return, all of them if not set.
+        include_text(bool): Whether to return the full text of the sources.
+        snippet_length(int): The maximum length of the source snippets, 0 to leave them out.
 
     Returns:
         (QueryResponse): The response containing the status and message.
     """
+    from services.rag import RagService
+
     rag_service = RagService()
-    sources = rag_service.retrieve(query.query, top_k=top_k)
+    sources = rag_service.retrieve(
+        query.query,
+        query.query_mode,
+        top_k=top_k,
+        alpha=query.alpha,
+        filters=query.filters,
+    )
     return QueryResponse(
-        sources=sources,
+        sources=shape_sources(
+            sources, query.query, fields, include_text, snippet_length
+        ),
     )
@@ -0,0 +1,113 @@
+"""
+Set of tools to address the collections through aliases, so an index can be rebuilt
+in a new collection and the queries switched to it at once.
+
+The Weaviate version we run has no native aliases: they are stored as objects of the
+`IndexAliases` collection, one per alias, and a switch is a single object write.
+"""
+
+import threading
+import time
+
+from weaviate import WeaviateClient
+from weaviate.util import generate_uuid5
+
+from services.collections import IndexSettings, create_collection
+from utils.config import get_config
+
+ALIASES_COLLECTION = "IndexAliases"
+
+# Resolved aliases, with the time they were resolved
+_resolved_aliases: dict[str, tuple[str, float]] = {}
+_resolved_aliases_lock = threading.Lock()
+
+
+def resolve_index_name(client: WeaviateClient, index_name: str) -> str:
+    """
+    Get the collection an index name points to.
+    Aliases are cached for `index_alias_cache_ttl` seconds, so a switch reaches every process
+    within that time. A name that is not an alias is the name of the collection itself.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        index_name(str): The alias or the collection name.
+
+    Returns:
+        (str): The name of the collection.
+    """
+    now = time.monotonic()
+    with _resolved_aliases_lock:
+        cached = _resolved_aliases.get(index_name)
+    if cached and now - cached[1] < get_config().index_alias_cache_ttl:
+        return cached[0]
+
+    collection_name = index_name
+    if client.collections.exists(ALIASES_COLLECTION):
+        alias = client.collections.get(ALIASES_COLLECTION).query.fetch_object_by_id(
+            generate_uuid5(index_name)
+        )
+        if alias:
+            collection_name = str(alias.properties["target"])
+    with _resolved_aliases_lock:
+        _resolved_aliases[index_name] = (collection_name, now)
+    return collection_name
+
+
+def set_index_alias(client: WeaviateClient, alias: str, target: str) -> str:
+    """
+    Point an alias to a collection. The previous collection is left untouched.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        alias(str): The alias, e.g. `Documents`.
+        target(str): The name of the collection.
+
+    Returns:
+        (str): The collection the alias pointed to before.
+
+    Raises:
+        ValueError: If the target collection does not exist.
+    """
+    if not client.collections.exists(target):
+        raise ValueError(f"Collection {target} does not exist")
+    if not client.collections.exists(ALIASES_COLLECTION):
+        create_collection(
+            client,
+            ALIASES_COLLECTION,
+            IndexSettings(index_type="flat"),
+            property_types={"alias": "text", "target": "text"},
+        )
+
+    with _resolved_aliases_lock:
+        _resolved_aliases.pop(alias, None)
+    previous = resolve_index_name(client, alias)
+
+    aliases = client.collections.get(ALIASES_COLLECTION)
+    alias_id = generate_uuid5(alias)
+    properties = {"alias": alias, "target": target}
+    if aliases.data.exists(alias_id):
+        aliases.data.replace(uuid=alias_id, properties=properties)
+    else:
+        aliases.data.insert(properties=properties, uuid=alias_id)
+
+    with _resolved_aliases_lock:
+        _resolved_aliases[alias] = (target, time.monotonic())
+    return previous
+
+
+def get_index_aliases(client: WeaviateClient) -> dict[str, str]:
+    """
+    Get every alias with the collection it points to.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+
+    Returns:
+        (dict[str, str]): The collection of every alias.
+    """
+    if not client.collections.exists(ALIASES_COLLECTION):
+        return {}
+    return {
+        str(alias.properties["alias"]): str(alias.properties["target"])
+        for alias in client.collections.get(ALIASES_COLLECTION).iterator()
+    }
@@ -0,0 +1,227 @@
+"""
+Set of tools to create the Weaviate collections explicitly, with their vector index settings,
+instead of letting LlamaIndex create them with the default settings on first use.
+"""
+
+from typing import Literal
+
+from llama_index.vector_stores.weaviate.utils import NODE_SCHEMA
+from pydantic import BaseModel
+from weaviate import WeaviateClient
+from weaviate.classes.config import (
+    Configure,
+    DataType,
+    Property,
+    Tokenization,
+    VectorDistances,
+)
+from weaviate.collections.classes.config_vector_index import _VectorIndexConfigCreate
+from weaviate.exceptions import UnexpectedStatusCodeError
+
+from utils.config import get_config
+
+# Property holding the locality-sensitive hashing bands of the chunk text, see `services.dedup`
+SIGNATURE_PROPERTY = "minhash_bands"
+
+# Metadata the queries filter on, with their Weaviate data type. The text ones are matched
+# as a whole value, and the upload time is a Unix timestamp with a range index
+FILTERABLE_PROPERTIES = {
+    "blob_path": "text",
+    "filename": "text",
+    "filetype": "text",
+    "uploaded_at": "int",
+}
+
+# Collections known to exist, so they are checked once per process
+_existing_collections: set[str] = set()
+
+
+class IndexSettings(BaseModel):
+    """
+    Vector index settings of a collection.
+
+    Attributes:
+        index_type(str): The Weaviate vector index: `hnsw`, `flat` or `dynamic`,
+            which starts flat and switches to HNSW past `dynamic_threshold` objects.
+        quantization(str): The compression of the vectors: `none`, `pq` (product),
+            `bq` (binary) or `sq` (scalar).
+        ef_construction(int): The size of the candidate list when building the HNSW graph.
+        max_connections(int): The maximum number of connections per node of the HNSW graph.
+        ef(int): The size of the candidate list when searching, -1 to adjust it to the limit.
+        pq_training_limit(int): The number of vectors used to train product and scalar quantization.
+        dynamic_threshold(int): The number of objects past which a dynamic index switches to HNSW.
+    """
+
+    index_type: Literal["hnsw", "flat", "dynamic"] = "hnsw"
+    quantization: Literal["none", "pq", "bq", "sq"] = "none"
+    ef_construction: int = 128
+    max_connections: int = 32
+    ef: int = -1
+    pq_training_limit: int = 100000
+    dynamic_threshold: int = 10000
+
+    @classmethod
+    def from_config(cls) -> "IndexSettings":
+        """
+        Get the index settings from the application's configuration.
+
+        Returns:
+            (IndexSettings): The configured index settings.
+        """
+        return cls(
+            index_type=get_config().vector_index_type,
+            quantization=get_config().vector_quantization,
+            ef_construction=get_config().hnsw_ef_construction,
+            max_connections=get_config().hnsw_max_connections,
+            ef=get_config().hnsw_ef,
+            pq_training_limit=get_config().pq_training_limit,
+        )
+
+
+def build_vector_index_config(settings: IndexSettings) -> _VectorIndexConfigCreate:
+    """
+    Build the Weaviate vector index configuration of the settings.
+
+    Args:
+        settings(IndexSettings): The index settings.
+
+    Returns:
+        (_VectorIndexConfigCreate): The vector index configuration.
+
+    Raises:
+        ValueError: If the quantization is not supported by a flat index.
+    """
+    quantizers = {
+        "none": None,
+        "pq": Configure.VectorIndex.Quantizer.pq(
+            training_limit=settings.pq_training_limit
+        ),
+        "bq": Configure.VectorIndex.Quantizer.bq(),
+        "sq": Configure.VectorIndex.Quantizer.sq(
+            training_limit=settings.pq_training_limit
+        ),
+    }
+    if settings.index_type == "flat" and settings.quantization not in ("none", "bq"):
+        raise ValueError("A flat index only supports binary quantization")
+
+    hnsw = Configure.VectorIndex.hnsw(
+        distance_metric=VectorDistances.COSINE,
+        ef_construction=settings.ef_construction,
+        max_connections=settings.max_connections,
+        ef=settings.ef,
+        quantizer=quantizers[settings.quantization],
+    )
+    if settings.index_type == "hnsw":
+        return hnsw
+
+    flat = Configure.VectorIndex.flat(
+        distance_metric=VectorDistances.COSINE,
+        quantizer=quantizers["bq"] if settings.quantization == "bq" else None,
+    )
+    if settings.index_type == "flat":
+        return flat
+    return Configure.VectorIndex.dynamic(
+        distance_metric=VectorDistances.COSINE,
+        threshold=settings.dynamic_threshold,
+        hnsw=hnsw,
+        flat=flat,
+    )
+
+
+def create_collection(
+    client: WeaviateClient,
+    index_name: str,
+    settings: IndexSettings | None = None,
+    property_types: dict[str, str] | None = None,
+) -> None:
+    """
+    Create a collection with explicit vector index settings and no vectorizer,
+    as the vectors are computed by the application.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        index_name(str): The name of the collection.
+        settings(IndexSettings | None): The index settings, the configured ones if None.
+        property_types(dict[str, str] | None): The Weaviate data type of every property,
+            the LlamaIndex node properties if None. Other properties are added by the auto-schema.
+
+    Raises:
+        ValueError: If the collection already exists.
+    """
+    if client.collections.exists(index_name):
+        raise ValueError(f"Collection {index_name} already exists")
+
+    if property_types is None:
+        property_types = {prop["name"]: prop["dataType"][0] for prop in NODE_SCHEMA}
+        property_types[SIGNATURE_PROPERTY] = "text[]"
+        property_types.update(FILTERABLE_PROPERTIES)
+
+    # Nested object properties are left to the auto-schema, as their layout is not known
+    client.collections.create(
+        index_name,
+        vectorizer_config=Configure.Vectorizer.none(),
+        vector_index_config=build_vector_index_config(
+            settings or IndexSettings.from_config()
+        ),
+        properties=[
+            build_property(name, data_type)
+            for name, data_type in property_types.items()
+            if not data_type.startswith("object")
+        ],
+    )
+
+
+def build_property(name: str, data_type: str) -> Property:
+    """
+    Build the definition of a property. The signature bands and the filterable metadata
+    are only matched as a whole value, so they are kept out of the BM25 index.
+
+    Args:
+        name(str): The name of the property.
+        data_type(str): The Weaviate data type, e.g. `text` or `int[]`.
+
+    Returns:
+        (Property): The property definition.
+    """
+    if name != SIGNATURE_PROPERTY and name not in FILTERABLE_PROPERTIES:
+        return Property(name=name, data_type=DataType(data_type))
+    if data_type.startswith("text"):
+        return Property(
+            name=name,
+            data_type=DataType(data_type),
+            tokenization=Tokenization.FIELD,
+            index_searchable=False,
+        )
+    return Property(name=name, data_type=DataType(data_type), index_range_filters=True)
+
+
+def ensure_collection(
+    client: WeaviateClient,
+    index_name: str,
+    settings: IndexSettings | None = None,
+) -> bool:
+    """
+    Create a collection with the LlamaIndex node properties if it does not exist yet.
+    Collections found are remembered, so the check costs a request once per process.
+
+    Args:
+        client(WeaviateClient): The Weaviate client.
+        index_name(str): The name of the collection.
+        settings(IndexSettings | None): The index settings, the configured ones if None.
+
+    Returns:
+        (bool): Whether the collection was created.
+    """
+    if index_name in _existing_collections:
+        return False
+    created = False
+    if not client.collections.exists(index_name):
+        try:
+            create_collection(client, index_name, settings)
+            created = True
+        except UnexpectedStatusCodeError:
+            # Another worker may have created it in the meantime
+            if not client.collections.exists(index_name):
+                raise
+    _existing_collections.add(index_name)
+    return created
@@ -0,0 +1,191 @@
+"""
+Set of services to persist the agentic RAG conversations in a local SQLite database.
+
+Every turn of a thread is checkpointed by LangGraph, so a follow-up question is answered with
+the messages of the previous turns, including the documents they retrieved, and the agent can
+answer from them without retrieving again. The history of a thread is trimmed to its last
+`CONVERSATION_MAX_TOKENS` tokens, and the threads unused for `CONVERSATION_TTL` seconds are
+deleted.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from functools import lru_cache
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from utils.config import get_config
+from utils.rate_limiter import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two deletions of the expired threads
+CLEANUP_INTERVAL = 60.0
+
+# Tokens of the role and separators of every message
+TOKENS_PER_MESSAGE = 3
+
+
+def get_question(messages: Sequence[BaseMessage]) -> str:
+    """
+    Get the question of the current turn, the last message of the user.
+
+    Args:
+        messages(Sequence[BaseMessage]): The messages of the conversation.
+
+    Returns:
+        (str): The question.
+    """
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return str(message.content)
+    return str(messages[0].content)
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """
+    Estimate the tokens of messages from their size, like the rate limiter of the LLM calls.
+
+    Args:
+        messages(Sequence[BaseMessage]): The messages.
+
+    Returns:
+        (int): The estimated tokens, including the tool calls.
+    """
+    characters = 0
+    for message in messages:
+        characters += len(str(message.content))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            characters += len(json.dumps(message.tool_calls, default=str))
+    return characters // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages)
+
+
+def trim_history(
+    messages: Sequence[BaseMessage], max_tokens: int
+) -> tuple[list[BaseMessage], list[RemoveMessage]]:
+    """
+    Keep the last turns of a conversation that fit in a token budget.
+    The history is cut before a user message only, so a tool call is never separated from its
+    result, and the current turn is always kept.
+
+    Args:
+        messages(Sequence[BaseMessage]): The messages of the conversation.
+        max_tokens(int): The budget of the history in tokens.
+
+    Returns:
+        (tuple[list[BaseMessage], list[RemoveMessage]]): The kept messages, and the removal of
+            the other ones from the state.
+    """
+    starts = [
+        index
+        for index, message in enumerate(messages)
+        if isinstance(message, HumanMessage)
+    ]
+    if not starts:
+        return list(messages), []
+    start = starts[-1]
+    for index in reversed(starts[:-1]):
+        if estimate_tokens(messages[index:]) > max_tokens:
+            break
+        start = index
+    removals = [
+        RemoveMessage(id=message.id) for message in messages[:start] if message.id
+    ]
+    return list(messages[start:]), removals
+
+
+class ConversationStore:
+    """
+    SQLite database of the checkpoints of the conversations, with the last use of every thread.
+    The connection is shared by the threads of the process, the checkpointer locks it on every
+    access.
+    """
+
+    def __init__(self, file_path: Path):
+        """
+        Open, or create, the database.
+
+        Args:
+            file_path(Path): The SQLite file.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(file_path, check_same_thread=False)
+        # Readers do not block the writer, e.g. across the processes of the API
+        connection.execute("PRAGMA journal_mode=WAL")
+        self.checkpointer = SqliteSaver(connection)
+        self.checkpointer.setup()
+        with self.checkpointer.lock, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity "
+                "(thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+        self.__connection = connection
+        self.__cleaned_at = 0.0
+        self.__cleanup_lock = threading.Lock()
+
+    def touch(self, thread_id: str) -> None:
+        """
+        Record the use of a thread, and delete the expired threads at most once a minute.
+
+        Args:
+            thread_id(str): The ID of the thread.
+        """
+        now = time.time()
+        with self.checkpointer.lock, self.__connection:
+            self.__connection.execute(
+                "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT (thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (thread_id, now),
+            )
+        if now - self.__cleaned_at >= CLEANUP_INTERVAL and self.__cleanup_lock.acquire(
+            blocking=False
+        ):
+            try:
+                self.__cleaned_at = now
+                self.delete_expired(now - get_config().conversation_ttl)
+            finally:
+                self.__cleanup_lock.release()
+
+    def delete_expired(self, before: float) -> int:
+        """
+        Delete the threads last used before a time.
+
+        Args:
+            before(float): The Unix timestamp.
+
+        Returns:
+            (int): The number of deleted threads.
+        """
+        with self.checkpointer.lock, self.__connection:
+            thread_ids = [
+                row[0]
+                for row in self.__connection.execute(
+                    "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                    (before,),
+                )
+            ]
+            for table in ("checkpoints", "writes", "thread_activity"):
+                self.__connection.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ?",
+                    [(thread_id,) for thread_id in thread_ids],
+                )
+        if thread_ids:
+            logger.info("Deleted %d expired conversations", len(thread_ids))
+        return len(thread_ids)
+
+
+@lru_cache
+def get_conversation_store() -> ConversationStore:
+    """
+    Get the conversation store of the process.
+
+    Returns:
+        (ConversationStore): The conversation store.
+    """
+    return ConversationStore(Path(get_config().conversation_db_path))
@@ -0,0 +1,341 @@
+"""
+Set of services to detect near-duplicate chunks at ingestion, e.g. the versions of a document
+or the headers and legal footers repeated in every file, before they are embedded.
+
+Every chunk gets a MinHash signature of its word shingles, split into locality-sensitive
+hashing bands. The band keys are stored with the chunk in the `minhash_bands` property, so the
+candidates of a new chunk are the indexed chunks sharing one of its bands, and only those are
+compared with it.
+"""
+
+import hashlib
+import logging
+import re
+import zlib
+from collections.abc import Sequence
+from functools import lru_cache
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+from pydantic import BaseModel
+
+from services.collections import SIGNATURE_PROPERTY
+from services.documents import DocumentService
+from utils.config import get_config
+from utils.metrics import DEDUP_CHUNKS
+from utils.types import DedupStats
+
+logger = logging.getLogger(__name__)
+
+# Metadata linking a near-duplicate to the chunk it repeats, when kept
+DUPLICATE_OF_PROPERTY = "duplicate_of"
+
+# Number of chunks whose bands are looked up in a single query
+LOOKUP_BATCH_SIZE = 64
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=4)
+def get_permutations(num_perm: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the coefficients of the hash functions emulating the permutations.
+    They are drawn with a fixed seed, as the signatures are compared across processes.
+
+    Args:
+        num_perm(int): The number of permutations.
+
+    Returns:
+        (tuple[np.ndarray, np.ndarray]): The multipliers and the increments.
+    """
+    generator = np.random.default_rng(1)
+    # Below 2^32, so `a * x + b` does not overflow for 32-bit shingle hashes
+    a = generator.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = generator.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def get_shingles(text: str, size: int) -> np.ndarray:
+    """
+    Hash the word shingles of a text, ignoring case and punctuation.
+
+    Args:
+        text(str): The text.
+        size(int): The number of words of a shingle.
+
+    Returns:
+        (np.ndarray): The distinct 32-bit hashes of the shingles, empty if the text has no words.
+    """
+    words = _WORD.findall(text.lower())
+    shingles = {
+        " ".join(words[position : position + size])
+        for position in range(max(1, len(words) - size + 1))
+    }
+    shingles.discard("")
+    return np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def compute_signature(text: str, num_perm: int, shingle_size: int) -> np.ndarray | None:
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text(str): The text.
+        num_perm(int): The number of permutations.
+        shingle_size(int): The number of words of a shingle.
+
+    Returns:
+        (np.ndarray | None): The signature, None if the text has no words.
+    """
+    shingles = get_shingles(text, shingle_size)
+    if shingles.size == 0:
+        return None
+    a, b = get_permutations(num_perm)
+    hashes = (np.outer(shingles, a) + b) % _MERSENNE_PRIME & _MAX_HASH
+    return hashes.min(axis=0)
+
+
+def get_band_keys(signature: np.ndarray, bands: int) -> list[str]:
+    """
+    Split a signature into bands and hash every band into a key.
+    The keys are alphanumeric, so they are matched as a single token.
+
+    Args:
+        signature(np.ndarray): The MinHash signature.
+        bands(int): The number of bands, dividing the length of the signature.
+
+    Returns:
+        (list[str]): The key of every band, prefixed with its position.
+    """
+    return [
+        f"b{position:02d}{hashlib.blake2b(band.tobytes(), digest_size=8).hexdigest()}"
+        for position, band in enumerate(np.split(signature, bands))
+    ]
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """
+    Estimate the Jaccard similarity of two texts from their signatures.
+
+    Args:
+        first(np.ndarray): The signature of the first text.
+        second(np.ndarray): The signature of the second text.
+
+    Returns:
+        (float): The ratio of equal hashes.
+    """
+    return float(np.mean(first == second))
+
+
+class DedupService(BaseModel):
+    """
+    Detects the chunks of an ingestion that are near-duplicates of each other or of indexed ones.
+    Depending on `dedup_mode`, they are dropped, or kept with the ID of the chunk they repeat.
+
+    Attributes:
+        index_name(str): The name of the index the chunks are ingested into
+    """
+
+    index_name: str
+
+    def __init__(self, index_name: str = "Documents", **kwargs):
+        """
+        Initializes the deduplication service.
+
+        Args:
+            index_name(str): The name of the index the chunks are ingested into
+        """
+        super().__init__(index_name=index_name, **kwargs)
+        if get_config().dedup_num_perm % get_config().dedup_bands:
+            raise ValueError(
+                f"DEDUP_NUM_PERM ({get_config().dedup_num_perm}) must be a multiple "
+                f"of DEDUP_BANDS ({get_config().dedup_bands})"
+            )
+
+    def deduplicate(
+        self, documents: Sequence[BaseNode]
+    ) -> tuple[list[BaseNode], DedupStats]:
+        """
+        Sign the chunks and drop, or link, the near-duplicates.
+        The first occurrence of a text is kept, with its band keys in its metadata.
+
+        Args:
+            documents(Sequence[BaseNode]): The chunks extracted from a file.
+
+        Returns:
+            (tuple[list[BaseNode], DedupStats]): The chunks to index and the statistics.
+        """
+        config = get_config()
+        stats = DedupStats(mode=config.dedup_mode, chunks=len(documents))
+        if config.dedup_mode == "off":
+            stats.unique = len(documents)
+            return list(documents), stats
+
+        signatures = [
+            compute_signature(
+                document.get_content(),
+                config.dedup_num_perm,
+                config.dedup_shingle_size,
+            )
+            for document in documents
+        ]
+        keys = [
+            get_band_keys(signature, config.dedup_bands)
+            if signature is not None
+            else []
+            for signature in signatures
+        ]
+        indexed = self.__get_indexed_candidates(keys)
+
+        kept: list[BaseNode] = []
+        # Signatures of the chunks kept so far by band key, with their ID
+        batch: dict[str, list[tuple[str, np.ndarray]]] = {}
+        for document, signature, document_keys in zip(
+            documents, signatures, keys, strict=True
+        ):
+            if signature is None:
+                stats.unique += 1
+                kept.append(document)
+                continue
+
+            duplicate_of, in_file = None, False
+            for candidates, from_file in ((batch, True), (indexed, False)):
+                duplicate_of = self.__find_duplicate(
+                    signature, document_keys, candidates, config.dedup_threshold
+                )
+                if duplicate_of:
+                    in_file = from_file
+                    break
+
+            if duplicate_of is None:
+                stats.unique += 1
+                self.__sign(document, document_keys)
+                for key in document_keys:
+                    batch.setdefault(key, []).append((document.node_id, signature))
+                kept.append(document)
+                continue
+
+            if in_file:
+                stats.duplicates_in_file += 1
+            else:
+                stats.duplicates_in_index += 1
+            if config.dedup_mode == "link":
+                # Left unsigned, so the chunk it repeats stays the only candidate
+                document.metadata[DUPLICATE_OF_PROPERTY] = duplicate_of
+                self.__exclude_from_prompts(document, DUPLICATE_OF_PROPERTY)
+                kept.append(document)
+
+        DEDUP_CHUNKS.labels(outcome="unique").inc(stats.unique)
+        DEDUP_CHUNKS.labels(outcome="duplicate_in_file").inc(stats.duplicates_in_file)
+        DEDUP_CHUNKS.labels(outcome="duplicate_in_index").inc(stats.duplicates_in_index)
+        logger.info("Near-duplicate detection: %s", stats.model_dump_json())
+        return kept, stats
+
+    def __get_indexed_candidates(
+        self, keys: list[list[str]]
+    ) -> dict[str, list[tuple[str, np.ndarray]]]:
+        """
+        Get the indexed chunks sharing a band with the new chunks, with their signatures.
+
+        Args:
+            keys(list[list[str]]): The band keys of every new chunk.
+
+        Returns:
+            (dict[str, list[tuple[str, np.ndarray]]]): The ID and signature of the candidates
+                by band key.
+        """
+        config = get_config()
+        candidates: dict[str, list[tuple[str, np.ndarray]]] = {}
+        seen: set[str] = set()
+        document_service = DocumentService(index_name=self.index_name)
+        try:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                values = sorted(
+                    {
+                        key
+                        for chunk_keys in keys[start : start + LOOKUP_BATCH_SIZE]
+                        for key in chunk_keys
+                    }
+                )
+                for document in document_service.get_documents_matching_any(
+                    SIGNATURE_PROPERTY,
+                    values,
+                    fields=[SIGNATURE_PROPERTY],
+                    include_text=True,
+                ):
+                    document_id = str(document.uuid)
+                    if document_id in seen:
+                        continue
+                    seen.add(document_id)
+                    signature = compute_signature(
+                        str(document.properties.get("text") or ""),
+                        config.dedup_num_perm,
+                        config.dedup_shingle_size,
+                    )
+                    if signature is None:
+                        continue
+                    for key in document.properties.get(SIGNATURE_PROPERTY) or []:
+                        candidates.setdefault(key, []).append((document_id, signature))
+        finally:
+            document_service.close()
+        return candidates
+
+    @staticmethod
+    def __find_duplicate(
+        signature: np.ndarray,
+        keys: list[str],
+        candidates: dict[str, list[tuple[str, np.ndarray]]],
+        threshold: float,
+    ) -> str | None:
+        """
+        Find the most similar candidate sharing a band with a chunk, above the threshold.
+
+        Args:
+            signature(np.ndarray): The signature of the chunk.
+            keys(list[str]): The band keys of the chunk.
+            candidates(dict[str, list[tuple[str, np.ndarray]]]): The candidates by band key.
+            threshold(float): The minimum estimated similarity.
+
+        Returns:
+            (str | None): The ID of the candidate, None if there is no near-duplicate.
+        """
+        best_id, best_similarity = None, threshold
+        for key in keys:
+            for candidate_id, candidate_signature in candidates.get(key, []):
+                similarity = estimate_similarity(signature, candidate_signature)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = candidate_id, similarity
+        return best_id
+
+    def __sign(self, document: BaseNode, keys: list[str]) -> None:
+        """
+        Store the band keys of a chunk in its metadata.
+
+        Args:
+            document(BaseNode): The chunk.
+            keys(list[str]): The band keys of the chunk.
+        """
+        document.metadata[SIGNATURE_PROPERTY] = keys
+        self.__exclude_from_prompts(document, SIGNATURE_PROPERTY)
+
+    @staticmethod
+    def __exclude_from_prompts(document: BaseNode, key: str) -> None:
+        """
+        Keep a metadata key out of the embedded text and of the LLM context.
+
+        Args:
+            document(BaseNode): The chunk.
+            key(str): The metadata key.
+        """
+        for excluded in (
+            document.excluded_embed_metadata_keys,
+            document.excluded_llm_metadata_keys,
+        ):
+            if key not in excluded:
+                excluded.append(key)
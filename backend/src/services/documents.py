@@ -2,17 +2,45 @@
 Set of services to handle the documents stored in the vector database.
 """
 
+import logging
+import threading
+import time
 import uuid
+from collections.abc import Iterable, Iterator
+from typing import Any
 
 from pydantic import BaseModel, PrivateAttr
 from weaviate import WeaviateClient, connect_to_local
+from weaviate.classes.config import DataType, Tokenization
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.classes.query import Filter
 from weaviate.collections.classes.internal import (
+    Object,
     ObjectSingleReturn,
     QueryReturn,
 )
 from weaviate.collections.collection import Collection
 
+from services.aliases import resolve_index_name
+from services.collections import (
+    FILTERABLE_PROPERTIES,
+    IndexSettings,
+    create_collection,
+)
 from utils.config import get_config
+from utils.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Properties holding the chunk text: the raw text and the serialized LlamaIndex node
+LARGE_PROPERTIES = {"text", "_node_content"}
+
+# Total documents per index, with the time they were counted
+_document_counts: dict[str, tuple[int, float]] = {}
+_document_counts_lock = threading.Lock()
+
+# Collections whose filterable properties were checked, so they are warned about once
+_checked_tokenizations: set[str] = set()
 
 
 class DocumentService(BaseModel):
@@ -25,7 +53,9 @@ class DocumentService(BaseModel):
 
     index_name: str
     __weaviate_client: WeaviateClient = PrivateAttr()
+    __collection_name: str = PrivateAttr()
     __weaviate_collection: Collection = PrivateAttr()
+    __property_types: dict[str, str] | None = PrivateAttr(default=None)
 
     def __init__(self, index_name: str = "Documents", **kwargs):
         """
@@ -39,28 +69,55 @@ class DocumentService(BaseModel):
             host=get_config().weaviate_host,
             port=get_config().weaviate_port,
             grpc_port=get_config().weaviate_grpc_port,
+            additional_config=AdditionalConfig(
+                timeout=Timeout(query=get_config().weaviate_timeout)
+            ),
         )
+        self.__collection_name = resolve_index_name(self.__weaviate_client, index_name)
         self.__weaviate_collection = self.__weaviate_client.collections.get(
-            index_name,
+            self.__collection_name,
         )
 
-    def get_document_by_id(self, doc_id: uuid.UUID) -> ObjectSingleReturn:
+    def get_collection_name(self) -> str:
+        """
+        Get the name of the collection the index name points to.
+
+        Returns:
+            (str): The name of the collection.
+        """
+        return self.__collection_name
+
+    def close(self) -> None:
+        """
+        Close the connection to the vector database.
+        """
+        self.__weaviate_client.close()
+
+    def get_document_by_id(
+        self,
+        doc_id: uuid.UUID,
+        include_vector: bool = False,
+    ) -> ObjectSingleReturn:
         """
         Get a document by its ID from the vector store.
 
         Args:
             doc_id(uuid.UUID): The ID of the document to retrieve.
+            include_vector(bool): Whether to return the vector of the document.
 
         Returns:
             (ObjectSingleReturn): The document.
 
         Raises:
-            Exception: If the document is not found.
+            LookupError: If the document is not found.
         """
-        result = self.__weaviate_collection.query.fetch_object_by_id(doc_id)
+        result = self.__weaviate_collection.query.fetch_object_by_id(
+            doc_id,
+            include_vector=include_vector,
+        )
 
         if not result:
-            raise Exception(f"Document with ID {doc_id} not found")
+            raise LookupError(f"Document with ID {doc_id} not found")
 
         return result
 
@@ -82,12 +139,278 @@ class DocumentService(BaseModel):
 
         return result
 
-    def get_document_count(self) -> int:
+    def get_documents_after(
+        self,
+        after: uuid.UUID | None = None,
+        limit: int = 100,
+        fields: list[str] | None = None,
+        include_text: bool = False,
+        include_vector: bool = False,
+    ) -> QueryReturn:
+        """
+        Get a page of documents using a cursor, which costs the same at any depth,
+        unlike offset pagination.
+
+        Args:
+            after(uuid.UUID | None): The ID of the last document of the previous page.
+            limit(int): Maximum number of documents to return.
+            fields(list[str] | None): The metadata properties to return, all of them if None.
+            include_text(bool): Whether to return the text of the documents.
+            include_vector(bool): Whether to return the vectors of the documents.
+
+        Returns:
+            (QueryReturn): List of documents.
+        """
+        return self.__weaviate_collection.query.fetch_objects(
+            limit=limit,
+            after=after,
+            return_properties=self.get_return_properties(fields, include_text),
+            include_vector=include_vector,
+        )
+
+    def get_documents_by_ids(
+        self,
+        doc_ids: list[uuid.UUID],
+        fields: list[str] | None = None,
+        include_text: bool = False,
+        include_vector: bool = False,
+    ) -> list[Object]:
+        """
+        Get documents by their IDs, in a single request.
+
+        Args:
+            doc_ids(list[uuid.UUID]): The IDs of the documents.
+            fields(list[str] | None): The metadata properties to return, all of them if None.
+            include_text(bool): Whether to return the text of the documents.
+            include_vector(bool): Whether to return the vectors of the documents.
+
+        Returns:
+            (list[Object]): The documents found.
+        """
+        if not doc_ids:
+            return []
+        return self.__weaviate_collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(doc_ids),
+            limit=len(doc_ids),
+            return_properties=self.get_return_properties(fields, include_text),
+            include_vector=include_vector,
+        ).objects
+
+    def get_documents_matching_any(
+        self,
+        property_name: str,
+        values: list[str],
+        fields: list[str] | None = None,
+        include_text: bool = False,
+        limit: int = 1000,
+    ) -> list[Object]:
+        """
+        Get the documents whose array property holds any of the values.
+
+        Args:
+            property_name(str): The name of the `text[]` property.
+            values(list[str]): The values to match.
+            fields(list[str] | None): The metadata properties to return, all of them if None.
+            include_text(bool): Whether to return the text of the documents.
+            limit(int): Maximum number of documents to return.
+
+        Returns:
+            (list[Object]): The matching documents, none if the collection or the property
+                does not exist yet.
+        """
+        if not values or not self.__weaviate_client.collections.exists(
+            self.__collection_name
+        ):
+            return []
+        if property_name not in self.get_property_types():
+            return []
+        return self.__weaviate_collection.query.fetch_objects(
+            filters=Filter.by_property(property_name).contains_any(values),
+            limit=limit,
+            return_properties=self.get_return_properties(fields, include_text),
+        ).objects
+
+    def iter_documents(
+        self,
+        fields: list[str] | None = None,
+        include_text: bool = False,
+        include_vector: bool = False,
+        batch_size: int = 1000,
+    ) -> Iterator[Object]:
+        """
+        Iterate over every document of the vector store, fetching them in cursor-paginated batches.
+
+        Args:
+            fields(list[str] | None): The metadata properties to return, all of them if None.
+            include_text(bool): Whether to return the text of the documents.
+            include_vector(bool): Whether to return the vectors of the documents.
+            batch_size(int): The number of documents fetched per request.
+
+        Returns:
+            (Iterator[Object]): The documents.
+        """
+        return iter(
+            self.__weaviate_collection.iterator(
+                include_vector=include_vector,
+                return_properties=self.get_return_properties(fields, include_text),
+                cache_size=batch_size,
+            )
+        )
+
+    def get_return_properties(
+        self,
+        fields: list[str] | None = None,
+        include_text: bool = False,
+    ) -> list[str]:
+        """
+        Get the properties to fetch for a projection.
+        The large text properties are left out unless requested in `fields` or with `include_text`.
+
+        Args:
+            fields(list[str] | None): The properties to return, all the metadata ones if None.
+            include_text(bool): Whether to return the text of the documents.
+
+        Returns:
+            (list[str]): The properties to fetch.
+        """
+        properties = [
+            name
+            for name in self.get_property_types()
+            if (name in fields if fields is not None else name not in LARGE_PROPERTIES)
+        ]
+        if include_text and "text" not in properties:
+            properties.append("text")
+        return properties
+
+    def get_property_types(self) -> dict[str, str]:
+        """
+        Get the properties of the collection with their Weaviate data type.
+
+        Returns:
+            (dict[str, str]): The data type of every property, e.g. `text` or `int[]`.
+        """
+        if self.__property_types is None:
+            config = self.__weaviate_collection.config.get(simple=True)
+            self.__property_types = {
+                prop.name: prop.data_type.value for prop in config.properties
+            }
+            if self.__collection_name not in _checked_tokenizations:
+                _checked_tokenizations.add(self.__collection_name)
+                # Created by the auto-schema before the filterable properties were declared
+                word_tokenized = [
+                    prop.name
+                    for prop in config.properties
+                    if prop.name in FILTERABLE_PROPERTIES
+                    and prop.data_type == DataType.TEXT
+                    and prop.tokenization != Tokenization.FIELD
+                ]
+                if word_tokenized:
+                    logger.warning(
+                        "Collection %s tokenizes %s by words, so the filters on them may "
+                        "match other values: re-index it to filter on whole values",
+                        self.__collection_name,
+                        ", ".join(word_tokenized),
+                    )
+        return self.__property_types
+
+    def create_collection(
+        self,
+        property_types: dict[str, str],
+        settings: IndexSettings | None = None,
+    ) -> None:
+        """
+        Create the collection of the service with the given properties.
+
+        Args:
+            property_types(dict[str, str]): The Weaviate data type of every property.
+            settings(IndexSettings | None): The index settings, the configured ones if None.
+
+        Raises:
+            ValueError: If the collection already exists.
+        """
+        create_collection(
+            self.__weaviate_client, self.__collection_name, settings, property_types
+        )
+        self.__property_types = None
+
+    def insert_documents(
+        self,
+        documents: Iterable[tuple[uuid.UUID, dict[str, Any], list[float] | None]],
+        batch_size: int = 500,
+        concurrent_requests: int = 4,
+    ) -> int:
+        """
+        Insert documents, with their vectors, using parallel batch requests.
+
+        Args:
+            documents(Iterable[tuple[uuid.UUID, dict[str, Any], list[float] | None]]):
+                The ID, properties and vector of every document.
+            batch_size(int): The number of documents sent per request.
+            concurrent_requests(int): The number of requests sent in parallel.
+
+        Returns:
+            (int): The number of inserted documents.
+
+        Raises:
+            Exception: If any document could not be inserted.
+        """
+        count = 0
+        with self.__weaviate_collection.batch.fixed_size(
+            batch_size=batch_size,
+            concurrent_requests=concurrent_requests,
+        ) as batch:
+            for doc_id, properties, vector in documents:
+                batch.add_object(properties=properties, uuid=doc_id, vector=vector)
+                count += 1
+
+        failed_objects = self.__weaviate_collection.batch.failed_objects
+        if failed_objects:
+            raise Exception(
+                f"Failed to insert {len(failed_objects)} documents: {failed_objects[0].message}"
+            )
+        return count
+
+    def delete_documents(self, doc_ids: list[uuid.UUID]) -> int:
+        """
+        Delete documents by their IDs, in a single request.
+
+        Args:
+            doc_ids(list[uuid.UUID]): The IDs of the documents.
+
+        Returns:
+            (int): The number of deleted documents.
+        """
+        if not doc_ids:
+            return 0
+        return self.__weaviate_collection.data.delete_many(
+            where=Filter.by_id().contains_any(doc_ids)
+        ).successful
+
+    def get_document_count(self, use_cache: bool = True) -> int:
         """
         Get the total number of documents in the vector store.
+        The count is cached for `document_count_cache_ttl` seconds, as it scans the whole collection.
+
+        Args:
+            use_cache(bool): Whether a cached count can be returned.
 
         Returns:
             (int): The total number of documents.
         """
+        now = time.monotonic()
+        with _document_counts_lock:
+            cached = _document_counts.get(self.index_name)
+        if (
+            use_cache
+            and cached
+            and now - cached[1] < get_config().document_count_cache_ttl
+        ):
+            record_cache_lookup("document_count", hit=True)
+            return cached[0]
+
+        record_cache_lookup("document_count", hit=False)
         result = self.__weaviate_collection.aggregate.over_all(total_count=True)
-        return result.total_count or 0
+        total_count = result.total_count or 0
+        with _document_counts_lock:
+            _document_counts[self.index_name] = (total_count, now)
+        return total_count
@@ -2,76 +2,137 @@
 Set of services to handle the embeddings of documents and the creation of a vector store.
 """
 
+from collections.abc import Sequence
+
 from llama_index.core import StorageContext, VectorStoreIndex
-from llama_index.core.schema import Document
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from llama_index.vector_stores.weaviate import WeaviateVectorStore
 from pydantic import BaseModel, PrivateAttr
 from weaviate import WeaviateClient, connect_to_local
+from weaviate.classes.init import AdditionalConfig, Timeout
 
+from services.aliases import resolve_index_name
+from services.collections import ensure_collection
 from utils.config import get_config
+from utils.rate_limiter import get_http_client
+from utils.resilience import get_dependency
+from utils.types import RequestPriority
 
 
 class VectorStoreHandler(BaseModel):
     """
-    Embeds text using the OpenAI API.
+    Embeds text using the Azure OpenAI API, or a local model with `EMBEDDING_BACKEND=local`.
     It also handles the creation of a vector store and the insertion of documents into it.
     It also provides a method to get the index of the vector store.
 
     Attributes:
         index_name(str): The name of the index to use
+        priority(RequestPriority): The priority of the embedding calls in the rate limiter,
+            `interactive` when embedding queries
     """
 
     index_name: str
+    priority: RequestPriority = "bulk"
     __weaviate_client: WeaviateClient = PrivateAttr()
-    __embed_model: AzureOpenAIEmbedding = PrivateAttr()
-
-    def __init__(self, index_name: str = "Documents", **kwargs):
+    __embed_model: BaseEmbedding = PrivateAttr()
+
+    def __init__(
+        self,
+        index_name: str = "Documents",
+        priority: RequestPriority = "bulk",
+        **kwargs,
+    ):
         """
         Initializes the vector store handler.
 
         Args:
             index_name(str): The name of the index to use
+            priority(RequestPriority): The priority of the embedding calls in the rate limiter
         """
-        super().__init__(index_name=index_name, **kwargs)
+        super().__init__(index_name=index_name, priority=priority, **kwargs)
         self.__weaviate_client = connect_to_local(
             host=get_config().weaviate_host,
             port=get_config().weaviate_port,
             grpc_port=get_config().weaviate_grpc_port,
+            additional_config=AdditionalConfig(
+                timeout=Timeout(query=get_config().weaviate_timeout)
+            ),
         )
-        self.__embed_model = AzureOpenAIEmbedding(
+        self.__embed_model = self.__create_embed_model()
+
+    def __create_embed_model(self) -> BaseEmbedding:
+        """
+        Create the embedding model of the `EMBEDDING_BACKEND`: Azure OpenAI, or a model run
+        in process on the CPU.
+
+        Returns:
+            (BaseEmbedding): The embedding model
+        """
+        if get_config().embedding_backend == "local":
+            from services.local_embeddings import LocalEmbedding
+
+            return LocalEmbedding(priority=self.priority)
+        return AzureOpenAIEmbedding(
             api_key=get_config().azure_openai_api_key.get_secret_value(),
             endpoint=get_config().azure_openai_endpoint,
             model=get_config().azure_openai_embeddings_model,
             api_version=get_config().azure_openai_api_version,
+            dimensions=get_config().embedding_dimensions,
+            http_client=get_http_client(self.priority),
+            timeout=get_config().embeddings_timeout,
         )
 
-    def from_documents(self, documents: list[Document]) -> VectorStoreIndex:
+    def from_documents(self, documents: Sequence[BaseNode]) -> VectorStoreIndex:
         """
-        Embed a list of LlamaIndex documents and store them in a vector store.
+        Embed a list of LlamaIndex documents, or nodes, and store them in a vector store.
+        The documents are embedded first, so the embedding and the insertion each go
+        through the circuit breaker of their dependency.
 
         Args:
-            documents(list[Document]): The documents to embed
+            documents(Sequence[BaseNode]): The documents to embed
 
         Returns:
             (VectorStoreIndex): The VectorStoreIndex from LlamaIndex
         """
-        vector_store = WeaviateVectorStore(
-            weaviate_client=self.__weaviate_client,
-            index_name=self.index_name,
+        pending = [document for document in documents if document.embedding is None]
+        # Long batches, bounded by the timeout of every request rather than of the whole call
+        embeddings = get_dependency("embeddings").call(
+            "embed_documents",
+            self.__embed_model.get_text_embedding_batch,
+            [
+                document.get_content(metadata_mode=MetadataMode.EMBED)
+                for document in pending
+            ],
+            timeout=None,
         )
+        for document, embedding in zip(pending, embeddings, strict=True):
+            document.embedding = embedding
 
         storage_context = StorageContext.from_defaults(
-            vector_store=vector_store,
+            vector_store=self.__get_vector_store(),
         )
-        index = VectorStoreIndex(
+        index = get_dependency("weaviate").call(
+            "insert_documents",
+            VectorStoreIndex,
             nodes=documents,
             storage_context=storage_context,
             embed_model=self.__embed_model,
+            timeout=None,
         )
 
         return index
 
+    def get_embed_model(self) -> BaseEmbedding:
+        """
+        Get the embedding model used by the vector store.
+
+        Returns:
+            (BaseEmbedding): The embedding model
+        """
+        return self.__embed_model
+
     def get_index(self) -> VectorStoreIndex:
         """
         Get the index of the vector store.
@@ -79,13 +140,8 @@ class VectorStoreHandler(BaseModel):
         Returns:
             (VectorStoreIndex): The VectorStoreIndex from LlamaIndex
         """
-        vector_store = WeaviateVectorStore(
-            weaviate_client=self.__weaviate_client,
-            index_name=self.index_name,
-        )
-
         storage_context = StorageContext.from_defaults(
-            vector_store=vector_store,
+            vector_store=self.__get_vector_store(),
         )
         index = VectorStoreIndex(
             nodes=[],
@@ -94,3 +150,18 @@ class VectorStoreHandler(BaseModel):
         )
 
         return index
+
+    def __get_vector_store(self) -> WeaviateVectorStore:
+        """
+        Get the vector store of the collection the index name points to, creating it
+        with the configured index settings so LlamaIndex does not create it with the default ones.
+
+        Returns:
+            (WeaviateVectorStore): The vector store of the index
+        """
+        collection_name = resolve_index_name(self.__weaviate_client, self.index_name)
+        ensure_collection(self.__weaviate_client, collection_name)
+        return WeaviateVectorStore(
+            weaviate_client=self.__weaviate_client,
+            index_name=collection_name,
+        )
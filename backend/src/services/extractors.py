@@ -0,0 +1,413 @@
+"""
+Set of services to choose how a file is extracted, and to extract the simple text formats in
+process.
+
+Plain text, Markdown, CSV and HTML files need no layout analysis: they are parsed here and cut
+into chunks of at most `NATIVE_CHUNK_TOKENS` tokens, instead of a round trip to Unstructured.
+The other files go to Unstructured, the PDFs with the `fast` strategy when their first pages
+have a text layer and with the `hi_res` OCR only when they do not.
+"""
+
+import csv
+import hashlib
+import io
+import re
+from collections.abc import Callable
+from pathlib import PurePath
+from typing import BinaryIO
+
+from bs4 import BeautifulSoup, Tag
+from llama_index.core.schema import (
+    BaseNode,
+    NodeRelationship,
+    RelatedNodeInfo,
+    TextNode,
+)
+from llama_index.core.utils import get_tokenizer
+from pydantic import BaseModel
+
+from services.lanes import inspect_pdf
+from utils.types import ExtractionRoute
+
+# The text formats parsed in process, with the file type Unstructured gives their chunks
+NATIVE_FILETYPES = {
+    ".txt": "text/plain",
+    ".text": "text/plain",
+    ".md": "text/markdown",
+    ".markdown": "text/markdown",
+    ".csv": "text/csv",
+    ".html": "text/html",
+    ".htm": "text/html",
+}
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".heic"}
+
+# Separators a text too long for a chunk is cut at: lines, then sentences, then words
+_SPLITTERS = (
+    (re.compile(r"\n+"), "\n"),
+    (re.compile(r"(?<=[.!?;:])\s+"), " "),
+    (re.compile(r"\s+"), " "),
+)
+_BLANK_LINES = re.compile(r"\n\s*\n")
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_MARKDOWN_FENCE = re.compile(r"^\s*(```|~~~)")
+_WHITESPACE = re.compile(r"\s+")
+
+_HTML_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_HTML_BLOCKS = _HTML_HEADINGS | {
+    "p",
+    "li",
+    "pre",
+    "blockquote",
+    "tr",
+    "dt",
+    "dd",
+    "figcaption",
+    "caption",
+}
+_HTML_IGNORED = ["script", "style", "noscript", "template", "head", "svg"]
+
+
+def route_extraction(file: BinaryIO, filename: str) -> ExtractionRoute:
+    """
+    Choose the extractor of a file, and the Unstructured strategy, from its format.
+
+    Args:
+        file(BinaryIO): The content of the file, read from its start when a PDF.
+        filename(str): The name of the file.
+
+    Returns:
+        (ExtractionRoute): The extractor, the strategy and why.
+    """
+    suffix = PurePath(filename).suffix.lower()
+    if suffix in NATIVE_FILETYPES:
+        return ExtractionRoute(extractor="native", reason="text_format")
+    if suffix in IMAGE_SUFFIXES:
+        return ExtractionRoute(
+            extractor="unstructured", strategy="hi_res", reason="image"
+        )
+    if suffix == ".pdf":
+        pages, has_text = inspect_pdf(file)
+        file.seek(0)
+        if pages is None:
+            return ExtractionRoute(
+                extractor="unstructured", strategy="auto", reason="unreadable_pdf"
+            )
+        if has_text:
+            return ExtractionRoute(
+                extractor="unstructured", strategy="fast", reason="text_layer"
+            )
+        return ExtractionRoute(
+            extractor="unstructured", strategy="hi_res", reason="scanned"
+        )
+    return ExtractionRoute(extractor="unstructured", strategy="auto", reason="other")
+
+
+class Section(BaseModel):
+    """
+    Section of a document: a title and the blocks of text under it.
+
+    Attributes:
+        title(str | None): The title, None before the first one.
+        blocks(list[str]): The paragraphs, list items or rows of the section.
+        repeat_title(bool): Whether every chunk of the section starts with the title,
+            e.g. the header of a CSV.
+    """
+
+    title: str | None = None
+    blocks: list[str] = []
+    repeat_title: bool = False
+
+
+def parse_text(content: bytes) -> list[Section]:
+    """
+    Parse a plain text file into its paragraphs.
+
+    Args:
+        content(bytes): The content of the file.
+
+    Returns:
+        (list[Section]): A single section.
+    """
+    text = content.decode("utf-8-sig", errors="replace")
+    return [Section(blocks=[block.strip() for block in _BLANK_LINES.split(text)])]
+
+
+def parse_markdown(content: bytes) -> list[Section]:
+    """
+    Parse a Markdown file into a section per heading. The code blocks are kept whole.
+
+    Args:
+        content(bytes): The content of the file.
+
+    Returns:
+        (list[Section]): The sections.
+    """
+    sections = [Section()]
+    lines: list[str] = []
+    in_code = False
+
+    def end_block() -> None:
+        if lines:
+            sections[-1].blocks.append("\n".join(lines).strip())
+            lines.clear()
+
+    for line in content.decode("utf-8-sig", errors="replace").splitlines():
+        if _MARKDOWN_FENCE.match(line):
+            in_code = not in_code
+        if not in_code and _MARKDOWN_HEADING.match(line):
+            end_block()
+            sections.append(Section(title=line.strip()))
+        elif not in_code and not line.strip():
+            end_block()
+        else:
+            lines.append(line)
+    end_block()
+    return sections
+
+
+def parse_csv(content: bytes) -> list[Section]:
+    """
+    Parse a CSV file into its rows, under its header.
+
+    Args:
+        content(bytes): The content of the file.
+
+    Returns:
+        (list[Section]): A single section, whose title is the header.
+    """
+    text = content.decode("utf-8-sig", errors="replace")
+    try:
+        dialect: type[csv.Dialect] | csv.Dialect = csv.Sniffer().sniff(text[:4096])
+    except csv.Error:
+        dialect = csv.excel
+    rows = [
+        ", ".join(cell.strip() for cell in row)
+        for row in csv.reader(io.StringIO(text), dialect)
+        if any(cell.strip() for cell in row)
+    ]
+    if not rows:
+        return []
+    return [Section(title=rows[0], blocks=rows[1:], repeat_title=True)]
+
+
+def parse_html(content: bytes) -> list[Section]:
+    """
+    Parse an HTML file into a section per heading, without the scripts and styles.
+
+    Args:
+        content(bytes): The content of the file.
+
+    Returns:
+        (list[Section]): The sections.
+    """
+    soup = BeautifulSoup(content, "lxml")
+    for element in soup(_HTML_IGNORED):
+        element.decompose()
+    sections = [Section()]
+    for element in soup.find_all(_HTML_BLOCKS):
+        if not isinstance(element, Tag):
+            continue
+        # The blocks nested in another one, e.g. a paragraph in a list item, are in its text
+        if element.find_parent(_HTML_BLOCKS) is not None:
+            continue
+        separator = " | " if element.name == "tr" else " "
+        if element.name == "pre":
+            text = element.get_text().strip()
+        else:
+            text = _WHITESPACE.sub(" ", element.get_text(separator, strip=True))
+        if not text:
+            continue
+        if element.name in _HTML_HEADINGS:
+            sections.append(Section(title=text))
+        else:
+            sections[-1].blocks.append(text)
+    if not any(section.title or section.blocks for section in sections):
+        return parse_text(soup.get_text("\n").encode())
+    return sections
+
+
+PARSERS: dict[str, Callable[[bytes], list[Section]]] = {
+    "text/plain": parse_text,
+    "text/markdown": parse_markdown,
+    "text/csv": parse_csv,
+    "text/html": parse_html,
+}
+
+
+class TokenChunker:
+    """
+    Chunker packing the blocks of the sections into chunks of at most a number of tokens of
+    the embedding model. A section starts a new chunk, like the chunking by title of
+    Unstructured, unless the current chunk is under a quarter of the budget, and a block too
+    long for a chunk is cut at its lines, then its sentences, then its words.
+
+    Attributes:
+        max_tokens(int): The most tokens of a chunk.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.__tokenize = get_tokenizer()
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Args:
+            text(str): The text.
+
+        Returns:
+            (int): The number of tokens.
+        """
+        return len(self.__tokenize(text))
+
+    def split(self, text: str, level: int = 0) -> list[tuple[str, int]]:
+        """
+        Cut a text into pieces of at most `max_tokens` tokens.
+
+        Args:
+            text(str): The text.
+            level(int): The first separator to cut at.
+
+        Returns:
+            (list[tuple[str, int]]): The pieces, with their tokens.
+        """
+        tokens = self.count(text)
+        if tokens <= self.max_tokens:
+            return [(text, tokens)]
+        if level == len(_SPLITTERS):
+            # A single word longer than a chunk, e.g. an encoded blob, is cut by characters
+            size = max(1, len(text) * self.max_tokens // tokens)
+            return [
+                (text[start : start + size], self.count(text[start : start + size]))
+                for start in range(0, len(text), size)
+            ]
+        pattern, separator = _SPLITTERS[level]
+        pieces: list[tuple[str, int]] = []
+        for part in pattern.split(text):
+            if part:
+                pieces.extend(self.split(part, level + 1))
+        return self.__pack(pieces, separator)
+
+    def chunk(self, sections: list[Section]) -> list[str]:
+        """
+        Chunk the sections of a document.
+
+        Args:
+            sections(list[Section]): The sections.
+
+        Returns:
+            (list[str]): The texts of the chunks, in the order of the document.
+        """
+        chunks: list[tuple[str, int]] = []
+        for section in sections:
+            blocks = [
+                piece
+                for block in section.blocks
+                if block
+                for piece in self.split(block)
+            ]
+            if section.repeat_title and section.title:
+                title = self.split(section.title)[0]
+                budget = max(self.max_tokens - title[1] - 1, self.max_tokens // 2)
+                for text, tokens in self.__pack(blocks, "\n", budget):
+                    chunks.append((f"{title[0]}\n{text}", title[1] + tokens + 1))
+                continue
+            if section.title:
+                blocks = self.split(section.title) + blocks
+            packed = self.__pack(blocks, "\n\n")
+            # A short section is joined to the previous one rather than left alone
+            if (
+                packed
+                and chunks
+                and chunks[-1][1] < self.max_tokens // 4
+                and chunks[-1][1] + packed[0][1] + 1 <= self.max_tokens
+            ):
+                previous = chunks.pop()
+                packed[0] = (
+                    f"{previous[0]}\n\n{packed[0][0]}",
+                    previous[1] + packed[0][1] + 1,
+                )
+            chunks.extend(packed)
+        return [text for text, _ in chunks]
+
+    def __pack(
+        self,
+        pieces: list[tuple[str, int]],
+        separator: str,
+        budget: int | None = None,
+    ) -> list[tuple[str, int]]:
+        """
+        Join consecutive pieces into texts of at most a number of tokens.
+
+        Args:
+            pieces(list[tuple[str, int]]): The pieces, with their tokens.
+            separator(str): The separator of the joined pieces, counted as one token unless
+                a space, which the tokenizer merges into the next word.
+            budget(int | None): The most tokens of a text, `max_tokens` if None.
+
+        Returns:
+            (list[tuple[str, int]]): The joined texts, with their tokens.
+        """
+        budget = budget or self.max_tokens
+        separator_tokens = 0 if separator == " " else 1
+        packed: list[tuple[str, int]] = []
+        current: list[str] = []
+        current_tokens = 0
+        for text, tokens in pieces:
+            if current and current_tokens + tokens + separator_tokens > budget:
+                packed.append((separator.join(current), current_tokens))
+                current, current_tokens = [], 0
+            current_tokens += tokens + (separator_tokens if current else 0)
+            current.append(text)
+        if current:
+            packed.append((separator.join(current), current_tokens))
+        return packed
+
+
+def extract_natively(
+    file: BinaryIO, filename: str, max_tokens: int, chunking: bool = True
+) -> list[BaseNode]:
+    """
+    Parse and chunk a text file in process, into chunks shaped like the ones of Unstructured.
+
+    Args:
+        file(BinaryIO): The content of the file, read from its start.
+        filename(str): The name of the file, in one of the `NATIVE_FILETYPES`.
+        max_tokens(int): The most tokens of a chunk.
+        chunking(bool): Whether to pack the blocks into chunks, or to return every block.
+
+    Returns:
+        (list[BaseNode]): The text nodes, with their file name, file type and sequence number.
+    """
+    filetype = NATIVE_FILETYPES[PurePath(filename).suffix.lower()]
+    sections = PARSERS[filetype](file.read())
+    chunker = TokenChunker(max_tokens)
+    if chunking:
+        texts = chunker.chunk(sections)
+    else:
+        texts = [
+            text
+            for section in sections
+            for text in ([section.title] if section.title else []) + section.blocks
+            if text
+        ]
+    nodes: list[BaseNode] = []
+    for sequence_number, text in enumerate(texts):
+        # The IDs of the chunks of Unstructured, which have no page here
+        node_id = hashlib.sha256(
+            f"{filename}{text}None{sequence_number}".encode()
+        ).hexdigest()[:32]
+        node = TextNode(
+            id_=node_id,
+            text=text,
+            metadata={
+                "filename": filename,
+                "filetype": filetype,
+                "sequence_number": sequence_number,
+            },
+        )
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=filename)
+        nodes.append(node)
+    return nodes
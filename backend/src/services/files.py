@@ -2,17 +2,118 @@
 Services to extract text from files or folders using the unstructured API container.
 """
 
+import contextvars
+import hashlib
+import json
+import logging
 import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Literal
+from typing import BinaryIO, Literal
 
 import boto3
-from llama_index.core.schema import Document
+from botocore.config import Config
+from llama_index.core.schema import BaseNode
 from llama_index.readers.file import UnstructuredReader
 from pydantic import BaseModel, FilePath, PrivateAttr
 from unstructured.partition.utils.constants import PartitionStrategy
 
+from services.extractors import extract_natively, route_extraction
+from services.pdf_segments import (
+    PdfSegment,
+    count_pdf_pages,
+    merge_segment_documents,
+    split_pdf,
+)
 from utils.config import get_config
+from utils.metrics import (
+    EXTRACTION_ROUTES,
+    EXTRACTION_SECONDS,
+    PDF_SEGMENTS,
+    RETRIES,
+    SPOOLED_BYTES,
+    SPOOLED_PEAK_BYTES,
+)
+from utils.resilience import get_dependency
+from utils.types import (
+    BlobInfo,
+    ExtractionReport,
+    ExtractionRoute,
+    MetadataValue,
+)
+
+logger = logging.getLogger(__name__)
+
+# S3 user metadata key holding the document metadata given at upload, as JSON
+DOCUMENT_METADATA_KEY = "document-metadata"
+
+# Bytes of the spooled blobs held at once by the process, and their peaks, by location
+_spooled_bytes = {"memory": 0, "disk": 0}
+_spooled_peak_bytes = {"memory": 0, "disk": 0}
+_spooled_lock = threading.Lock()
+
+
+@contextmanager
+def _hold_spooled_bytes(location: str, size: int) -> Iterator[None]:
+    """
+    Count the bytes of a spooled blob while it is held, and update the peaks.
+
+    Args:
+        location (str): `memory` or `disk`.
+        size (int): The size of the blob.
+    """
+    with _spooled_lock:
+        _spooled_bytes[location] += size
+        _spooled_peak_bytes[location] = max(
+            _spooled_peak_bytes[location], _spooled_bytes[location]
+        )
+        SPOOLED_BYTES.labels(location=location).set(_spooled_bytes[location])
+        SPOOLED_PEAK_BYTES.labels(location=location).set(_spooled_peak_bytes[location])
+    try:
+        yield
+    finally:
+        with _spooled_lock:
+            _spooled_bytes[location] -= size
+            SPOOLED_BYTES.labels(location=location).set(_spooled_bytes[location])
+
+
+def hash_file(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 digest of a file, reading it by chunks.
+
+    Args:
+        file_path (Path): The path to the file.
+        chunk_size (int): The number of bytes read at once.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_blob_key(digest: str, filename: str) -> str:
+    """
+    Get the content-addressed object key of a file: identical bytes share a key,
+    and files with the same name but different content do not overwrite each other.
+    The name is kept as the last segment, so the extracted chunks keep the original filename.
+
+    Args:
+        digest (str): The SHA-256 digest of the file.
+        filename (str): The name of the file.
+
+    Returns:
+        str: The object key.
+    """
+    return f"{digest}/{os.path.basename(filename)}"
 
 
 class TextExtractor(BaseModel):
@@ -43,9 +144,10 @@ class TextExtractor(BaseModel):
         ] = PartitionStrategy.AUTO,
         chunking: bool = True,
         chunk_size: int = 1000,
-    ) -> list[Document]:
+    ) -> list[BaseNode]:
         """
         Extracts text from a file using the unstructured API container.
+        See `extract_file` for the routing of the files.
 
         Args:
             strategy: The strategy to use for partitioning the file.
@@ -55,19 +157,263 @@ class TextExtractor(BaseModel):
         Returns:
             The text extracted from the file.
         """
+        documents, _ = self.extract_file(filepath, strategy, chunking, chunk_size)
+        return documents
+
+    def extract_file(
+        self,
+        filepath: FilePath,
+        strategy: Literal[
+            "auto",
+            "fast",
+            "ocr_only",
+            "hi_res",
+        ] = PartitionStrategy.AUTO,
+        chunking: bool = True,
+        chunk_size: int = 1000,
+    ) -> tuple[list[BaseNode], ExtractionReport]:
+        """
+        Extracts text from a file, and reports how. See `extract_stream`.
+
+        Args:
+            strategy: The strategy to use for partitioning the file, `auto` to route it.
+            chunking: Whether to chunk the file.
+            chunk_size: The size of the chunks of Unstructured, in characters.
+
+        Returns:
+            The text extracted from the file, and the route and duration of the extraction.
+        """
+        with open(filepath, "rb") as file:
+            return self.extract_stream(
+                file, filepath.name, strategy, chunking, chunk_size
+            )
+
+    def extract_stream(
+        self,
+        file: BinaryIO,
+        filename: str,
+        strategy: Literal[
+            "auto",
+            "fast",
+            "ocr_only",
+            "hi_res",
+        ] = PartitionStrategy.AUTO,
+        chunking: bool = True,
+        chunk_size: int = 1000,
+    ) -> tuple[list[BaseNode], ExtractionReport]:
+        """
+        Extracts text from the content of a file, e.g. a spooled blob, and reports how.
+        The content is sent to Unstructured as is, without being written to a file.
+        With the `auto` strategy, the text formats are parsed and chunked in process, into
+        chunks of `NATIVE_CHUNK_TOKENS` tokens, and the strategy of the other files is chosen
+        from their format (see `services/extractors.py`). A PDF of at least
+        `PDF_SPLIT_MIN_PAGES` pages is split into page ranges, partitioned in parallel.
+
+        Args:
+            file: The content of the file, seekable and read from its start.
+            filename: The name of the file, given to its chunks.
+            strategy: The strategy to use for partitioning the file, `auto` to route it.
+            chunking: Whether to chunk the file.
+            chunk_size: The size of the chunks of Unstructured, in characters.
+
+        Returns:
+            The text extracted from the file, and the route and duration of the extraction.
+        """
+        config = get_config()
+        if strategy != PartitionStrategy.AUTO:
+            route = ExtractionRoute(
+                extractor="unstructured", strategy=strategy, reason="requested"
+            )
+        elif not config.extraction_router_enabled:
+            route = ExtractionRoute(
+                extractor="unstructured", strategy=strategy, reason="disabled"
+            )
+        else:
+            route = route_extraction(file, filename)
+
+        started_at = time.perf_counter()
+        if route.extractor == "native":
+            documents: list[BaseNode] = extract_natively(
+                file, filename, config.native_chunk_tokens, chunking
+            )
+        elif (
+            config.pdf_split_min_pages
+            and Path(filename).suffix.lower() == ".pdf"
+            and count_pdf_pages(file) >= config.pdf_split_min_pages
+        ):
+            documents = self.__extract_text_from_pdf_segments(
+                file, filename, route.strategy or strategy, chunking, chunk_size
+            )
+        else:
+            documents = self.__partition(
+                file, filename, route.strategy or strategy, chunking, chunk_size
+            )
+        seconds = time.perf_counter() - started_at
+
+        labels = {
+            "extractor": route.extractor,
+            "strategy": route.strategy or "none",
+            "reason": route.reason,
+        }
+        EXTRACTION_ROUTES.labels(**labels).inc()
+        EXTRACTION_SECONDS.labels(**labels).observe(seconds)
+        logger.info(
+            "Extracted %d chunks from %s with %s (strategy %s, %s) in %.3f s",
+            len(documents),
+            filename,
+            route.extractor,
+            route.strategy,
+            route.reason,
+            seconds,
+        )
+        return documents, ExtractionReport(
+            **route.model_dump(), seconds=round(seconds, 3), chunks=len(documents)
+        )
+
+    def __partition(
+        self,
+        file: BinaryIO,
+        filename: str,
+        strategy: str,
+        chunking: bool,
+        chunk_size: int,
+    ) -> list[BaseNode]:
+        """
+        Partition a file with a single request to the unstructured API container.
+
+        Args:
+            file: The content of the file to partition.
+            filename: The name of the file.
+            strategy: The strategy to use for partitioning the file.
+            chunking: Whether to chunk the file.
+            chunk_size: The size of the chunks to use for chunking.
+
+        Returns:
+            The text extracted from the file.
+        """
+        file.seek(0)
         unstructured_kwargs = {
-            "filename": filepath,
+            "file": file,
+            "metadata_filename": filename,
             "strategy": strategy,
         }
         if chunking:
             unstructured_kwargs["max_chunk_size"] = chunk_size
             unstructured_kwargs["chunking_strategy"] = "by_title"
-        documents = self.__unstructured_reader.load_data(
-            file=filepath,
+        documents = get_dependency("unstructured").call(
+            f"partition_{strategy}",
+            self.__unstructured_reader.load_data,
             unstructured_kwargs=unstructured_kwargs,
             split_documents=True,
         )
-        return documents
+        return list(documents)
+
+    def __extract_text_from_pdf_segments(
+        self,
+        file: BinaryIO,
+        filename: str,
+        strategy: str,
+        chunking: bool,
+        chunk_size: int,
+    ) -> list[BaseNode]:
+        """
+        Partition a large PDF by page ranges, `PDF_SPLIT_CONCURRENCY` at once, so it is
+        spread over the workers of Unstructured. A failed range is retried on its own as soon
+        as it fails, up to `PDF_SPLIT_MAX_ATTEMPTS` times, rather than the whole file. The
+        chunks are chunked within their range, so a section crossing two ranges is cut
+        between them.
+
+        Args:
+            file: The content of the PDF to partition.
+            filename: The name of the PDF.
+            strategy: The strategy to use for partitioning the file.
+            chunking: Whether to chunk the file.
+            chunk_size: The size of the chunks to use for chunking.
+
+        Returns:
+            The text extracted from the file, in the order of the pages.
+        """
+        config = get_config()
+        file.seek(0)
+        with (
+            tempfile.TemporaryDirectory(dir=config.spool_path or None) as directory,
+            ThreadPoolExecutor(
+                max_workers=config.pdf_split_concurrency,
+                thread_name_prefix="pdf-segment",
+            ) as executor,
+        ):
+            segments = split_pdf(file, config.pdf_split_pages, Path(directory))
+            logger.info("Partitioning %s in %d page ranges", filename, len(segments))
+
+            def submit(segment: PdfSegment, attempt: int) -> Future[list[BaseNode]]:
+                # Every call runs in a copy of the context, e.g. to profile it
+                return executor.submit(
+                    contextvars.copy_context().run,
+                    self.__partition_segment,
+                    segment,
+                    filename,
+                    attempt,
+                    strategy,
+                    chunking,
+                    chunk_size,
+                )
+
+            attempts = {segment.index: 1 for segment in segments}
+            futures = {submit(segment, 1): segment for segment in segments}
+            partitioned: list[tuple[PdfSegment, list[BaseNode]]] = []
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    segment = futures.pop(future)
+                    if (error := future.exception()) is None:
+                        partitioned.append((segment, list(future.result())))
+                        PDF_SEGMENTS.labels(outcome="success").inc()
+                        continue
+                    PDF_SEGMENTS.labels(outcome="error").inc()
+                    logger.warning(
+                        "Partition of pages %d-%d of %s failed (attempt %d): %s",
+                        segment.first_page,
+                        segment.last_page,
+                        filename,
+                        attempts[segment.index],
+                        error,
+                    )
+                    if attempts[segment.index] >= config.pdf_split_max_attempts:
+                        for pending in futures:
+                            pending.cancel()
+                        raise error
+                    attempts[segment.index] += 1
+                    RETRIES.labels(operation="partition_pdf_segment").inc()
+                    futures[submit(segment, attempts[segment.index])] = segment
+        return merge_segment_documents(partitioned)
+
+    def __partition_segment(
+        self,
+        segment: PdfSegment,
+        filename: str,
+        attempt: int,
+        strategy: str,
+        chunking: bool,
+        chunk_size: int,
+    ) -> list[BaseNode]:
+        """
+        Partition a page range of a PDF, after a backoff when it is retried.
+
+        Args:
+            segment: The page range.
+            filename: The name of the PDF.
+            attempt: The attempt, from 1.
+            strategy: The strategy to use for partitioning the file.
+            chunking: Whether to chunk the file.
+            chunk_size: The size of the chunks to use for chunking.
+
+        Returns:
+            The text extracted from the page range.
+        """
+        if attempt > 1:
+            time.sleep(min(2.0 ** (attempt - 2), 30.0))
+        with open(segment.file_path, "rb") as file:
+            return self.__partition(file, filename, strategy, chunking, chunk_size)
 
     def extract_text_from_folder(
         self,
@@ -80,7 +426,7 @@ class TextExtractor(BaseModel):
         ] = PartitionStrategy.AUTO,
         chunking: bool = True,
         chunk_size: int = 1000,
-    ) -> list[Document]:
+    ) -> list[BaseNode]:
         """
         Extracts text from a folder using the unstructured API container.
 
@@ -122,14 +468,31 @@ class FileHandler(BaseModel):
         self.__blob_client = boto_session.client(
             endpoint_url=str(get_config().storage_endpoint_url),
             service_name="s3",
+            config=Config(
+                connect_timeout=5,
+                read_timeout=get_config().storage_timeout,
+                retries={"mode": "standard", "max_attempts": 3},
+            ),
         )
 
-    def upload_to_blob(self, file_path: FilePath) -> str:
+    def upload_to_blob(
+        self,
+        file_path: FilePath,
+        metadata: dict[str, MetadataValue] | None = None,
+        digest: str | None = None,
+    ) -> str:
         """
-        Stores a file in the Minio server using the boto3 library.
+        Stores a file in the Minio server using the boto3 library, under its content-addressed key.
+        The document metadata is stored with the file, so every ingestion of the file,
+        including a re-index, adds it to the chunks.
 
         Args:
             file_path (FilePath): The path to the file to store.
+            metadata (dict[str, MetadataValue] | None): The metadata of the document.
+            digest (str | None): The SHA-256 digest of the file, computed if not given.
+
+        Returns:
+            str: The object key of the file.
 
         Raises:
             FileNotFoundError: If the file does not exist.
@@ -138,11 +501,18 @@ class FileHandler(BaseModel):
         if not file_path.exists():
             raise FileNotFoundError(f"File {file_path} does not exist.")
 
-        object_key = os.path.basename(file_path)
-        self.__blob_client.upload_file(
+        object_key = get_blob_key(digest or hash_file(file_path), file_path.name)
+        # Large files take long, bounded by the timeout of every part rather than of the whole upload
+        get_dependency("storage").call(
+            "upload",
+            self.__blob_client.upload_file,
             str(file_path),
             get_config().storage_bucket,
             object_key,
+            ExtraArgs={"Metadata": {DOCUMENT_METADATA_KEY: json.dumps(metadata)}}
+            if metadata
+            else None,
+            timeout=None,
         )
         return object_key
 
@@ -163,6 +533,96 @@ class FileHandler(BaseModel):
         Returns:
             Path: local file path
         """
+        # The content-addressed keys hold a folder
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
         with open(file_path, "wb") as f:
-            self.__blob_client.download_fileobj(bucket, object_key, f)
+            get_dependency("storage").call(
+                "download",
+                self.__blob_client.download_fileobj,
+                bucket,
+                object_key,
+                f,
+                timeout=None,
+            )
         return Path(file_path)
+
+    @contextmanager
+    def open_blob(self, bucket: str, object_key: str) -> Iterator[BinaryIO]:
+        """
+        Stream a file from an S3 bucket into a spooled buffer, held in memory up to
+        `SPOOL_MAX_MEMORY_BYTES` bytes and in an anonymous temporary file of `SPOOL_PATH`
+        above. The buffer is released on exit, even when the download or its reader fails,
+        and the temporary file has no name on disk, so it never outlives the process.
+
+        Args:
+            bucket (str): Bucket to download from
+            object_key (str): S3 object key
+
+        Yields:
+            BinaryIO: The content of the file, from its start
+        """
+        config = get_config()
+        with tempfile.SpooledTemporaryFile(
+            max_size=config.spool_max_memory_bytes, dir=config.spool_path or None
+        ) as spool:
+            get_dependency("storage").call(
+                "download",
+                self.__blob_client.download_fileobj,
+                bucket,
+                object_key,
+                spool,
+                timeout=None,
+            )
+            size = spool.seek(0, os.SEEK_END)
+            spool.seek(0)
+            spooled = (
+                config.spool_max_memory_bytes and size > config.spool_max_memory_bytes
+            )
+            with _hold_spooled_bytes("disk" if spooled else "memory", size):
+                yield spool  # type: ignore[misc]
+
+    def get_blob_info(self, bucket: str, object_key: str) -> BlobInfo:
+        """
+        Get the upload time and the document metadata of a file
+
+        Args:
+            bucket (str): Bucket of the file
+            object_key (str): S3 object key
+
+        Returns:
+            BlobInfo: The properties of the file
+        """
+        head = get_dependency("storage").call(
+            "head",
+            self.__blob_client.head_object,
+            Bucket=bucket,
+            Key=object_key,
+            hedge=True,
+        )
+        metadata = head.get("Metadata", {}).get(DOCUMENT_METADATA_KEY)
+        return BlobInfo(
+            uploaded_at=head["LastModified"],
+            metadata=json.loads(metadata) if metadata else {},
+        )
+
+    def list_blobs(self, bucket: str, prefix: str = "") -> list[str]:
+        """
+        List the files of an S3 bucket
+
+        Args:
+            bucket (str): Bucket to list
+            prefix (str): Prefix of the object keys to list
+
+        Returns:
+            list[str]: The object keys
+        """
+        paginator = self.__blob_client.get_paginator("list_objects_v2")
+        return get_dependency("storage").call(
+            "list",
+            lambda: [
+                item["Key"]
+                for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+                for item in page.get("Contents", [])
+            ],
+            hedge=True,
+        )
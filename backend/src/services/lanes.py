@@ -0,0 +1,155 @@
+"""
+Set of services to route the ingestions to the fast or the heavy lane, each with its own
+Temporal task queue and workers, so the small text files are not stuck behind the large or
+scanned documents that need OCR.
+"""
+
+import io
+import logging
+import mimetypes
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+from utils.config import get_config
+from utils.metrics import INGESTION_JOBS
+from utils.types import IngestionClassification, IngestionLane
+
+if TYPE_CHECKING:
+    from temporalio.client import Client
+
+logger = logging.getLogger(__name__)
+
+LANES: tuple[IngestionLane, ...] = ("fast", "heavy")
+
+PDF_MIME_TYPE = "application/pdf"
+DEFAULT_MIME_TYPE = "application/octet-stream"
+
+# Pages whose text is checked to tell a scanned PDF from a text one
+SCANNED_SAMPLE_PAGES = 2
+
+
+def get_mime_type(filename: str, content_type: str | None = None) -> str:
+    """
+    Get the MIME type of a file, from the upload or from its extension when the client
+    sent a generic one.
+
+    Args:
+        filename(str): The name of the file.
+        content_type(str | None): The content type sent with the upload.
+
+    Returns:
+        (str): The MIME type.
+    """
+    if content_type and content_type != DEFAULT_MIME_TYPE:
+        return content_type.split(";")[0].strip().lower()
+    return mimetypes.guess_type(filename)[0] or DEFAULT_MIME_TYPE
+
+
+def inspect_pdf(content: bytes | Path | BinaryIO) -> tuple[int | None, bool]:
+    """
+    Count the pages of a PDF and check whether its first pages hold text.
+
+    Args:
+        content(bytes | Path | BinaryIO): The content of the PDF, or its file.
+
+    Returns:
+        (tuple[int | None, bool]): The number of pages, None if the PDF cannot be read,
+            and whether it has a text layer.
+    """
+    try:
+        reader = PdfReader(
+            io.BytesIO(content) if isinstance(content, bytes) else content,
+            strict=False,
+        )
+        pages = len(reader.pages)
+        has_text = any(
+            (page.extract_text() or "").strip()
+            for page in reader.pages[:SCANNED_SAMPLE_PAGES]
+        )
+    except (PyPdfError, OSError, ValueError, KeyError, TypeError) as error:
+        logger.warning("Could not inspect the PDF: %s", error)
+        return None, True
+    return pages, has_text
+
+
+def classify_ingestion(
+    content: bytes, filename: str, content_type: str | None = None
+) -> IngestionClassification:
+    """
+    Classify an uploaded file into the fast or the heavy lane, from its size, its MIME type
+    and, for the PDFs, its page count and text layer.
+    Only the files small enough for the fast lane are opened.
+
+    Args:
+        content(bytes): The content of the file.
+        filename(str): The name of the file.
+        content_type(str | None): The content type sent with the upload.
+
+    Returns:
+        (IngestionClassification): The lane of the file and why.
+    """
+    config = get_config()
+    mime_type = get_mime_type(filename, content_type)
+    lane: IngestionLane = "heavy"
+    pages = None
+    if len(content) > config.fast_lane_max_bytes:
+        reason = "size"
+    elif mime_type.startswith("image/"):
+        reason = "image"
+    elif mime_type == PDF_MIME_TYPE:
+        pages, has_text = inspect_pdf(content)
+        if pages is not None and pages > config.fast_lane_max_pages:
+            reason = "pages"
+        elif not has_text:
+            reason = "scanned"
+        else:
+            lane, reason = "fast", "small"
+    else:
+        lane, reason = "fast", "small"
+
+    classification = IngestionClassification(
+        lane=lane, reason=reason, mime_type=mime_type, size=len(content), pages=pages
+    )
+    INGESTION_JOBS.labels(lane=classification.lane, reason=classification.reason).inc()
+    return classification
+
+
+def get_lane_queue(lane: IngestionLane) -> str:
+    """
+    Get the task queue of a lane.
+
+    Args:
+        lane(IngestionLane): The lane.
+
+    Returns:
+        (str): The name of the task queue.
+    """
+    config = get_config()
+    return (
+        config.temporal_heavy_queue if lane == "heavy" else config.temporal_fast_queue
+    )
+
+
+async def get_lane_depths(client: "Client") -> dict[str, int]:
+    """
+    Count the ingestions pending or running in every lane.
+    The files of a re-index backfill are activities of the re-index workflow, so they
+    are not counted.
+
+    Args:
+        client(Client): The Temporal client.
+
+    Returns:
+        (dict[str, int]): The number of open ingestion workflows by lane.
+    """
+    depths: dict[str, int] = {}
+    for lane in LANES:
+        count = await client.count_workflows(
+            'WorkflowType="EmbedFilesWorkflow" AND ExecutionStatus="Running" '
+            f'AND TaskQueue="{get_lane_queue(lane)}"'
+        )
+        depths[lane] = count.count
+    return depths
@@ -0,0 +1,141 @@
+"""
+Set of services to create the chat models of the RAG pipelines, one per node.
+
+Every node is assigned an LLM tier in the configuration: the main Azure OpenAI deployment for
+the calls needing its reasoning, a cheaper deployment or a small model served by an
+Ollama-compatible server for the simple ones, e.g. grading the documents or rewriting the
+question. The calls of every node are measured apart, with their cost, to compare the tiers.
+"""
+
+from typing import Any, Literal
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_ollama import ChatOllama
+from langchain_openai import AzureChatOpenAI
+from pydantic import BaseModel
+
+from utils.config import LLMTier, get_config
+from utils.llm_metrics import LLMMetricsCallbackHandler
+from utils.rate_limiter import get_http_client
+from utils.resilience import Dependency, get_dependency
+
+LLMNode = Literal["agent", "grade_documents", "rewrite", "answer", "rag_answer"]
+
+
+def get_tier(node: LLMNode) -> LLMTier:
+    """
+    Get the LLM tier assigned to a node.
+
+    Args:
+        node(LLMNode): The node.
+
+    Returns:
+        (LLMTier): The tier of the node.
+    """
+    config = get_config()
+    tiers: dict[LLMNode, LLMTier] = {
+        "agent": config.agent_llm_tier,
+        "grade_documents": config.grade_llm_tier,
+        "rewrite": config.rewrite_llm_tier,
+        "answer": config.answer_llm_tier,
+        "rag_answer": config.rag_answer_llm_tier,
+    }
+    return tiers[node]
+
+
+def get_model_name(tier: LLMTier) -> str:
+    """
+    Get the model of an LLM tier.
+
+    Args:
+        tier(LLMTier): The tier.
+
+    Returns:
+        (str): The Azure OpenAI deployment, or the Ollama model, of the tier.
+    """
+    config = get_config()
+    if tier == "ollama":
+        return config.ollama_llm_model
+    if tier == "azure_openai_small":
+        return config.azure_openai_small_llm_model
+    return config.azure_openai_llm_model
+
+
+class NodeLLM(BaseModel):
+    """
+    Chat model of a node, with the dependency its calls go through.
+
+    Attributes:
+        node(LLMNode): The node making the calls.
+        tier(LLMTier): The tier of the model.
+        model(BaseChatModel): The chat model, recording the metrics of the node.
+    """
+
+    node: LLMNode
+    tier: LLMTier
+    model: BaseChatModel
+
+    @property
+    def dependency(self) -> Dependency:
+        """
+        The dependency of the calls, so a local server failing does not open the circuit
+        breaker of Azure OpenAI.
+        """
+        return get_dependency("ollama" if self.tier == "ollama" else "llm")
+
+    def with_structured_output(self, schema: type[BaseModel]) -> Runnable[Any, Any]:
+        """
+        Get the model answering with an instance of a schema.
+        The small local models are constrained to the JSON schema rather than asked to call
+        a function, which they do less reliably.
+
+        Args:
+            schema(type[BaseModel]): The schema of the answer.
+
+        Returns:
+            (Runnable[Any, Any]): The model parsing its answers to the schema.
+        """
+        if self.tier == "ollama":
+            return self.model.with_structured_output(schema, method="json_schema")
+        return self.model.with_structured_output(schema)
+
+
+def create_node_llm(node: LLMNode) -> NodeLLM:
+    """
+    Create the chat model of a node, from the tier assigned to it.
+
+    Args:
+        node(LLMNode): The node.
+
+    Returns:
+        (NodeLLM): The chat model of the node.
+    """
+    config = get_config()
+    tier = get_tier(node)
+    model_name = get_model_name(tier)
+    callbacks: list[BaseCallbackHandler] = [
+        LLMMetricsCallbackHandler(
+            model_name, node=node, prices=config.llm_prices.get(model_name)
+        )
+    ]
+    model: BaseChatModel
+    if tier == "ollama":
+        model = ChatOllama(
+            model=model_name,
+            base_url=config.ollama_base_url,
+            callbacks=callbacks,
+            client_kwargs={"timeout": config.ollama_timeout},
+        )
+    else:
+        model = AzureChatOpenAI(
+            api_version=config.azure_openai_api_version,
+            azure_endpoint=str(config.azure_openai_endpoint),
+            model=model_name,
+            api_key=config.azure_openai_api_key,
+            callbacks=callbacks,
+            http_client=get_http_client("interactive"),
+            timeout=config.llm_timeout,
+        )
+    return NodeLLM(node=node, tier=tier, model=model)
@@ -0,0 +1,316 @@
+"""
+Set of services to embed texts in process on the CPU, with a small sentence-embedding model
+run by ONNX Runtime, instead of calling Azure OpenAI.
+
+The calls of all the threads of the process go through one batcher: the texts of the concurrent
+calls are embedded together in a single run of the model, queries first, so the runtime uses
+its threads on large batches rather than competing with itself on small ones.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from utils.config import get_config
+from utils.types import RequestPriority
+
+# Files of the model, at the root of its folder or of its Hugging Face repository
+MODEL_FILES = ("onnx/model.onnx", "tokenizer.json")
+
+PRIORITIES: dict[RequestPriority, int] = {"interactive": 0, "bulk": 1}
+
+
+def get_model_folder() -> Path:
+    """
+    Get the folder of the local embedding model: `LOCAL_EMBEDDING_MODEL_PATH` when set, e.g. in
+    an air-gapped deployment, or the download of `LOCAL_EMBEDDING_MODEL` from Hugging Face.
+
+    Returns:
+        (Path): The folder holding `onnx/model.onnx` and `tokenizer.json`.
+    """
+    config = get_config()
+    if config.local_embedding_model_path:
+        return Path(config.local_embedding_model_path)
+
+    from huggingface_hub import snapshot_download
+
+    return Path(
+        snapshot_download(
+            config.local_embedding_model, allow_patterns=list(MODEL_FILES)
+        )
+    )
+
+
+class SentenceEncoder:
+    """
+    Sentence-embedding model, e.g. `all-MiniLM-L6-v2` or `bge-small-en-v1.5`, exported to ONNX.
+    The embeddings are pooled from the token states and normalized.
+    """
+
+    def __init__(self, folder: Path, threads: int, max_length: int, pooling: str):
+        """
+        Load the tokenizer and the model.
+
+        Args:
+            folder(Path): The folder of the model.
+            threads(int): The threads of a run of the model, 0 for one per physical core.
+            max_length(int): The tokens of a text beyond which it is truncated.
+            pooling(str): `mean` to average the token states, `cls` to take the first one.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.__tokenizer = Tokenizer.from_file(str(folder / "tokenizer.json"))
+        self.__tokenizer.enable_truncation(max_length)
+        self.__tokenizer.no_padding()
+        self.__pad_id = next(
+            (
+                token_id
+                for token in ("[PAD]", "<pad>")
+                if (token_id := self.__tokenizer.token_to_id(token)) is not None
+            ),
+            0,
+        )
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.__session = onnxruntime.InferenceSession(
+            str(folder / "onnx" / "model.onnx"),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.__inputs = {input.name for input in self.__session.get_inputs()}
+        self.__pooling = pooling
+
+    def encode(self, texts: list[str], batch_size: int) -> np.ndarray:
+        """
+        Embed texts, in batches of texts of similar lengths to limit the padding.
+
+        Args:
+            texts(list[str]): The texts.
+            batch_size(int): The texts of a run of the model.
+
+        Returns:
+            (np.ndarray): The normalized embeddings, one row per text.
+        """
+        token_ids = [encoding.ids for encoding in self.__tokenizer.encode_batch(texts)]
+        order = sorted(range(len(texts)), key=lambda index: len(token_ids[index]))
+        embeddings: np.ndarray | None = None
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            # Padded to the longest text of the batch only
+            length = len(token_ids[batch[-1]])
+            input_ids = np.full((len(batch), length), self.__pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), length), dtype=np.int64)
+            for row, index in enumerate(batch):
+                input_ids[row, : len(token_ids[index])] = token_ids[index]
+                attention_mask[row, : len(token_ids[index])] = 1
+            feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.__inputs:
+                feed["token_type_ids"] = np.zeros_like(input_ids)
+            states = self.__session.run(None, feed)[0]
+            vectors = self.__pool(states, attention_mask)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return embeddings
+
+    def __pool(self, states: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """
+        Pool the token states of a batch into normalized sentence embeddings.
+
+        Args:
+            states(np.ndarray): The token states, or the sentence embeddings of the models
+                pooling already.
+            attention_mask(np.ndarray): The mask of the tokens that are not padding.
+
+        Returns:
+            (np.ndarray): The normalized embeddings.
+        """
+        if states.ndim == 3 and self.__pooling == "cls":
+            states = states[:, 0]
+        elif states.ndim == 3:
+            mask = attention_mask[..., np.newaxis].astype(np.float32)
+            states = (states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(states, axis=1, keepdims=True)
+        return (states / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class EmbeddingBatcher:
+    """
+    Queue of the embedding calls of the process, run together by a single thread.
+    The calls queued while the model runs are embedded together in its next run, up to
+    `batch_size` texts, the queries before the ingestions. A `max_wait` makes the thread wait
+    for more calls before a run that is not full.
+    """
+
+    def __init__(self, encoder: SentenceEncoder, batch_size: int, max_wait: float):
+        """
+        Start the thread of the batcher.
+
+        Args:
+            encoder(SentenceEncoder): The model.
+            batch_size(int): The texts of a run of the model.
+            max_wait(float): The seconds a call waits for other calls to join its batch.
+        """
+        self.__encoder = encoder
+        self.__batch_size = batch_size
+        self.__max_wait = max_wait
+        self.__queue: list[tuple[int, int, list[str], Future]] = []
+        self.__counter = itertools.count()
+        self.__condition = threading.Condition()
+        threading.Thread(
+            target=self.__run, name="embedding-batcher", daemon=True
+        ).start()
+
+    def embed(
+        self, texts: list[str], priority: RequestPriority = "bulk"
+    ) -> list[list[float]]:
+        """
+        Embed texts with the ones of the concurrent calls.
+
+        Args:
+            texts(list[str]): The texts.
+            priority(RequestPriority): `interactive` to embed the texts before the bulk ones.
+
+        Returns:
+            (list[list[float]]): The embeddings, one per text.
+        """
+        # The texts of a long call are queued by batch, so queries run between its batches
+        futures: list[Future] = []
+        with self.__condition:
+            for start in range(0, len(texts), self.__batch_size):
+                future: Future = Future()
+                heapq.heappush(
+                    self.__queue,
+                    (
+                        PRIORITIES[priority],
+                        next(self.__counter),
+                        texts[start : start + self.__batch_size],
+                        future,
+                    ),
+                )
+                futures.append(future)
+            self.__condition.notify()
+        return [embedding for future in futures for embedding in future.result()]
+
+    def __next_batch(self) -> list[tuple[list[str], Future]]:
+        """
+        Wait for the calls of the next batch.
+
+        Returns:
+            (list[tuple[list[str], Future]]): The texts and the result of every call.
+        """
+        with self.__condition:
+            while not self.__queue:
+                self.__condition.wait()
+            deadline = time.monotonic() + self.__max_wait
+            while (
+                sum(len(texts) for _, _, texts, _ in self.__queue) < self.__batch_size
+                and (remaining := deadline - time.monotonic()) > 0
+            ):
+                self.__condition.wait(remaining)
+            calls = [heapq.heappop(self.__queue)[2:]]
+            size = len(calls[0][0])
+            while self.__queue and size + len(self.__queue[0][2]) <= self.__batch_size:
+                calls.append(heapq.heappop(self.__queue)[2:])
+                size += len(calls[-1][0])
+            return calls
+
+    def __run(self) -> None:
+        """
+        Embed the batches as they come, and hand every call its embeddings.
+        """
+        while True:
+            calls = self.__next_batch()
+            try:
+                embeddings = self.__encoder.encode(
+                    [text for texts, _ in calls for text in texts], self.__batch_size
+                ).tolist()
+            except Exception as error:
+                for _, future in calls:
+                    future.set_exception(error)
+                continue
+            start = 0
+            for texts, future in calls:
+                future.set_result(embeddings[start : start + len(texts)])
+                start += len(texts)
+
+
+@lru_cache
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Get the batcher of the process, loading the model on the first call.
+
+    Returns:
+        (EmbeddingBatcher): The batcher.
+    """
+    config = get_config()
+    encoder = SentenceEncoder(
+        get_model_folder(),
+        threads=config.local_embedding_threads,
+        max_length=config.local_embedding_max_length,
+        pooling=config.local_embedding_pooling,
+    )
+    return EmbeddingBatcher(
+        encoder,
+        batch_size=config.local_embedding_batch_size,
+        max_wait=config.local_embedding_max_wait,
+    )
+
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    LlamaIndex embedding model running in process, through the batcher of the process.
+
+    Attributes:
+        priority(RequestPriority): The priority of the calls in the batcher,
+            `interactive` when embedding queries.
+    """
+
+    priority: RequestPriority = "bulk"
+    __batcher: EmbeddingBatcher = PrivateAttr()
+
+    def __init__(self, priority: RequestPriority = "bulk", **kwargs):
+        """
+        Initializes the local embedding model.
+
+        Args:
+            priority(RequestPriority): The priority of the calls in the batcher.
+        """
+        super().__init__(
+            model_name=get_config().local_embedding_model,
+            embed_batch_size=get_config().local_embedding_batch_size,
+            **kwargs,
+        )
+        self.priority = priority
+        self.__batcher = get_embedding_batcher()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalEmbedding"
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self.__batcher.embed([query], self.priority)[0]
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self.__batcher.embed([text], self.priority)[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self.__batcher.embed(texts, self.priority)
@@ -0,0 +1,116 @@
+"""
+Set of tools to split a large PDF into page ranges, partitioned by Unstructured in parallel,
+and to merge the chunks of the ranges back into the chunks of the whole file.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import BinaryIO
+
+from llama_index.core.schema import BaseNode
+from pydantic import BaseModel
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PyPdfError
+
+logger = logging.getLogger(__name__)
+
+
+class PdfSegment(BaseModel):
+    """
+    Range of pages of a PDF, written to a file of its own.
+
+    Attributes:
+        index(int): The position of the range in the file.
+        first_page(int): The first page of the range, from 1.
+        last_page(int): The last page of the range, included.
+        file_path(Path): The temporary PDF holding the pages of the range.
+    """
+
+    index: int
+    first_page: int
+    last_page: int
+    file_path: Path
+
+
+def count_pdf_pages(file: Path | BinaryIO) -> int:
+    """
+    Count the pages of a PDF.
+
+    Args:
+        file(Path | BinaryIO): The PDF, or its content, read from its start.
+
+    Returns:
+        (int): The number of pages, 0 if the file cannot be read, e.g. encrypted.
+    """
+    try:
+        reader = PdfReader(file)
+        if reader.is_encrypted:
+            return 0
+        return len(reader.pages)
+    except (PyPdfError, OSError, ValueError) as error:
+        logger.warning("Cannot count the pages of the PDF: %s", error)
+        return 0
+
+
+def split_pdf(file: Path | BinaryIO, pages: int, directory: Path) -> list[PdfSegment]:
+    """
+    Split a PDF into ranges of pages, every range written to a file of its own.
+
+    Args:
+        file(Path | BinaryIO): The PDF, or its content, read from its start.
+        pages(int): The pages of a range.
+        directory(Path): The folder of the ranges.
+
+    Returns:
+        (list[PdfSegment]): The ranges, in the order of the pages.
+    """
+    reader = PdfReader(file)
+    segments: list[PdfSegment] = []
+    for index, start in enumerate(range(0, len(reader.pages), pages)):
+        end = min(start + pages, len(reader.pages))
+        writer = PdfWriter()
+        writer.append(reader, pages=(start, end))
+        segment_path = directory / f"{index}.pdf"
+        with open(segment_path, "wb") as f:
+            writer.write(f)
+        segments.append(
+            PdfSegment(
+                index=index,
+                first_page=start + 1,
+                last_page=end,
+                file_path=segment_path,
+            )
+        )
+    return segments
+
+
+def merge_segment_documents(
+    segments: list[tuple[PdfSegment, list[BaseNode]]],
+) -> list[BaseNode]:
+    """
+    Merge the chunks of the page ranges of a PDF, in the order of the pages.
+    The page numbers, relative to the range, are shifted to the pages of the file, the chunks
+    are numbered across the file, and their IDs are hashed again like the ones of a single
+    partition, so no two chunks of the file share an ID.
+
+    Args:
+        segments(list[tuple[PdfSegment, list[BaseNode]]]): The chunks of every range.
+
+    Returns:
+        (list[BaseNode]): The chunks of the file.
+    """
+    documents: list[BaseNode] = []
+    for segment, segment_documents in sorted(segments, key=lambda item: item[0].index):
+        for document in segment_documents:
+            metadata = document.metadata
+            if isinstance(metadata.get("page_number"), int):
+                metadata["page_number"] += segment.first_page - 1
+            if "sequence_number" in metadata:
+                metadata["sequence_number"] = len(documents)
+                document.id_ = hashlib.sha256(
+                    f"{metadata.get('filename')}{document.get_content()}"
+                    f"{metadata.get('page_number')}{len(documents)}".encode()
+                ).hexdigest()[:32]
+            documents.append(document)
+    return documents
@@ -28,6 +28,11 @@ Documents:
 """
 
 
+AGENT_SYSTEM_PROMPT = """You are an assistant answering questions about the documents of the user.
+Call the retrieve tool to find the documents answering the question.
+If the documents retrieved earlier in the conversation already answer a follow-up question, answer it from them without calling the tool again."""
+
+
 DOCUMENT_GRADING_PROMPT = """You are a grader assessing relevance of a retrieved document to a user question.
 Here is the retrieved document:
 <document>
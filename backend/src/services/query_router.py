@@ -0,0 +1,125 @@
+"""
+Query router choosing the retrieval mode of a query from cheap lexical features,
+so lookups of codes, IDs or exact phrases skip the embedding call.
+"""
+
+import logging
+import re
+from typing import Literal
+
+from pydantic import BaseModel
+
+from utils.metrics import QUERY_ROUTES
+from utils.types import QueryModeOption
+
+logger = logging.getLogger(__name__)
+
+QueryMode = Literal["text_search", "default", "hybrid"]
+
+# The hybrid weight of the vector search when no feature stands out
+DEFAULT_ALPHA = 0.3
+
+_QUOTED_PHRASE = re.compile(r"\"[^\"]+\"|'[^']+'")
+# Tokens mixing letters and digits, or digits and separators: SKU-4821-B, INV2024, 10.2.3, UUIDs
+_IDENTIFIER = re.compile(r"^(?=.*\d)[\w][\w\-./:#]*$")
+_EMAIL_OR_URL = re.compile(r"^[\w.+-]+@[\w-]+\.[\w.-]+$|^https?://\S+$")
+_QUESTION_WORDS = {
+    "how",
+    "what",
+    "why",
+    "when",
+    "where",
+    "which",
+    "who",
+    "can",
+    "could",
+    "should",
+    "does",
+    "do",
+    "is",
+    "are",
+    "explain",
+    "describe",
+}
+
+
+class QueryRoute(BaseModel):
+    """
+    Retrieval mode chosen for a query.
+
+    Attributes:
+        mode(str): `text_search` (BM25 only), `default` (vector only) or `hybrid`.
+        alpha(float): The weight of the vector search in hybrid mode, from 0 (BM25) to 1 (vector).
+        reason(str): The feature the route was chosen on.
+    """
+
+    mode: QueryMode
+    alpha: float = DEFAULT_ALPHA
+    reason: str
+
+
+def classify_query(query: str) -> QueryRoute:
+    """
+    Choose the retrieval mode of a query from its lexical features.
+
+    Args:
+        query(str): The user query.
+
+    Returns:
+        (QueryRoute): The chosen route.
+    """
+    tokens = query.strip().split()
+    if not tokens:
+        return QueryRoute(mode="hybrid", reason="empty")
+
+    if _QUOTED_PHRASE.search(query):
+        return QueryRoute(mode="text_search", alpha=0.0, reason="quoted_phrase")
+
+    words = [token.strip("?!.,;:()[]") for token in tokens]
+    is_question = words[0].lower() in _QUESTION_WORDS or query.rstrip().endswith("?")
+    identifiers = [
+        word for word in words if _IDENTIFIER.match(word) or _EMAIL_OR_URL.match(word)
+    ]
+    if identifiers and len(words) <= 3 and not is_question:
+        return QueryRoute(mode="text_search", alpha=0.0, reason="identifier_lookup")
+    if identifiers:
+        return QueryRoute(mode="hybrid", alpha=0.15, reason="identifier_in_text")
+
+    if is_question and len(words) >= 6:
+        return QueryRoute(mode="default", alpha=1.0, reason="natural_language")
+    if len(words) <= 2 and not is_question:
+        return QueryRoute(mode="hybrid", alpha=0.2, reason="keywords")
+    return QueryRoute(mode="hybrid", reason="mixed")
+
+
+def route_query(
+    query: str,
+    query_mode: QueryModeOption = "auto",
+    alpha: float | None = None,
+) -> QueryRoute:
+    """
+    Get the route of a query, classified or overridden by the caller, and record it.
+
+    Args:
+        query(str): The user query.
+        query_mode(str): The retrieval mode, `auto` to classify the query.
+        alpha(float | None): The hybrid weight of the vector search, overriding the route's.
+
+    Returns:
+        (QueryRoute): The route to use.
+    """
+    if query_mode == "auto":
+        route = classify_query(query)
+    else:
+        route = QueryRoute(mode=query_mode, reason="override")
+    if alpha is not None:
+        route.alpha = alpha
+
+    QUERY_ROUTES.labels(mode=route.mode, reason=route.reason).inc()
+    logger.info(
+        "Query routed to %s (alpha=%.2f, reason=%s)",
+        route.mode,
+        route.alpha,
+        route.reason,
+    )
+    return route
@@ -2,26 +2,162 @@ import datetime
 from collections.abc import Callable
 from typing import Literal, cast
 
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.tools import Tool
-from langchain_openai import AzureChatOpenAI
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 from llama_index.core import VectorStoreIndex
-from llama_index.core.schema import NodeWithScore
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
 from pydantic import BaseModel, PrivateAttr
 
+from services.conversations import get_question, trim_history
 from services.embeddings import VectorStoreHandler
+from services.llms import LLMNode, NodeLLM, create_node_llm
 from services.prompts import (
+    AGENT_SYSTEM_PROMPT,
     ANSWER_PROMPT,
     DOCUMENT_GRADING_PROMPT,
     QUERY_REWRITE_PROMPT,
     RAG_SYSTEM_PROMPT,
     RAG_USER_PROMPT,
 )
+from services.query_router import QueryRoute, route_query
 from utils.config import get_config
-from utils.types import AgenticRagState, DocumentGrade, QueryResponse, Source
+from utils.metrics import (
+    GRAPH_NODE_SECONDS,
+    QUERY_EMBEDDING_SECONDS,
+    RETRIEVAL_SECONDS,
+)
+from utils.resilience import get_dependency
+from utils.state import AgenticRagState
+from utils.types import (
+    DocumentGrade,
+    QueryFilters,
+    QueryModeOption,
+    QueryResponse,
+    Source,
+)
+
+
+def to_timestamp(value: datetime.datetime) -> int:
+    """
+    Convert a time to the Unix timestamp stored in `uploaded_at`, a naive time being UTC.
+
+    Args:
+        value(datetime.datetime): The time.
+
+    Returns:
+        (int): The Unix timestamp in seconds.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return int(value.timestamp())
+
+
+def build_metadata_filters(filters: QueryFilters | None) -> MetadataFilters | None:
+    """
+    Convert the filters of a query to LlamaIndex metadata filters, which the vector store
+    turns into a Weaviate filter restricting the candidates of the vector and BM25 search.
+
+    Args:
+        filters(QueryFilters | None): The filters of the query.
+
+    Returns:
+        (MetadataFilters | None): The metadata filters, None if nothing is filtered.
+    """
+    if filters is None:
+        return None
+
+    metadata_filters: list[MetadataFilter | MetadataFilters] = []
+    for key, values in (
+        ("blob_path", filters.blob_paths),
+        ("filename", filters.filenames),
+        ("filetype", filters.file_types),
+    ):
+        if values is None:
+            continue
+        if len(values) == 1:
+            metadata_filters.append(MetadataFilter(key=key, value=values[0]))
+        else:
+            metadata_filters.append(
+                MetadataFilter(key=key, value=values, operator=FilterOperator.ANY)
+            )
+    if filters.uploaded_after is not None:
+        metadata_filters.append(
+            MetadataFilter(
+                key="uploaded_at",
+                value=to_timestamp(filters.uploaded_after),
+                operator=FilterOperator.GTE,
+            )
+        )
+    if filters.uploaded_before is not None:
+        metadata_filters.append(
+            MetadataFilter(
+                key="uploaded_at",
+                value=to_timestamp(filters.uploaded_before),
+                operator=FilterOperator.LT,
+            )
+        )
+    metadata_filters.extend(
+        MetadataFilter(key=key, value=value) for key, value in filters.metadata.items()
+    )
+    return MetadataFilters(filters=metadata_filters) if metadata_filters else None
+
+
+def retrieve_nodes(
+    vector_store_index: VectorStoreIndex,
+    embed_model: BaseEmbedding,
+    query: str,
+    route: QueryRoute,
+    top_k: int,
+    filters: MetadataFilters | None = None,
+) -> list[NodeWithScore]:
+    """
+    Embeds the query, unless the route is BM25 only, and retrieves the matching nodes,
+    timing both stages separately. Both are reads, hedged when slow.
+
+    Args:
+        vector_store_index(VectorStoreIndex): The index to retrieve from.
+        embed_model(BaseEmbedding): The model to embed the query with.
+        query(str): The query to use.
+        route(QueryRoute): The retrieval mode and hybrid weight.
+        top_k(int): The number of results to return.
+        filters(MetadataFilters | None): The filters restricting the searched nodes.
+
+    Returns:
+        (list[NodeWithScore]): The retrieved nodes.
+    """
+    query_bundle = QueryBundle(query_str=query)
+    if route.mode != "text_search":
+        with QUERY_EMBEDDING_SECONDS.time():
+            # A duplicate of a local embedding would only compete for the same CPU
+            query_bundle.embedding = get_dependency("embeddings").call(
+                "query_embedding",
+                embed_model.get_query_embedding,
+                query,
+                hedge=get_config().embedding_backend != "local",
+            )
+
+    retriever = vector_store_index.as_retriever(
+        vector_store_query_mode=route.mode,
+        similarity_top_k=top_k,
+        alpha=route.alpha,
+        filters=filters,
+    )
+    with RETRIEVAL_SECONDS.labels(mode=route.mode).time():
+        sources = get_dependency("weaviate").call(
+            f"retrieve_{route.mode}", retriever.retrieve, query_bundle, hedge=True
+        )
+    return cast(list[NodeWithScore], sources)
 
 
 class RagService(BaseModel):
@@ -34,7 +170,8 @@ class RagService(BaseModel):
 
     index_name: str
     __vector_store_index: VectorStoreIndex = PrivateAttr()
-    __llm_model: AzureChatOpenAI = PrivateAttr()
+    __embed_model: BaseEmbedding = PrivateAttr()
+    __llm: NodeLLM = PrivateAttr()
 
     def __init__(self, index_name: str = "Documents", **kwargs):
         """
@@ -44,38 +181,43 @@ class RagService(BaseModel):
             index_name(str): The name of the index to use.
         """
         super().__init__(index_name=index_name, **kwargs)
-        self.__vector_store_index = VectorStoreHandler(
+        vector_store_handler = VectorStoreHandler(
             index_name=index_name,
-        ).get_index()
-        self.__llm_model = AzureChatOpenAI(
-            api_version=get_config().azure_openai_api_version,
-            azure_endpoint=str(get_config().azure_openai_endpoint),
-            model=get_config().azure_openai_llm_model,
-            api_key=get_config().azure_openai_api_key,
+            priority="interactive",
         )
+        self.__vector_store_index = vector_store_handler.get_index()
+        self.__embed_model = vector_store_handler.get_embed_model()
+        self.__llm = create_node_llm("rag_answer")
 
     def query(
         self,
         query: str,
-        query_mode: str = "hybrid",
+        query_mode: QueryModeOption = "auto",
         top_k: int = 15,
+        alpha: float | None = None,
+        filters: QueryFilters | None = None,
     ) -> QueryResponse:
         """
         Queries the RAG service.
 
         Args:
             query(str): The query to use.
+            query_mode(str): The vector store query mode, `auto` to let the query router choose.
             top_k(int): The number of results to return.
+            alpha(float | None): The hybrid weight of the vector search, the route's if None.
+            filters(QueryFilters | None): The filters narrowing the searched documents.
 
         Returns:
             The response containing the status and message.
         """
-        sources = self.__vector_store_index.as_retriever(
-            vector_store_query_mode=query_mode,
-            similarity_top_k=top_k,
-            alpha=0.3,
-        ).retrieve(query)
-        sources = cast(list[NodeWithScore], sources)
+        sources = retrieve_nodes(
+            self.__vector_store_index,
+            self.__embed_model,
+            query,
+            route_query(query, query_mode, alpha),
+            top_k,
+            build_metadata_filters(filters),
+        )
         sources_str = "\n\n".join([source.get_content() for source in sources])
         prompt = ChatPromptTemplate.from_messages(
             [
@@ -83,17 +225,17 @@ class RagService(BaseModel):
                 ("user", RAG_USER_PROMPT),
             ]
         )
-        chain = prompt | self.__llm_model
-        response = chain.invoke(
+        chain = prompt | self.__llm.model
+        response = self.__llm.dependency.call(
+            "rag_answer",
+            chain.invoke,
             {
                 "query": query,
                 "documents": sources_str,
                 "date": datetime.datetime.now().strftime("%Y-%m-%d"),
-            }
+            },
         )
 
-        print("Response: ", response.content)
-
         return QueryResponse(
             message=str(response.content),
             sources=[
@@ -108,14 +250,32 @@ class RagService(BaseModel):
     def retrieve(
         self,
         query: str,
-        query_mode: str = "hybrid",
+        query_mode: QueryModeOption = "auto",
         top_k: int = 15,
+        alpha: float | None = None,
+        filters: QueryFilters | None = None,
     ) -> list[Source]:
-        sources = self.__vector_store_index.as_retriever(
-            vector_store_query_mode=query_mode,
-            similarity_top_k=top_k,
-            alpha=0.3,
-        ).retrieve(query)
+        """
+        Retrieves the documents that match the query.
+
+        Args:
+            query(str): The query to use.
+            query_mode(str): The vector store query mode, `auto` to let the query router choose.
+            top_k(int): The number of results to return.
+            alpha(float | None): The hybrid weight of the vector search, the route's if None.
+            filters(QueryFilters | None): The filters narrowing the searched documents.
+
+        Returns:
+            (list[Source]): The retrieved documents.
+        """
+        sources = retrieve_nodes(
+            self.__vector_store_index,
+            self.__embed_model,
+            query,
+            route_query(query, query_mode, alpha),
+            top_k,
+            build_metadata_filters(filters),
+        )
         return [
             Source(text=source.get_content(), metadata=source.metadata)
             for source in sources
@@ -125,7 +285,8 @@ class RagService(BaseModel):
 class AgenticRagService(BaseModel):
     """
     Service to handle the RAG process.
-    This service uses Azure OpenAI to generate the response, as it has broader capabilities than Ollama.
+    Every node of the graph calls the LLM of its tier, so the simple steps, grading the
+    documents and rewriting the question, may run on a cheaper or a local model.
 
     Attributes:
         index_name(str): The name of the index to use.
@@ -133,7 +294,8 @@ class AgenticRagService(BaseModel):
 
     index_name: str
     __vector_store_index: VectorStoreIndex = PrivateAttr()
-    __llm_model: AzureChatOpenAI = PrivateAttr()
+    __embed_model: BaseEmbedding = PrivateAttr()
+    __llms: dict[LLMNode, NodeLLM] = PrivateAttr()
 
     def __init__(self, index_name: str = "Documents", **kwargs):
         """
@@ -143,15 +305,16 @@ class AgenticRagService(BaseModel):
             index_name(str): The name of the index to use.
         """
         super().__init__(index_name=index_name, **kwargs)
-        self.__vector_store_index = VectorStoreHandler(
+        vector_store_handler = VectorStoreHandler(
             index_name=index_name,
-        ).get_index()
-        self.__llm_model = AzureChatOpenAI(
-            api_version=get_config().azure_openai_api_version,
-            azure_endpoint=str(get_config().azure_openai_endpoint),
-            model=get_config().azure_openai_llm_model,
-            api_key=get_config().azure_openai_api_key,
+            priority="interactive",
         )
+        self.__vector_store_index = vector_store_handler.get_index()
+        self.__embed_model = vector_store_handler.get_embed_model()
+        self.__llms = {
+            node: create_node_llm(node)
+            for node in ("agent", "grade_documents", "rewrite", "answer")
+        }
 
     def generate_grade_documents_edge(
         self,
@@ -161,6 +324,7 @@ class AgenticRagService(BaseModel):
         It will grade the documents and based on the output it will move through the graph.
         """
 
+        @GRAPH_NODE_SECONDS.labels(node="grade_documents").time()
         def grade_documents(state: AgenticRagState) -> Literal["answer", "rewrite"]:
             """
             Grade the documents and based on the output it will move through the graph.
@@ -171,23 +335,22 @@ class AgenticRagService(BaseModel):
             Returns:
                 (Literal["answer", "rewrite"]): The next edge to move to.
             """
-            print("--- DOCUMENT GRADING ---")
-            llm_with_structured_output = self.__llm_model.with_structured_output(
-                DocumentGrade
-            )
+            llm = self.__llms["grade_documents"]
+            llm_with_structured_output = llm.with_structured_output(DocumentGrade)
             document_grading_prompt = PromptTemplate.from_template(
                 DOCUMENT_GRADING_PROMPT
             )
             chain = document_grading_prompt | llm_with_structured_output
             messages = state["messages"]
-            response = chain.invoke(
+            response = llm.dependency.call(
+                "grade_documents",
+                chain.invoke,
                 {
-                    "question": messages[0].content,
+                    "question": get_question(messages),
                     "context": messages[-1].content,
-                }
+                },
             )
             response = cast(DocumentGrade, response)
-            print("Response: ", response)
 
             if response.is_relevant:
                 return "answer"
@@ -195,16 +358,18 @@ class AgenticRagService(BaseModel):
 
         return grade_documents
 
-    def __generate_retriever_tool(self) -> list[Tool]:
+    def __generate_retriever_tool(
+        self, filters: QueryFilters | None = None
+    ) -> list[Tool]:
         """
         Generate a retriever tool for the vector store.
+
+        Args:
+            filters(QueryFilters | None): The filters narrowing the searched documents.
         """
-        retriever = self.__vector_store_index.as_retriever(
-            vector_store_query_mode="hybrid",
-            similarity_top_k=15,
-            alpha=0.3,
-        )
+        metadata_filters = build_metadata_filters(filters)
 
+        @GRAPH_NODE_SECONDS.labels(node="retrieve").time()
         def retrieve(query: str) -> list[Source]:
             """
             Retrieve documents from the vector store.
@@ -215,8 +380,14 @@ class AgenticRagService(BaseModel):
             Returns:
                 (list[Source]): A list of documents.
             """
-            print("--- RETRIEVING DOCUMENTS TOOL ---")
-            sources = retriever.retrieve(query)
+            sources = retrieve_nodes(
+                self.__vector_store_index,
+                self.__embed_model,
+                query,
+                route_query(query),
+                15,
+                metadata_filters,
+            )
             return [
                 Source(text=source.get_content(), metadata=source.metadata)
                 for source in sources
@@ -235,9 +406,11 @@ class AgenticRagService(BaseModel):
         Generate an agent node for the graph.
         """
 
+        @GRAPH_NODE_SECONDS.labels(node="agent").time()
         def agent_node(state: AgenticRagState) -> AgenticRagState:
             """
-            Call the agent.
+            Call the agent with the history of the conversation, trimmed to its last turns,
+            so it may answer from the documents retrieved by the previous turns.
 
             Args:
                 state(AgenticRagState): The state of the agent.
@@ -245,13 +418,17 @@ class AgenticRagService(BaseModel):
             Returns:
                 (AgenticRagState): The state of the agent.
             """
-            print("--- AGENT NODE ---")
-            messages = state["messages"]
-            llm_with_tools = self.__llm_model.bind_tools(
-                self.__generate_retriever_tool()
+            messages, removals = trim_history(
+                state["messages"], get_config().conversation_max_tokens
             )
-            response = llm_with_tools.invoke(messages)
-            return {"messages": [response]}
+            llm = self.__llms["agent"]
+            llm_with_tools = llm.model.bind_tools(self.__generate_retriever_tool())
+            response = llm.dependency.call(
+                "agent",
+                llm_with_tools.invoke,
+                [SystemMessage(content=AGENT_SYSTEM_PROMPT), *messages],
+            )
+            return {"messages": [*removals, response]}
 
         return agent_node
 
@@ -261,6 +438,7 @@ class AgenticRagService(BaseModel):
         This node will rewrite the user query based on the efficacy of the retrieved documents.
         """
 
+        @GRAPH_NODE_SECONDS.labels(node="rewrite").time()
         def rewrite_node(state: AgenticRagState) -> AgenticRagState:
             """
             Rewrite the documents.
@@ -271,12 +449,13 @@ class AgenticRagService(BaseModel):
             Returns:
                 (AgenticRagState): The state of the agent.
             """
-            print("--- REWRITE QUERY ---")
-            messages = state["messages"]
-            question = messages[0].content
+            question = get_question(state["messages"])
             prompt = PromptTemplate.from_template(QUERY_REWRITE_PROMPT)
-            chain = prompt | self.__llm_model
-            response = chain.invoke({"question": question})
+            llm = self.__llms["rewrite"]
+            chain = prompt | llm.model
+            response = llm.dependency.call(
+                "rewrite", chain.invoke, {"question": question}
+            )
             return {"messages": [response]}
 
         return rewrite_node
@@ -286,6 +465,7 @@ class AgenticRagService(BaseModel):
         Generate an answer node for the graph.
         """
 
+        @GRAPH_NODE_SECONDS.labels(node="answer").time()
         def answer_node(state: AgenticRagState) -> AgenticRagState:
             """
             Answer the question.
@@ -296,25 +476,36 @@ class AgenticRagService(BaseModel):
             Returns:
                 (AgenticRagState): The state of the agent.
             """
-            print("--- ANSWER QUERY ---")
             messages = state["messages"]
-            question = messages[0].content
+            question = get_question(messages)
             last_message = messages[-1]
             docs = last_message.content
             prompt = PromptTemplate.from_template(ANSWER_PROMPT)
-            chain = prompt | self.__llm_model
-            response = chain.invoke({"question": question, "context": docs})
+            llm = self.__llms["answer"]
+            chain = prompt | llm.model
+            response = llm.dependency.call(
+                "answer", chain.invoke, {"question": question, "context": docs}
+            )
             return {"messages": [response]}
 
         return answer_node
 
-    def generate_rag_graph(self) -> CompiledStateGraph:
+    def generate_rag_graph(
+        self,
+        filters: QueryFilters | None = None,
+        checkpointer: BaseCheckpointSaver | None = None,
+    ) -> CompiledStateGraph:
         """
         Generate the Agentic RAG LangGraph graph.
+
+        Args:
+            filters(QueryFilters | None): The filters narrowing the documents the agent retrieves.
+            checkpointer(BaseCheckpointSaver | None): The store of the conversations, to run the
+                graph as a turn of the thread given in its configuration.
         """
         graph = StateGraph(AgenticRagState)
         graph.add_node("agent", self.generate_agent_node())
-        retriever_node = ToolNode(self.__generate_retriever_tool())
+        retriever_node = ToolNode(self.__generate_retriever_tool(filters))
         graph.add_node("retrieve", retriever_node)
         graph.add_node("rewrite", self.generate_rewrite_node())
         graph.add_node("answer", self.generate_answer_node())
@@ -324,7 +515,7 @@ class AgenticRagService(BaseModel):
             tools_condition,
             {
                 "tools": "retrieve",
-                "END": END,
+                END: END,
             },
         )
         graph.add_conditional_edges(
@@ -333,5 +524,5 @@ class AgenticRagService(BaseModel):
         )
         graph.add_edge("answer", END)
         graph.add_edge("rewrite", "agent")
-        compiled_graph = graph.compile()
+        compiled_graph = graph.compile(checkpointer=checkpointer)
         return compiled_graph
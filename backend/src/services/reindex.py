@@ -0,0 +1,296 @@
+"""
+Set of services to rebuild an index in a new collection while the current one serves the queries.
+"""
+
+import uuid
+from collections.abc import Callable
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from pydantic import BaseModel
+from weaviate.collections.classes.internal import Object
+
+from services.documents import DocumentService
+from services.embeddings import VectorStoreHandler
+from services.files import FileHandler
+from utils.config import get_config
+from utils.types import (
+    ReindexChunksRequest,
+    ReindexPlan,
+    ReindexSyncResult,
+    ReindexValidationRequest,
+    ReindexWorkflowRequest,
+)
+
+
+def to_node(document: Object) -> BaseNode:
+    """
+    Rebuild the LlamaIndex node of a stored chunk, to embed it again.
+
+    Args:
+        document(Object): The Weaviate object, with the `text` and `_node_content` properties.
+
+    Returns:
+        (BaseNode): The node, with the ID of the object.
+    """
+    properties = dict(document.properties)
+    node = metadata_dict_to_node(properties)
+    node.set_content(str(properties.get("text") or ""))
+    node.id_ = str(document.uuid)
+    return node
+
+
+class ReindexService(BaseModel):
+    """
+    Plans, backfills and validates the rebuild of an index into a new collection.
+    The switch itself is done with `services.aliases.set_index_alias`.
+    """
+
+    def plan(self, request: ReindexWorkflowRequest) -> ReindexPlan:
+        """
+        Create the new collection and split the backfill into work units.
+
+        Args:
+            request(ReindexWorkflowRequest): The re-index request, with its target index.
+
+        Returns:
+            (ReindexPlan): The work units.
+
+        Raises:
+            ValueError: If the target is the collection serving the queries.
+        """
+        source = DocumentService(index_name=request.alias)
+        source_index = source.get_collection_name()
+        target_index = request.target_index or ""
+        if target_index in ("", source_index, request.alias):
+            raise ValueError(f"Invalid target collection {target_index!r}")
+
+        if request.source == "blobs":
+            return ReindexPlan(
+                source_index=source_index,
+                target_index=target_index,
+                blob_paths=self.list_blob_paths(),
+                embed_task_queue=get_config().temporal_heavy_queue,
+                alias_cache_ttl=get_config().index_alias_cache_ttl,
+            )
+
+        target = DocumentService(index_name=target_index)
+        try:
+            target.create_collection(source.get_property_types())
+        except ValueError:
+            # Created by a previous attempt, the backfill overwrites the chunks by ID
+            pass
+
+        # Every range starts after the last ID of the previous one, so they can be copied in parallel
+        cursors: list[uuid.UUID | None] = [None]
+        for position, document in enumerate(
+            source.iter_documents(fields=[], batch_size=request.batch_size), start=1
+        ):
+            if position % request.batch_size == 0:
+                cursors.append(document.uuid)
+        return ReindexPlan(
+            source_index=source_index,
+            target_index=target_index,
+            cursors=cursors,
+            alias_cache_ttl=get_config().index_alias_cache_ttl,
+        )
+
+    def list_blob_paths(self) -> list[str]:
+        """
+        List the files stored in the blob storage.
+
+        Returns:
+            (list[str]): The paths of the files.
+        """
+        return FileHandler().list_blobs(get_config().storage_bucket)
+
+    def list_unindexed_blob_paths(self, index_name: str) -> list[str]:
+        """
+        List the files of the blob storage without any chunk in a collection.
+
+        Args:
+            index_name(str): The collection.
+
+        Returns:
+            (list[str]): The paths of the files.
+        """
+        document_service = DocumentService(index_name=index_name)
+        try:
+            indexed = {
+                document.properties.get("blob_path")
+                for document in document_service.iter_documents(fields=["blob_path"])
+            }
+        finally:
+            document_service.close()
+        return [path for path in self.list_blob_paths() if path not in indexed]
+
+    def copy_chunks(
+        self,
+        request: ReindexChunksRequest,
+        on_batch: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Copy a range of chunks to the new collection, embedding them again if requested.
+        The chunks keep their ID, so a retried range overwrites the chunks already copied.
+
+        Args:
+            request(ReindexChunksRequest): The range to copy.
+            on_batch(Callable[[int], None] | None): Called with the number of copied chunks
+                after every batch, e.g. to heartbeat.
+
+        Returns:
+            (int): The number of copied chunks.
+        """
+        source = DocumentService(index_name=request.source_index)
+        target = DocumentService(index_name=request.target_index)
+        vector_store = VectorStoreHandler(index_name=request.target_index)
+        fields = list(source.get_property_types())
+        before = str(request.before) if request.before else None
+
+        count = 0
+        cursor = request.after
+        while True:
+            page = source.get_documents_after(
+                after=cursor,
+                limit=request.batch_size,
+                fields=fields,
+                include_vector=not request.reembed,
+            ).objects
+            documents = [
+                document
+                for document in page
+                if before is None or str(document.uuid) <= before
+            ]
+            self.__write_chunks(documents, target, vector_store, request.reembed)
+            count += len(documents)
+            if on_batch:
+                on_batch(count)
+            if len(page) < request.batch_size or len(documents) < len(page):
+                return count
+            cursor = page[-1].uuid
+
+    def sync_chunks(
+        self,
+        request: ReindexChunksRequest,
+        on_batch: Callable[[int], None] | None = None,
+    ) -> ReindexSyncResult:
+        """
+        Copy the chunks of the current collection missing from the new one: the chunks
+        ingested into the current collection while its ranges were copied, which fall in
+        ranges already copied, or after the switch by the processes still holding the
+        previous alias. With `delete_missing`, the chunks of the new collection missing from
+        the current one are deleted, which only holds before the switch. Only the IDs of
+        the collections are listed, and the missing chunks are fetched by ID.
+
+        Args:
+            request(ReindexChunksRequest): The collections, the range is ignored.
+            on_batch(Callable[[int], None] | None): Called with the number of copied chunks
+                after every batch, e.g. to heartbeat.
+
+        Returns:
+            (ReindexSyncResult): The numbers of copied and deleted chunks.
+        """
+        source = DocumentService(index_name=request.source_index)
+        target = DocumentService(index_name=request.target_index)
+        try:
+            vector_store = VectorStoreHandler(index_name=request.target_index)
+            fields = list(source.get_property_types())
+            copied = {
+                document.uuid
+                for document in target.iter_documents(
+                    fields=[], batch_size=request.batch_size
+                )
+            }
+            missing: list[uuid.UUID] = []
+            for document in source.iter_documents(
+                fields=[], batch_size=request.batch_size
+            ):
+                if document.uuid in copied:
+                    copied.discard(document.uuid)
+                else:
+                    missing.append(document.uuid)
+
+            result = ReindexSyncResult()
+            for start in range(0, len(missing), request.batch_size):
+                documents = source.get_documents_by_ids(
+                    missing[start : start + request.batch_size],
+                    fields=fields,
+                    include_vector=not request.reembed,
+                )
+                self.__write_chunks(documents, target, vector_store, request.reembed)
+                result.copied += len(documents)
+                if on_batch:
+                    on_batch(result.copied)
+
+            # The IDs left were deleted from the current collection after they were copied
+            deleted = sorted(copied) if request.delete_missing else []
+            for start in range(0, len(deleted), request.batch_size):
+                result.deleted += target.delete_documents(
+                    deleted[start : start + request.batch_size]
+                )
+            return result
+        finally:
+            source.close()
+            target.close()
+
+    def __write_chunks(
+        self,
+        documents: list[Object],
+        target: DocumentService,
+        vector_store: VectorStoreHandler,
+        reembed: bool,
+    ) -> None:
+        """
+        Write chunks of the current collection to the new one, under their ID.
+
+        Args:
+            documents(list[Object]): The chunks, with their vector unless embedded again.
+            target(DocumentService): The new collection.
+            vector_store(VectorStoreHandler): The vector store of the new collection.
+            reembed(bool): Whether to embed the chunks again instead of copying their vectors.
+        """
+        if documents and reembed:
+            vector_store.from_documents([to_node(document) for document in documents])
+        elif documents:
+            target.insert_documents(
+                (
+                    document.uuid,
+                    document.properties,
+                    document.vector.get("default")
+                    if isinstance(document.vector, dict)
+                    else document.vector,
+                )
+                for document in documents
+            )
+
+    def validate_target(self, request: ReindexValidationRequest) -> int:
+        """
+        Check the new collection can replace the current one.
+
+        Args:
+            request(ReindexValidationRequest): The collections to compare.
+
+        Returns:
+            (int): The number of chunks of the new collection.
+
+        Raises:
+            ValueError: If the new collection is empty or holds too few chunks.
+        """
+        target = DocumentService(index_name=request.target_index)
+        target_count = target.get_document_count(use_cache=False)
+        if target_count == 0:
+            raise ValueError(f"Collection {request.target_index} is empty")
+
+        sample = target.get_documents_after(limit=1, fields=[], include_vector=True)
+        if not sample.objects or not sample.objects[0].vector:
+            raise ValueError(f"Collection {request.target_index} has no vectors")
+
+        source_count = DocumentService(
+            index_name=request.source_index
+        ).get_document_count(use_cache=False)
+        if target_count < source_count * request.min_document_ratio:
+            raise ValueError(
+                f"Collection {request.target_index} holds {target_count} chunks, "
+                f"expected at least {request.min_document_ratio:.0%} of {source_count}"
+            )
+        return target_count
@@ -0,0 +1,364 @@
+"""
+Set of services to export the vector store to a local snapshot and to restore it.
+
+A snapshot is a folder holding:
+    - `documents.parquet`: the ID and properties of every document, one column per property
+    - `vectors.npy`: the float32 vectors, one row per document in the same order
+    - `manifest.json`: the index name, the number of documents, the dimensions and the schema
+"""
+
+import json
+import struct
+import uuid
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import IO, Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, PrivateAttr
+
+from services.documents import DocumentService
+
+SNAPSHOT_FORMAT_VERSION = 1
+DOCUMENTS_FILE = "documents.parquet"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+
+# The vector file header is reserved upfront and rewritten once the number of rows is known
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_NPY_HEADER_SIZE = 128
+
+_ARROW_TYPES: dict[str, pa.DataType] = {
+    "text": pa.string(),
+    "int": pa.int64(),
+    "number": pa.float64(),
+    "boolean": pa.bool_(),
+    "date": pa.timestamp("us", tz="UTC"),
+    "uuid": pa.string(),
+}
+
+
+class SnapshotManifest(BaseModel):
+    """
+    Description of a snapshot.
+
+    Attributes:
+        version(int): The version of the snapshot format.
+        index_name(str): The name of the exported index.
+        count(int): The number of documents.
+        dimensions(int): The dimensions of the vectors.
+        properties(dict[str, str]): The Weaviate data type of every property.
+        created_at(datetime): The time the snapshot was taken.
+    """
+
+    version: int = SNAPSHOT_FORMAT_VERSION
+    index_name: str
+    count: int
+    dimensions: int
+    properties: dict[str, str]
+    created_at: datetime
+
+
+def to_arrow_type(data_type: str) -> pa.DataType:
+    """
+    Get the Arrow type of a Weaviate data type.
+    Array types become lists, and the types without an equivalent are stored as JSON strings.
+
+    Args:
+        data_type(str): The Weaviate data type, e.g. `text` or `int[]`.
+
+    Returns:
+        (pa.DataType): The Arrow type.
+    """
+    if data_type.endswith("[]"):
+        return pa.list_(to_arrow_type(data_type[:-2]))
+    return _ARROW_TYPES.get(data_type, pa.string())
+
+
+def _npy_header(rows: int, dimensions: int) -> bytes:
+    """
+    Build a fixed-size `.npy` header for a float32 matrix.
+
+    Args:
+        rows(int): The number of rows.
+        dimensions(int): The number of columns.
+
+    Returns:
+        (bytes): The header, `_NPY_HEADER_SIZE` bytes long.
+    """
+    header = str(
+        {"descr": "<f4", "fortran_order": False, "shape": (rows, dimensions)}
+    ).encode()
+    padding = _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2 - len(header) - 1
+    return (
+        _NPY_MAGIC
+        + struct.pack("<H", _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2)
+        + (header + b" " * padding + b"\n")
+    )
+
+
+class SnapshotService(BaseModel):
+    """
+    Exports the documents of an index, with their vectors, to a snapshot folder
+    and bulk-imports a snapshot into a fresh collection.
+
+    Attributes:
+        index_name(str): The name of the index to export from or to import into
+    """
+
+    index_name: str
+    __document_service: DocumentService = PrivateAttr()
+
+    def __init__(self, index_name: str = "Documents", **kwargs):
+        """
+        Initializes the snapshot service.
+
+        Args:
+            index_name(str): The name of the index to export from or to import into
+        """
+        super().__init__(index_name=index_name, **kwargs)
+        self.__document_service = DocumentService(index_name=index_name)
+
+    def export_snapshot(self, path: Path, batch_size: int = 1000) -> SnapshotManifest:
+        """
+        Export every document of the index to a snapshot folder.
+        Documents are streamed, so the memory used depends on the batch size only.
+
+        Args:
+            path(Path): The folder to write the snapshot to.
+            batch_size(int): The number of documents fetched and written at once.
+
+        Returns:
+            (SnapshotManifest): The manifest of the snapshot.
+
+        Raises:
+            ValueError: If a document has no vector.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        property_types = self.__document_service.get_property_types()
+        schema = pa.schema(
+            [pa.field("id", pa.string())]
+            + [
+                pa.field(name, to_arrow_type(data_type))
+                for name, data_type in property_types.items()
+            ]
+        )
+        documents = self.__document_service.iter_documents(
+            fields=list(property_types),
+            include_vector=True,
+            batch_size=batch_size,
+        )
+
+        count = 0
+        dimensions = 0
+        with (
+            pq.ParquetWriter(
+                path / DOCUMENTS_FILE, schema, compression="zstd"
+            ) as writer,
+            open(path / VECTORS_FILE, "wb") as vectors_file,
+        ):
+            vectors_file.write(b"\0" * _NPY_HEADER_SIZE)
+            rows: list[dict[str, Any]] = []
+            vectors: list[list[float]] = []
+            for document in documents:
+                vector = document.vector
+                if isinstance(vector, dict):
+                    vector = vector.get("default") or next(iter(vector.values()), None)
+                if not vector:
+                    raise ValueError(f"Document {document.uuid} has no vector")
+
+                rows.append(
+                    {
+                        "id": str(document.uuid),
+                        **{
+                            name: self.__to_column_value(
+                                document.properties.get(name), data_type
+                            )
+                            for name, data_type in property_types.items()
+                        },
+                    }
+                )
+                vectors.append(vector)
+                if len(rows) >= batch_size:
+                    dimensions = self.__write_batch(
+                        writer, schema, vectors_file, rows, vectors
+                    )
+                    count += len(rows)
+                    rows, vectors = [], []
+            if rows:
+                dimensions = self.__write_batch(
+                    writer, schema, vectors_file, rows, vectors
+                )
+                count += len(rows)
+
+            vectors_file.seek(0)
+            vectors_file.write(_npy_header(count, dimensions))
+
+        manifest = SnapshotManifest(
+            index_name=self.index_name,
+            count=count,
+            dimensions=dimensions,
+            properties=property_types,
+            created_at=datetime.now(UTC),
+        )
+        (path / MANIFEST_FILE).write_text(manifest.model_dump_json(indent=2))
+        return manifest
+
+    def import_snapshot(
+        self,
+        path: Path,
+        batch_size: int = 500,
+        concurrent_requests: int = 4,
+    ) -> int:
+        """
+        Import a snapshot into the index, which must not exist yet.
+        The vectors are memory-mapped, so they are not loaded in memory at once.
+
+        Args:
+            path(Path): The folder of the snapshot.
+            batch_size(int): The number of documents sent per request.
+            concurrent_requests(int): The number of requests sent in parallel.
+
+        Returns:
+            (int): The number of imported documents.
+
+        Raises:
+            ValueError: If the snapshot is invalid or the collection already exists.
+        """
+        manifest = read_manifest(path)
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        if vectors.shape != (manifest.count, manifest.dimensions):
+            raise ValueError(
+                f"Expected {manifest.count} vectors of {manifest.dimensions} dimensions, "
+                f"found {vectors.shape}"
+            )
+
+        self.__document_service.create_collection(manifest.properties)
+        return self.__document_service.insert_documents(
+            self.__read_documents(path, vectors, manifest.properties, batch_size),
+            batch_size=batch_size,
+            concurrent_requests=concurrent_requests,
+        )
+
+    def __read_documents(
+        self,
+        path: Path,
+        vectors: np.ndarray,
+        property_types: dict[str, str],
+        batch_size: int,
+    ) -> Iterator[tuple[uuid.UUID, dict[str, Any], list[float]]]:
+        """
+        Read the documents of a snapshot, batch by batch.
+
+        Args:
+            path(Path): The folder of the snapshot.
+            vectors(np.ndarray): The memory-mapped vectors.
+            property_types(dict[str, str]): The Weaviate data type of every property.
+            batch_size(int): The number of rows read at once.
+
+        Returns:
+            (Iterator[tuple[uuid.UUID, dict[str, Any], list[float]]]):
+                The ID, properties and vector of every document.
+        """
+        offset = 0
+        for batch in pq.ParquetFile(path / DOCUMENTS_FILE).iter_batches(batch_size):
+            batch_vectors = vectors[offset : offset + batch.num_rows].tolist()
+            for row, vector in zip(batch.to_pylist(), batch_vectors, strict=True):
+                doc_id = uuid.UUID(row.pop("id"))
+                properties = {
+                    name: self.__from_column_value(value, property_types[name])
+                    for name, value in row.items()
+                    if value is not None
+                }
+                yield doc_id, properties, vector
+            offset += batch.num_rows
+
+    def __write_batch(
+        self,
+        writer: pq.ParquetWriter,
+        schema: pa.Schema,
+        vectors_file: IO[bytes],
+        rows: list[dict[str, Any]],
+        vectors: list[list[float]],
+    ) -> int:
+        """
+        Append a batch of documents to the snapshot files.
+
+        Args:
+            writer(pq.ParquetWriter): The writer of the documents file.
+            schema(pa.Schema): The schema of the documents file.
+            vectors_file(IO[bytes]): The vectors file.
+            rows(list[dict[str, Any]]): The documents.
+            vectors(list[list[float]]): The vectors of the documents.
+
+        Returns:
+            (int): The dimensions of the vectors.
+        """
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        matrix = np.asarray(vectors, dtype="<f4")
+        vectors_file.write(matrix.tobytes())
+        return matrix.shape[1]
+
+    @staticmethod
+    def __to_column_value(value: Any, data_type: str) -> Any:
+        """
+        Convert a property value to its column value.
+
+        Args:
+            value(Any): The property value.
+            data_type(str): The Weaviate data type of the property.
+
+        Returns:
+            (Any): The column value.
+        """
+        if value is None:
+            return None
+        if data_type.startswith("uuid"):
+            return (
+                [str(item) for item in value]
+                if data_type.endswith("[]")
+                else str(value)
+            )
+        if to_arrow_type(data_type) == pa.string() and data_type != "text":
+            return json.dumps(value, default=str)
+        return value
+
+    @staticmethod
+    def __from_column_value(value: Any, data_type: str) -> Any:
+        """
+        Convert a column value back to its property value.
+
+        Args:
+            value(Any): The column value.
+            data_type(str): The Weaviate data type of the property.
+
+        Returns:
+            (Any): The property value.
+        """
+        if data_type.startswith("uuid"):
+            return value
+        if to_arrow_type(data_type) == pa.string() and data_type != "text":
+            return json.loads(value)
+        return value
+
+
+def read_manifest(path: Path) -> SnapshotManifest:
+    """
+    Read the manifest of a snapshot.
+
+    Args:
+        path(Path): The folder of the snapshot.
+
+    Returns:
+        (SnapshotManifest): The manifest.
+
+    Raises:
+        ValueError: If the snapshot format is not supported.
+    """
+    manifest = SnapshotManifest.model_validate_json((path / MANIFEST_FILE).read_text())
+    if manifest.version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.version}")
+    return manifest
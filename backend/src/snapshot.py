@@ -0,0 +1,48 @@
+"""
+Command line tool to export an index to a local snapshot and to restore it into a fresh collection.
+Run it from the src folder:
+
+    python snapshot.py export --index Documents ./data/snapshots/documents
+    python snapshot.py import --index DocumentsRestored ./data/snapshots/documents
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from services.snapshots import SnapshotService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export an index")
+    export_parser.add_argument("path", type=Path)
+    export_parser.add_argument("--index", default="Documents")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+
+    import_parser = subparsers.add_parser("import", help="Import a snapshot")
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--index", default="Documents")
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    import_parser.add_argument("--concurrent-requests", type=int, default=4)
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    snapshot_service = SnapshotService(index_name=args.index)
+    if args.command == "export":
+        manifest = snapshot_service.export_snapshot(args.path, args.batch_size)
+        count = manifest.count
+    else:
+        count = snapshot_service.import_snapshot(
+            args.path, args.batch_size, args.concurrent_requests
+        )
+    elapsed = time.perf_counter() - started_at
+    print(f"{args.command}: {count} documents in {elapsed:.1f}s ({args.index})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,14 @@ Set of tools to manage, validate, and retrieve the application's configuration.
 """
 
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import Field, HttpUrl, SecretStr
 from pydantic_settings import BaseSettings
 
+# The main Azure OpenAI deployment, a cheaper one, or a small model served by Ollama
+LLMTier = Literal["azure_openai", "azure_openai_small", "ollama"]
+
 
 class Environment(BaseSettings):
     """
@@ -18,16 +22,73 @@ class Environment(BaseSettings):
         port: The port of the application
         version: The version of the application
         frontend_host: The hostname of the frontend application
+        preload_modules: Whether to import the heavy modules in the background on startup
+        gzip_minimum_size: The size in bytes from which the responses are compressed
         unstructured_url: The URL of the unstructured API
         unstructured_api_key: The API key for the unstructured API
+        extraction_router_enabled: Whether to parse the text formats in process and pick the PDF strategy
+        native_chunk_tokens: The most tokens of a chunk of the formats parsed in process
+        pdf_split_min_pages: The pages from which a PDF is partitioned by page ranges, 0 to never split
+        pdf_split_pages: The pages of a range of a split PDF
+        pdf_split_concurrency: The page ranges of a PDF partitioned at once
+        pdf_split_max_attempts: The attempts to partition a page range before the file fails
         weaviate_host: The hostname of the Weaviate cluster
         weaviate_port: The port of the Weaviate cluster
         weaviate_grpc_port: The gRPC port of the Weaviate cluster
+        document_count_cache_ttl: The seconds the total number of documents is cached for
+        index_alias_cache_ttl: The seconds the collection an index alias points to is cached for
+        vector_index_type: The Weaviate vector index of the collections
+        vector_quantization: The compression of the vectors in the vector index
+        hnsw_ef_construction: The size of the candidate list when building the HNSW graph
+        hnsw_max_connections: The maximum number of connections per node of the HNSW graph
+        hnsw_ef: The size of the candidate list when searching, -1 to adjust it to the limit
+        pq_training_limit: The number of vectors used to train product quantization
+        dedup_mode: What to do with the near-duplicate chunks found at ingestion
+        dedup_threshold: The estimated Jaccard similarity from which two chunks are near-duplicates
+        dedup_num_perm: The number of MinHash permutations of a chunk signature
+        dedup_bands: The number of locality-sensitive hashing bands of a chunk signature
+        dedup_shingle_size: The number of words of the shingles hashed into a signature
         azure_openai_api_key: The API key for the Azure OpenAI
         azure_openai_endpoint: The endpoint for the Azure OpenAI
         azure_openai_embeddings_model: The model for the Azure OpenAI embeddings
+        embedding_dimensions: The dimensions of the embeddings, the model's if not set
         azure_openai_api_version: The API version for the Azure OpenAI
         azure_openai_llm_model: The model for the Azure OpenAI LLM
+        azure_openai_small_llm_model: The cheaper Azure OpenAI LLM of the `azure_openai_small` tier
+        ollama_base_url: The URL of the Ollama-compatible server of the `ollama` tier
+        ollama_llm_model: The small local model of the `ollama` tier
+        agent_llm_tier: The LLM tier of the agent node, deciding whether to retrieve
+        grade_llm_tier: The LLM tier grading the relevance of the retrieved documents
+        rewrite_llm_tier: The LLM tier rewriting the question when the documents are not relevant
+        answer_llm_tier: The LLM tier writing the answer of the agentic RAG
+        rag_answer_llm_tier: The LLM tier writing the answer of the simple RAG
+        llm_prices: The USD prices of a million input and output tokens, by model
+        embedding_backend: The embedder of the chunks and queries, `azure_openai` or `local`
+        local_embedding_model: The Hugging Face repository of the local embedding model
+        local_embedding_model_path: The folder of the local embedding model, to use it offline
+        local_embedding_pooling: The pooling of the token states of the local embedding model
+        local_embedding_threads: The CPU threads of the local embedding model, 0 for all cores
+        local_embedding_batch_size: The texts embedded at once by the local embedding model
+        local_embedding_max_wait: The seconds a local embedding waits for concurrent ones
+        local_embedding_max_length: The tokens of a text beyond which the local model truncates it
+        rate_limit_enabled: Whether to pace the calls to Azure OpenAI with the client-side rate limiter
+        rate_limit_llm_rpm: The requests per minute allowed on the LLM deployment
+        rate_limit_llm_tpm: The tokens per minute allowed on the LLM deployment
+        rate_limit_embeddings_rpm: The requests per minute allowed on the embeddings deployment
+        rate_limit_embeddings_tpm: The tokens per minute allowed on the embeddings deployment
+        rate_limit_max_concurrency: The most concurrent calls per deployment, lowered on throttling
+        rate_limit_state_path: The file sharing the rate limits between processes, per process if empty
+        llm_timeout: The seconds a call to the Azure OpenAI LLM may take
+        ollama_timeout: The seconds a call to the Ollama LLM may take
+        embeddings_timeout: The seconds a call to the Azure OpenAI embeddings may take
+        weaviate_timeout: The seconds a Weaviate query may take
+        unstructured_timeout: The seconds the extraction of a file by Unstructured may take
+        storage_timeout: The seconds a call to the blob storage may take
+        hedging_enabled: Whether to send a duplicate of the slow idempotent calls
+        hedge_percentile: The percentile of the recent latencies after which a duplicate is sent
+        hedge_min_delay: The fewest seconds before a duplicate is sent
+        breaker_failure_threshold: The consecutive failures after which a dependency fails fast
+        breaker_reset_timeout: The seconds a dependency fails fast before a trial call
         openai_api_key: The API key for the OpenAI
         openai_embeddings_model: The model for the OpenAI embeddings
         openai_llm_model: The model for the OpenAI LLM
@@ -38,6 +99,28 @@ class Environment(BaseSettings):
         temporal_host: The hostname of the Temporal server
         temporal_namespace: The namespace of the Temporal server
         temporal_queue: The queue of the Temporal server
+        temporal_compression_threshold: The size in bytes from which the Temporal payloads are compressed
+        temporal_fast_queue: The queue of the small files ingestion lane
+        temporal_heavy_queue: The queue of the large or scanned files ingestion lane
+        fast_lane_max_bytes: The largest file in bytes ingested in the fast lane
+        fast_lane_max_pages: The largest PDF in pages ingested in the fast lane
+        fast_lane_concurrency: The number of files a worker ingests at once in the fast lane
+        heavy_lane_concurrency: The number of files a worker ingests at once in the heavy lane
+        queue_depth_interval: The seconds between two reports of the ingestion lanes depth
+        spool_max_memory_bytes: The largest blob in bytes extracted from memory, 0 to never spool to disk
+        spool_path: The directory of the temporary files of the ingestions, the system one if empty
+        resource_report_interval: The seconds between two reports of the worker memory and disk usage
+        worker_metrics_port: The port where the worker exposes its Prometheus metrics
+        tracing_exporter: The exporter used for the traces
+        tracing_file_path: The file where the spans are written when using the file exporter
+        tracing_otlp_endpoint: The OTLP/HTTP endpoint where the spans are sent
+        query_log_enabled: Whether to capture the query requests into the query log
+        query_log_path: The JSONL file where the query requests are captured
+        profiling_enabled: Whether the requests may ask to be profiled
+        profiling_path: The directory where the profiles of the requests are saved
+        conversation_db_path: The SQLite file where the agentic conversations are checkpointed
+        conversation_ttl: The seconds after which an unused conversation is deleted
+        conversation_max_tokens: The tokens of conversation history given to the agent
     """
 
     # App settings
@@ -49,17 +132,110 @@ class Environment(BaseSettings):
         description="The hostname of the frontend application",
         default="http://localhost:3000",
     )
+    preload_modules: bool = Field(
+        description="Whether to import the heavy modules in the background on startup",
+        default=True,
+    )
+    gzip_minimum_size: int = Field(
+        description="The size in bytes from which the responses are compressed",
+        default=1024,
+    )
 
     # Unstructured settings
     unstructured_url: HttpUrl = Field(description="The URL of the unstructured API")
     unstructured_api_key: SecretStr = Field(
         description="The API key for the unstructured API"
     )
+    extraction_router_enabled: bool = Field(
+        description="Whether to parse the text formats in process and pick the PDF strategy",
+        default=True,
+    )
+    native_chunk_tokens: int = Field(
+        description="The most tokens of a chunk of the formats parsed in process",
+        default=256,
+        ge=16,
+    )
+    pdf_split_min_pages: int = Field(
+        description="The pages from which a PDF is partitioned by page ranges, 0 to never split",
+        default=50,
+        ge=0,
+    )
+    pdf_split_pages: int = Field(
+        description="The pages of a range of a split PDF",
+        default=20,
+        ge=1,
+    )
+    pdf_split_concurrency: int = Field(
+        description="The page ranges of a PDF partitioned at once",
+        default=4,
+        ge=1,
+    )
+    pdf_split_max_attempts: int = Field(
+        description="The attempts to partition a page range before the file fails",
+        default=3,
+        ge=1,
+    )
 
     # Weaviate settings
     weaviate_host: str = Field(description="The hostname of the Weaviate cluster")
     weaviate_port: int = Field(description="The port of the Weaviate cluster")
     weaviate_grpc_port: int = Field(description="The gRPC port of the Weaviate cluster")
+    document_count_cache_ttl: int = Field(
+        description="The seconds the total number of documents is cached for",
+        default=60,
+    )
+    index_alias_cache_ttl: int = Field(
+        description="The seconds the collection an index alias points to is cached for",
+        default=10,
+    )
+    vector_index_type: Literal["hnsw", "flat", "dynamic"] = Field(
+        description="The Weaviate vector index of the collections",
+        default="hnsw",
+    )
+    vector_quantization: Literal["none", "pq", "bq", "sq"] = Field(
+        description="The compression of the vectors in the vector index",
+        default="none",
+    )
+    hnsw_ef_construction: int = Field(
+        description="The size of the candidate list when building the HNSW graph",
+        default=128,
+    )
+    hnsw_max_connections: int = Field(
+        description="The maximum number of connections per node of the HNSW graph",
+        default=32,
+    )
+    hnsw_ef: int = Field(
+        description="The size of the candidate list when searching, -1 to adjust it to the limit",
+        default=-1,
+    )
+    pq_training_limit: int = Field(
+        description="The number of vectors used to train product quantization",
+        default=100000,
+    )
+
+    # Deduplication settings
+    dedup_mode: Literal["off", "drop", "link"] = Field(
+        description="What to do with the near-duplicate chunks found at ingestion",
+        default="link",
+    )
+    dedup_threshold: float = Field(
+        description="The estimated Jaccard similarity from which two chunks are near-duplicates",
+        default=0.9,
+        ge=0,
+        le=1,
+    )
+    dedup_num_perm: int = Field(
+        description="The number of MinHash permutations of a chunk signature",
+        default=128,
+    )
+    dedup_bands: int = Field(
+        description="The number of locality-sensitive hashing bands of a chunk signature",
+        default=16,
+    )
+    dedup_shingle_size: int = Field(
+        description="The number of words of the shingles hashed into a signature",
+        default=3,
+    )
 
     # Azure OpenAI Settings
     azure_openai_api_key: SecretStr = Field(
@@ -71,6 +247,10 @@ class Environment(BaseSettings):
     azure_openai_embeddings_model: str = Field(
         description="The model for the Azure OpenAI embeddings"
     )
+    embedding_dimensions: int | None = Field(
+        description="The dimensions of the embeddings, the model's if not set",
+        default=None,
+    )
     azure_openai_api_version: str = Field(
         description="The API version for the Azure OpenAI", default="2024-10-21"
     )
@@ -78,6 +258,160 @@ class Environment(BaseSettings):
         description="The model for the Azure OpenAI LLM"
     )
 
+    # Model tiering settings
+    azure_openai_small_llm_model: str = Field(
+        description="The cheaper Azure OpenAI LLM of the `azure_openai_small` tier",
+        default="gpt-4o-mini",
+    )
+    ollama_base_url: str = Field(
+        description="The URL of the Ollama-compatible server of the `ollama` tier",
+        default="http://localhost:11434",
+    )
+    ollama_llm_model: str = Field(
+        description="The small local model of the `ollama` tier",
+        default="qwen2.5:3b",
+    )
+    agent_llm_tier: LLMTier = Field(
+        description="The LLM tier of the agent node, deciding whether to retrieve",
+        default="azure_openai",
+    )
+    grade_llm_tier: LLMTier = Field(
+        description="The LLM tier grading the relevance of the retrieved documents",
+        default="azure_openai",
+    )
+    rewrite_llm_tier: LLMTier = Field(
+        description="The LLM tier rewriting the question when the documents are not relevant",
+        default="azure_openai",
+    )
+    answer_llm_tier: LLMTier = Field(
+        description="The LLM tier writing the answer of the agentic RAG",
+        default="azure_openai",
+    )
+    rag_answer_llm_tier: LLMTier = Field(
+        description="The LLM tier writing the answer of the simple RAG",
+        default="azure_openai",
+    )
+    llm_prices: dict[str, tuple[float, float]] = Field(
+        description="The USD prices of a million input and output tokens, by model",
+        default={"gpt-4o": (2.5, 10.0), "gpt-4o-mini": (0.15, 0.6)},
+    )
+
+    # Local embedding settings
+    embedding_backend: Literal["azure_openai", "local"] = Field(
+        description="The embedder of the chunks and queries, `azure_openai` or `local`",
+        default="azure_openai",
+    )
+    local_embedding_model: str = Field(
+        description="The Hugging Face repository of the local embedding model",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+    )
+    local_embedding_model_path: str = Field(
+        description="The folder of the local embedding model, to use it offline",
+        default="",
+    )
+    local_embedding_pooling: Literal["mean", "cls"] = Field(
+        description="The pooling of the token states of the local embedding model",
+        default="mean",
+    )
+    local_embedding_threads: int = Field(
+        description="The CPU threads of the local embedding model, 0 for all cores",
+        default=0,
+        ge=0,
+    )
+    local_embedding_batch_size: int = Field(
+        description="The texts embedded at once by the local embedding model",
+        default=32,
+        ge=1,
+    )
+    local_embedding_max_wait: float = Field(
+        description="The seconds a local embedding waits for concurrent ones",
+        default=0.0,
+        ge=0.0,
+    )
+    local_embedding_max_length: int = Field(
+        description="The tokens of a text beyond which the local model truncates it",
+        default=256,
+        ge=1,
+    )
+
+    # Azure OpenAI rate limiting settings
+    rate_limit_enabled: bool = Field(
+        description="Whether to pace the calls to Azure OpenAI with the client-side rate limiter",
+        default=False,
+    )
+    rate_limit_llm_rpm: int = Field(
+        description="The requests per minute allowed on the LLM deployment",
+        default=300,
+    )
+    rate_limit_llm_tpm: int = Field(
+        description="The tokens per minute allowed on the LLM deployment",
+        default=50_000,
+    )
+    rate_limit_embeddings_rpm: int = Field(
+        description="The requests per minute allowed on the embeddings deployment",
+        default=1440,
+    )
+    rate_limit_embeddings_tpm: int = Field(
+        description="The tokens per minute allowed on the embeddings deployment",
+        default=240_000,
+    )
+    rate_limit_max_concurrency: int = Field(
+        description="The most concurrent calls per deployment, lowered on throttling",
+        default=32,
+    )
+    rate_limit_state_path: str = Field(
+        description="The file sharing the rate limits between processes, per process if empty",
+        default="",
+    )
+
+    # Resilience settings
+    llm_timeout: float = Field(
+        description="The seconds a call to the Azure OpenAI LLM may take",
+        default=60.0,
+    )
+    ollama_timeout: float = Field(
+        description="The seconds a call to the Ollama LLM may take",
+        default=60.0,
+    )
+    embeddings_timeout: float = Field(
+        description="The seconds a call to the Azure OpenAI embeddings may take",
+        default=10.0,
+    )
+    weaviate_timeout: float = Field(
+        description="The seconds a Weaviate query may take",
+        default=10.0,
+    )
+    unstructured_timeout: float = Field(
+        description="The seconds the extraction of a file by Unstructured may take",
+        default=600.0,
+    )
+    storage_timeout: float = Field(
+        description="The seconds a call to the blob storage may take",
+        default=60.0,
+    )
+    hedging_enabled: bool = Field(
+        description="Whether to send a duplicate of the slow idempotent calls",
+        default=True,
+    )
+    hedge_percentile: float = Field(
+        description="The percentile of the recent latencies after which a duplicate is sent",
+        default=95.0,
+        ge=50.0,
+        le=100.0,
+    )
+    hedge_min_delay: float = Field(
+        description="The fewest seconds before a duplicate is sent",
+        default=0.05,
+    )
+    breaker_failure_threshold: int = Field(
+        description="The consecutive failures after which a dependency fails fast",
+        default=5,
+    )
+    breaker_reset_timeout: float = Field(
+        description="The seconds a dependency fails fast before a trial call",
+        default=30.0,
+    )
+
     # OpenAI Settings
     openai_api_key: SecretStr = Field(description="The API key for the OpenAI")
     openai_embeddings_model: str = Field(
@@ -101,6 +435,105 @@ class Environment(BaseSettings):
     temporal_host: str = Field(description="The hostname of the Temporal server")
     temporal_namespace: str = Field(description="The namespace of the Temporal server")
     temporal_queue: str = Field(description="The queue of the Temporal server")
+    temporal_compression_threshold: int = Field(
+        description="The size in bytes from which the Temporal payloads are compressed",
+        default=4096,
+    )
+    temporal_fast_queue: str = Field(
+        description="The queue of the small files ingestion lane",
+        default="file-embeddings-fast",
+    )
+    temporal_heavy_queue: str = Field(
+        description="The queue of the large or scanned files ingestion lane",
+        default="file-embeddings-heavy",
+    )
+    fast_lane_max_bytes: int = Field(
+        description="The largest file in bytes ingested in the fast lane",
+        default=5_000_000,
+    )
+    fast_lane_max_pages: int = Field(
+        description="The largest PDF in pages ingested in the fast lane",
+        default=20,
+    )
+    fast_lane_concurrency: int = Field(
+        description="The number of files a worker ingests at once in the fast lane",
+        default=32,
+    )
+    heavy_lane_concurrency: int = Field(
+        description="The number of files a worker ingests at once in the heavy lane",
+        default=4,
+    )
+    queue_depth_interval: float = Field(
+        description="The seconds between two reports of the ingestion lanes depth",
+        default=15.0,
+    )
+    spool_max_memory_bytes: int = Field(
+        description="The largest blob in bytes extracted from memory, 0 to never spool to disk",
+        default=16_000_000,
+        ge=0,
+    )
+    spool_path: str = Field(
+        description="The directory of the temporary files of the ingestions, the system one if empty",
+        default="",
+    )
+    resource_report_interval: float = Field(
+        description="The seconds between two reports of the worker memory and disk usage",
+        default=15.0,
+    )
+
+    # Metrics settings
+    worker_metrics_port: int = Field(
+        description="The port where the worker exposes its Prometheus metrics",
+        default=9100,
+    )
+
+    # Tracing settings
+    tracing_exporter: Literal["none", "console", "file", "otlp"] = Field(
+        description="The exporter used for the traces",
+        default="none",
+    )
+    tracing_file_path: str = Field(
+        description="The file where the spans are written when using the file exporter",
+        default="./data/traces/spans.jsonl",
+    )
+    tracing_otlp_endpoint: str = Field(
+        description="The OTLP/HTTP endpoint where the spans are sent",
+        default="http://localhost:4318/v1/traces",
+    )
+
+    # Query log settings
+    query_log_enabled: bool = Field(
+        description="Whether to capture the query requests into the query log",
+        default=False,
+    )
+    query_log_path: str = Field(
+        description="The JSONL file where the query requests are captured",
+        default="./data/query_logs/queries.jsonl",
+    )
+
+    # Profiling settings
+    profiling_enabled: bool = Field(
+        description="Whether the requests may ask to be profiled",
+        default=False,
+    )
+    profiling_path: str = Field(
+        description="The directory where the profiles of the requests are saved",
+        default="./data/profiles",
+    )
+
+    # Conversation settings
+    conversation_db_path: str = Field(
+        description="The SQLite file where the agentic conversations are checkpointed",
+        default="./data/conversations/checkpoints.sqlite",
+    )
+    conversation_ttl: float = Field(
+        description="The seconds after which an unused conversation is deleted",
+        default=86400.0,
+    )
+    conversation_max_tokens: int = Field(
+        description="The tokens of conversation history given to the agent",
+        default=16000,
+    )
 
 
 @lru_cache
@@ -0,0 +1,123 @@
+"""
+LangChain callback handler recording the Prometheus metrics of the LLM calls. It is kept apart
+from `utils/metrics.py`, so recording the other metrics does not import LangChain.
+"""
+
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utils.metrics import LLM_CALL_SECONDS, LLM_COST_USD, LLM_TOKENS
+
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that records the latency, token usage and cost of every LLM call.
+
+    Attributes:
+        model(str): The model name used as metric label.
+        node(str): The node of the RAG pipelines making the calls, used as metric label.
+        prices(tuple[float, float] | None): The USD prices of a million input and output
+            tokens of the model, None if it is free, e.g. served locally.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        node: str = "unknown",
+        prices: tuple[float, float] | None = None,
+    ):
+        """
+        Initializes the callback handler.
+
+        Args:
+            model(str): The model name used as metric label.
+            node(str): The node making the calls, used as metric label.
+            prices(tuple[float, float] | None): The USD prices of a million input and
+                output tokens of the model.
+        """
+        self.model = model
+        self.node = node
+        self.prices = prices
+        self.__started_at: dict[UUID, float] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[Any]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self.__started_at[run_id] = time.perf_counter()
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self.__started_at[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self.__observe(run_id, "success")
+        prompt_tokens, completion_tokens = get_token_usage(response)
+        for kind, tokens in (
+            ("prompt_tokens", prompt_tokens),
+            ("completion_tokens", completion_tokens),
+        ):
+            if tokens is not None:
+                LLM_TOKENS.labels(node=self.node, model=self.model, kind=kind).observe(
+                    tokens
+                )
+        if self.prices is not None:
+            input_price, output_price = self.prices
+            LLM_COST_USD.labels(node=self.node, model=self.model).inc(
+                (
+                    (prompt_tokens or 0) * input_price
+                    + (completion_tokens or 0) * output_price
+                )
+                / 1_000_000
+            )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self.__observe(run_id, "error")
+
+    def __observe(self, run_id: UUID, status: str) -> None:
+        started_at = self.__started_at.pop(run_id, None)
+        if started_at is None:
+            return
+        LLM_CALL_SECONDS.labels(
+            node=self.node, model=self.model, status=status
+        ).observe(time.perf_counter() - started_at)
+
+
+def get_token_usage(response: LLMResult) -> tuple[int | None, int | None]:
+    """
+    Get the tokens of an LLM call, reported by OpenAI in the output of the call and by the
+    other providers, e.g. Ollama, in the usage metadata of the message.
+
+    Args:
+        response(LLMResult): The result of the call.
+
+    Returns:
+        (tuple[int | None, int | None]): The prompt and completion tokens, None if unknown.
+    """
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage:
+        return token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    return None, None
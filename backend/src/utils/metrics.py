@@ -0,0 +1,210 @@
+"""
+Set of Prometheus metrics to measure the latency of each stage of the application.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+    600.0,
+)
+
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+QUERY_EMBEDDING_SECONDS = Histogram(
+    "rag_query_embedding_seconds",
+    "Time spent embedding a user query",
+    buckets=LATENCY_BUCKETS,
+)
+
+RETRIEVAL_SECONDS = Histogram(
+    "rag_retrieval_seconds",
+    "Time spent retrieving documents from the vector store",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "rag_llm_call_seconds",
+    "Time spent on a single LLM call, by node of the RAG pipelines",
+    ["node", "model", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_TOKENS = Histogram(
+    "rag_llm_tokens",
+    "Tokens used by a single LLM call, by node of the RAG pipelines",
+    ["node", "model", "kind"],
+    buckets=TOKEN_BUCKETS,
+)
+
+LLM_COST_USD = Counter(
+    "rag_llm_cost_usd",
+    "Estimated cost in US dollars of the LLM calls, from their tokens and the model prices",
+    ["node", "model"],
+)
+
+GRAPH_NODE_SECONDS = Histogram(
+    "rag_graph_node_seconds",
+    "Time spent on each node of the agentic RAG graph",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+
+INGESTION_STAGE_SECONDS = Histogram(
+    "rag_ingestion_stage_seconds",
+    "Time spent on each stage of the file ingestion",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+QUERY_ROUTES = Counter(
+    "rag_query_routes",
+    "Number of queries sent to each retrieval mode by the query router",
+    ["mode", "reason"],
+)
+
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests",
+    "Number of cache lookups",
+    ["cache", "result"],
+)
+
+DEDUP_CHUNKS = Counter(
+    "rag_dedup_chunks",
+    "Number of ingested chunks by outcome of the near-duplicate detection",
+    ["outcome"],
+)
+
+INGESTION_JOBS = Counter(
+    "rag_ingestion_jobs",
+    "Number of uploaded files by ingestion lane and reason of the classification",
+    ["lane", "reason"],
+)
+
+INGESTION_QUEUE_DEPTH = Gauge(
+    "rag_ingestion_queue_depth",
+    "Number of ingestions pending or running in each lane",
+    ["lane"],
+)
+
+SPOOLED_BYTES = Gauge(
+    "rag_spooled_bytes",
+    "Bytes of the blobs being extracted, held in memory or spooled to temporary files",
+    ["location"],
+)
+
+SPOOLED_PEAK_BYTES = Gauge(
+    "rag_spooled_peak_bytes",
+    "Most bytes of blobs held at once in memory or in temporary files since the start",
+    ["location"],
+)
+
+WORKER_MEMORY_PEAK_BYTES = Gauge(
+    "rag_worker_memory_peak_bytes",
+    "Peak resident memory of the worker process",
+)
+
+WORKER_DISK_USAGE_RATIO = Gauge(
+    "rag_worker_disk_usage_ratio",
+    "Used fraction of the disk holding the temporary files of the worker",
+)
+
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "rag_rate_limit_wait_seconds",
+    "Time a call to Azure OpenAI waited for the client-side rate limiter",
+    ["deployment", "priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+RATE_LIMIT_THROTTLES = Counter(
+    "rag_rate_limit_throttles",
+    "Number of calls to Azure OpenAI throttled by the service",
+    ["deployment"],
+)
+
+RATE_LIMIT_CONCURRENCY = Gauge(
+    "rag_rate_limit_concurrency",
+    "Concurrent calls allowed per Azure OpenAI deployment by the adaptive limiter",
+    ["deployment"],
+)
+
+HEDGED_REQUESTS = Counter(
+    "rag_hedged_requests",
+    "Number of duplicate requests sent to a slow dependency, and of those answering first",
+    ["dependency", "outcome"],
+)
+
+DEPENDENCY_TIMEOUTS = Counter(
+    "rag_dependency_timeouts",
+    "Number of calls to a dependency abandoned at their timeout",
+    ["dependency"],
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "rag_circuit_breaker_state",
+    "State of the circuit breaker of a dependency: 0 closed, 1 half-open, 2 open",
+    ["dependency"],
+)
+
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "rag_circuit_breaker_transitions",
+    "Number of state changes of the circuit breaker of a dependency",
+    ["dependency", "state"],
+)
+
+CIRCUIT_BREAKER_REJECTIONS = Counter(
+    "rag_circuit_breaker_rejections",
+    "Number of calls failed fast by the open circuit breaker of a dependency",
+    ["dependency"],
+)
+
+EXTRACTION_ROUTES = Counter(
+    "rag_extraction_routes",
+    "Number of extracted files by extractor, Unstructured strategy and reason of the choice",
+    ["extractor", "strategy", "reason"],
+)
+
+EXTRACTION_SECONDS = Histogram(
+    "rag_extraction_seconds",
+    "Time spent extracting and chunking a file, by extractor and reason of the choice",
+    ["extractor", "strategy", "reason"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PDF_SEGMENTS = Counter(
+    "rag_pdf_segments",
+    "Number of page ranges of the split PDFs partitioned by Unstructured, by outcome",
+    ["outcome"],
+)
+
+RETRIES = Counter(
+    "rag_retries",
+    "Number of retried operations",
+    ["operation"],
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """
+    Record a cache lookup.
+
+    Args:
+        cache(str): The name of the cache.
+        hit(bool): Whether the lookup was a hit.
+    """
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
@@ -0,0 +1,211 @@
+"""
+Set of tools to profile single requests on demand with cProfile.
+A profiled query sends the `X-Profile: 1` header, a profiled ingestion is started with the
+`profile` flag of its workflow. The profile of every thread working for the request, the
+request thread and the threads calling the dependencies, is saved to one `.prof` file named
+after the request ID, readable by `pstats`, snakeviz or `profiles.py`.
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import logging
+import pstats
+import re
+import threading
+import uuid
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, ParamSpec, TypeVar
+
+from utils.config import get_config
+
+if TYPE_CHECKING:
+    from fastapi import Request, Response
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-ID"
+REQUEST_ID_HEADER = "X-Request-ID"
+PROFILED_PATH_PREFIX = "/v1/query/"
+
+_UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+
+_session: contextvars.ContextVar["ProfileSession | None"] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+
+def is_profile_requested(value: str | None) -> bool:
+    """
+    Whether the value of the `X-Profile` header asks for a profile.
+
+    Args:
+        value(str | None): The value of the header.
+
+    Returns:
+        (bool): True for `1`, `true`, `yes` or `on`.
+    """
+    return (value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+class ProfileSession:
+    """
+    Profiles of the threads working for one request, merged into one file when saved.
+
+    Attributes:
+        name(str): The profiled operation, e.g. `v1_query_simple` or `embed_file`.
+        request_id(str): The ID of the request, in the name of the file.
+    """
+
+    def __init__(self, name: str, request_id: str):
+        self.name = name
+        self.request_id = _UNSAFE_CHARACTERS.sub("_", request_id)[:128]
+        self.__profiles: list[cProfile.Profile] = []
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def profile_thread(self) -> Iterator[None]:
+        """
+        Profile the current thread until the end of the block.
+        A thread already profiled, e.g. by a concurrent profiled request on the event
+        loop, is left out.
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self.__lock:
+                self.__profiles.append(profiler)
+
+    def save(self, directory: Path) -> Path | None:
+        """
+        Merge the profiles of the threads and write them to the directory.
+
+        Args:
+            directory(Path): The directory of the profiles.
+
+        Returns:
+            (Path | None): The written file, None if no thread was profiled.
+        """
+        with self.__lock:
+            profiles = list(self.__profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        directory.mkdir(parents=True, exist_ok=True)
+        file_path = directory / f"{self.name}-{self.request_id}.prof"
+        stats.dump_stats(file_path)
+        return file_path
+
+
+def save_profile(session: ProfileSession) -> Path | None:
+    """
+    Save the profile of a request to the `PROFILING_PATH` directory.
+
+    Args:
+        session(ProfileSession): The session of the request.
+
+    Returns:
+        (Path | None): The written file, None if no thread was profiled.
+    """
+    file_path = session.save(Path(get_config().profiling_path))
+    if file_path is not None:
+        logger.info("Saved the profile of %s to %s", session.request_id, file_path)
+    return file_path
+
+
+@contextmanager
+def profile(name: str, request_id: str, save: bool = True) -> Iterator[ProfileSession]:
+    """
+    Profile the current thread, and the dependency calls it makes, then save the profile
+    to the `PROFILING_PATH` directory.
+
+    Args:
+        name(str): The profiled operation.
+        request_id(str): The ID of the request.
+        save(bool): Whether to save the profile at the end of the block. On the event loop,
+            the caller saves it in a thread with `save_profile` instead.
+
+    Returns:
+        (Iterator[ProfileSession]): The session of the request.
+    """
+    session = ProfileSession(name, request_id)
+    token = _session.set(session)
+    try:
+        with session.profile_thread():
+            yield session
+    finally:
+        _session.reset(token)
+        if save:
+            save_profile(session)
+
+
+def run_profiled(function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """
+    Run a function, profiled when it works for a profiled request.
+    To call in another thread within the context of the request.
+
+    Args:
+        function(Callable[P, T]): The function.
+
+    Returns:
+        (T): The result of the function.
+    """
+    session = _session.get()
+    if session is None:
+        return function(*args, **kwargs)
+    with session.profile_thread():
+        return function(*args, **kwargs)
+
+
+def profiling_middleware() -> Callable[
+    ["Request", Callable[["Request"], Awaitable["Response"]]], Awaitable["Response"]
+]:
+    """
+    Generate an HTTP middleware that profiles the query requests sending `X-Profile: 1`.
+    The profile is named after the `X-Request-ID` header, or a generated ID, returned in the
+    `X-Profile-ID` header of the response. The event loop is profiled as a whole while the
+    request runs, so the concurrent requests may appear in the profile. The profile is saved
+    in a thread once the response is ready.
+
+    Returns:
+        The middleware to register with `app.middleware("http")`.
+    """
+
+    async def profile_queries(
+        request: "Request",
+        call_next: Callable[["Request"], Awaitable["Response"]],
+    ) -> "Response":
+        if not request.url.path.startswith(
+            PROFILED_PATH_PREFIX
+        ) or not is_profile_requested(request.headers.get(PROFILE_HEADER)):
+            return await call_next(request)
+
+        name = request.url.path.strip("/").replace("/", "_")
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        session = None
+        try:
+            with profile(name, request_id, save=False) as session:
+                response = await call_next(request)
+                response.headers[PROFILE_ID_HEADER] = session.request_id
+        finally:
+            # Merging and writing the profiles is blocking work, kept off the event loop
+            if session is not None:
+                await asyncio.to_thread(save_profile, session)
+        return response
+
+    return profile_queries
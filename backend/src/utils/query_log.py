@@ -0,0 +1,183 @@
+"""
+Set of tools to capture the query traffic of the API into an anonymized JSONL log, for later replay.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import IO, Any
+
+from fastapi import Request, Response
+
+from utils.config import get_config
+
+QUERY_LOG_PATH_PREFIX = "/v1/query/"
+
+_REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<phone>"),
+    (re.compile(r"\b\d{4,}\b"), "<number>"),
+]
+
+# The filters whose values are not personal, and that the redactions would make invalid
+_VERBATIM_FILTERS = {"file_types", "uploaded_after", "uploaded_before"}
+
+
+def anonymize(text: str) -> str:
+    """
+    Redact the personal data (emails, URLs, phone numbers and long numbers) of a text.
+
+    Args:
+        text(str): The text to anonymize.
+
+    Returns:
+        (str): The anonymized text.
+    """
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def anonymize_body(body: dict[str, Any]) -> dict[str, Any]:
+    """
+    Anonymize the JSON body of a query request, keeping what a replay needs to send it again.
+    The texts are redacted, except the MIME types and upload times of the filters, and the
+    conversation is hashed, so the turns of a conversation keep the same thread.
+
+    Args:
+        body(dict[str, Any]): The JSON body of the request.
+
+    Returns:
+        (dict[str, Any]): The anonymized body.
+    """
+    anonymized: dict[str, Any] = {}
+    for key, value in body.items():
+        if key == "thread_id" and isinstance(value, str):
+            anonymized[key] = hashlib.sha256(value.encode()).hexdigest()[:32]
+        elif key == "filters" and isinstance(value, dict):
+            anonymized[key] = {
+                name: condition
+                if name in _VERBATIM_FILTERS
+                else _anonymize_value(condition)
+                for name, condition in value.items()
+            }
+        else:
+            anonymized[key] = _anonymize_value(value)
+    return anonymized
+
+
+def _anonymize_value(value: Any) -> Any:
+    """
+    Redact the personal data of every text in a JSON value.
+
+    Args:
+        value(Any): The JSON value.
+
+    Returns:
+        (Any): The value with its texts anonymized.
+    """
+    if isinstance(value, str):
+        return anonymize(value)
+    if isinstance(value, list):
+        return [_anonymize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _anonymize_value(item) for key, item in value.items()}
+    return value
+
+
+class QueryLogger:
+    """
+    Appends one JSON line per query request to the query log.
+    """
+
+    def __init__(self, file_path: Path):
+        """
+        Initializes the query logger.
+
+        Args:
+            file_path(Path): The JSONL file to append the entries to.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.__file: IO[str] = open(file_path, "a", buffering=1)
+        self.__lock = threading.Lock()
+
+    def log(self, entry: dict) -> None:
+        """
+        Append an entry to the log.
+
+        Args:
+            entry(dict): The entry to log.
+        """
+        line = json.dumps(entry, separators=(",", ":"))
+        with self.__lock:
+            self.__file.write(line + "\n")
+
+
+def query_log_middleware(
+    logger: QueryLogger,
+) -> Callable[[Request, Callable[[Request], Awaitable[Response]]], Awaitable[Response]]:
+    """
+    Generate an HTTP middleware that logs every query request with its query string,
+    its anonymized body and its timing.
+
+    Args:
+        logger(QueryLogger): The logger to write the entries to.
+
+    Returns:
+        The middleware to register with `app.middleware("http")`.
+    """
+
+    async def log_queries(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+        if not request.url.path.startswith(QUERY_LOG_PATH_PREFIX):
+            return await call_next(request)
+
+        body = await request.body()
+        started_at = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+            client = request.client.host if request.client else ""
+            logger.log(
+                {
+                    "timestamp": datetime.now(UTC).isoformat(),
+                    "method": request.method,
+                    "path": request.url.path,
+                    "params": dict(request.query_params),
+                    "body": anonymize_body(payload)
+                    if isinstance(payload, dict)
+                    else None,
+                    "client": hashlib.sha256(client.encode()).hexdigest()[:12],
+                    "status_code": status_code,
+                    "duration_ms": round((time.perf_counter() - started_at) * 1000, 3),
+                }
+            )
+
+    return log_queries
+
+
+def get_query_logger() -> QueryLogger | None:
+    """
+    Get the query logger if the capture is enabled in the configuration.
+
+    Returns:
+        (QueryLogger | None): The query logger, or None when the capture is disabled.
+    """
+    if not get_config().query_log_enabled:
+        return None
+    return QueryLogger(Path(get_config().query_log_path))
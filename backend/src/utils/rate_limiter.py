@@ -0,0 +1,508 @@
+"""
+Set of tools to pace the calls to Azure OpenAI on the client side, so the query traffic and
+the ingestion do not trigger 429 storms and retry amplification on their shared deployments.
+
+Every deployment has a token bucket of requests and one of tokens, refilled at the configured
+per-minute limits, and an adaptive concurrency limit: increased by one every `limit` successful
+calls, halved on every throttling response (AIMD). Waiting calls are served by priority, and
+the bulk ones leave a share of the buckets unused, so the interactive queries go ahead of the
+bulk embeddings.
+
+The limiter sits in the HTTP transport of the OpenAI clients, so it also paces their retries.
+The buckets live in memory, or in a file shared by the processes of the host when
+`rate_limit_state_path` is set.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+from openai import DefaultHttpxClient
+
+from utils.config import get_config
+from utils.metrics import (
+    RATE_LIMIT_CONCURRENCY,
+    RATE_LIMIT_THROTTLES,
+    RATE_LIMIT_WAIT_SECONDS,
+)
+from utils.types import RequestPriority
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES: dict[RequestPriority, int] = {"interactive": 0, "bulk": 1}
+
+# Share of the buckets each priority leaves to the higher ones, so an interactive call
+# arriving while the bulk calls drain the buckets does not wait for the next refill
+RESERVES: dict[RequestPriority, float] = {"interactive": 0.0, "bulk": 0.1}
+
+# Azure OpenAI enforces the per-minute limits over windows of a few seconds,
+# so the buckets only hold the allowance of that long
+BURST_SECONDS = 10.0
+
+# Rough number of characters per token of the request bodies
+CHARS_PER_TOKEN = 4
+
+# Tokens counted for a completion when the request does not set `max_tokens`
+DEFAULT_COMPLETION_TOKENS = 256
+
+# Pause after a throttling response without `retry-after` header
+DEFAULT_RETRY_AFTER = 1.0
+
+_DEPLOYMENT = re.compile(r"/deployments/([^/]+)/")
+
+
+class BucketState:
+    """
+    Token buckets of a deployment, and the time until which the service asked to pause.
+    New buckets are full, as they were last refilled long ago.
+    """
+
+    def __init__(
+        self,
+        requests: float = 0.0,
+        tokens: float = 0.0,
+        updated_at: float = 0.0,
+        blocked_until: float = 0.0,
+    ):
+        self.requests = requests
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.blocked_until = blocked_until
+
+    def take(
+        self,
+        now: float,
+        tokens: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        reserve: float = 0.0,
+    ) -> float:
+        """
+        Refill the buckets and take a request and its tokens, if available.
+
+        Args:
+            now(float): The current time.
+            tokens(int): The estimated tokens of the request.
+            requests_per_minute(int): The requests allowed per minute.
+            tokens_per_minute(int): The tokens allowed per minute.
+            reserve(float): The share of the buckets the request may not take.
+
+        Returns:
+            (float): 0 if taken, else the seconds to wait before trying again.
+        """
+        request_rate, token_rate = requests_per_minute / 60, tokens_per_minute / 60
+        elapsed = max(0.0, now - self.updated_at)
+        self.requests = min(
+            request_rate * BURST_SECONDS, self.requests + elapsed * request_rate
+        )
+        self.tokens = min(
+            token_rate * BURST_SECONDS, self.tokens + elapsed * token_rate
+        )
+        self.updated_at = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        # A request larger than the bucket goes once the bucket is full
+        taken = min(tokens, token_rate * BURST_SECONDS * (1 - reserve))
+        wait = max(
+            (1 + request_rate * BURST_SECONDS * reserve - self.requests) / request_rate,
+            (taken + token_rate * BURST_SECONDS * reserve - self.tokens) / token_rate,
+        )
+        if wait > 0:
+            return wait
+        self.requests -= 1
+        self.tokens -= taken
+        return 0.0
+
+
+class MemoryBucketStore:
+    """
+    Token buckets of the deployments, shared by the threads of the process.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__states: dict[str, BucketState] = {}
+
+    def take(
+        self,
+        deployment: str,
+        tokens: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        reserve: float = 0.0,
+    ) -> float:
+        """
+        Take a request and its tokens from the buckets of a deployment, if available.
+
+        Args:
+            deployment(str): The deployment.
+            tokens(int): The estimated tokens of the request.
+            requests_per_minute(int): The requests allowed per minute.
+            tokens_per_minute(int): The tokens allowed per minute.
+            reserve(float): The share of the buckets the request may not take.
+
+        Returns:
+            (float): 0 if taken, else the seconds to wait before trying again.
+        """
+        with self.__lock:
+            state = self.__states.setdefault(deployment, BucketState())
+            return state.take(
+                time.time(), tokens, requests_per_minute, tokens_per_minute, reserve
+            )
+
+    def block(self, deployment: str, until: float) -> None:
+        """
+        Pause the calls to a deployment.
+
+        Args:
+            deployment(str): The deployment.
+            until(float): The time until which no call is made.
+        """
+        with self.__lock:
+            state = self.__states.setdefault(deployment, BucketState())
+            state.blocked_until = max(state.blocked_until, until)
+
+
+class FileBucketStore:
+    """
+    Token buckets of the deployments, shared by the processes of the host through a JSON file
+    locked on every access, e.g. by the API and the workers.
+
+    Attributes:
+        path(Path): The file holding the buckets.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        self.__lock = threading.Lock()
+
+    def take(
+        self,
+        deployment: str,
+        tokens: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        reserve: float = 0.0,
+    ) -> float:
+        """
+        Take a request and its tokens from the buckets of a deployment, if available.
+
+        Args:
+            deployment(str): The deployment.
+            tokens(int): The estimated tokens of the request.
+            requests_per_minute(int): The requests allowed per minute.
+            tokens_per_minute(int): The tokens allowed per minute.
+            reserve(float): The share of the buckets the request may not take.
+
+        Returns:
+            (float): 0 if taken, else the seconds to wait before trying again.
+        """
+        with self.__open(deployment) as state:
+            return state.take(
+                time.time(), tokens, requests_per_minute, tokens_per_minute, reserve
+            )
+
+    def block(self, deployment: str, until: float) -> None:
+        """
+        Pause the calls to a deployment, in every process.
+
+        Args:
+            deployment(str): The deployment.
+            until(float): The time until which no call is made.
+        """
+        with self.__open(deployment) as state:
+            state.blocked_until = max(state.blocked_until, until)
+
+    @contextmanager
+    def __open(self, deployment: str):
+        """
+        Lock the file, yield the buckets of a deployment and write them back.
+
+        Args:
+            deployment(str): The deployment.
+        """
+        import fcntl
+
+        with self.__lock, open(self.path, "r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                content = file.read()
+                states = json.loads(content) if content else {}
+                state = BucketState(**states.get(deployment, {}))
+                yield state
+                states[deployment] = vars(state)
+                file.seek(0)
+                file.truncate()
+                file.write(json.dumps(states))
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class AdaptiveLimiter:
+    """
+    Paces the calls to a deployment: token buckets of requests and tokens, an AIMD
+    concurrency limit, and a queue of the waiting calls by priority.
+
+    Attributes:
+        deployment(str): The deployment.
+        requests_per_minute(int): The requests allowed per minute.
+        tokens_per_minute(int): The tokens allowed per minute.
+        max_concurrency(int): The most concurrent calls.
+    """
+
+    def __init__(
+        self,
+        deployment: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        store: MemoryBucketStore | FileBucketStore,
+    ):
+        self.deployment = deployment
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.__store = store
+        self.__condition = threading.Condition()
+        self.__waiting: list[tuple[int, int]] = []
+        self.__tickets = itertools.count()
+        self.__in_flight = 0
+        self.__limit = float(max_concurrency)
+        RATE_LIMIT_CONCURRENCY.labels(deployment=deployment).set(max_concurrency)
+
+    @property
+    def limit(self) -> int:
+        """
+        The number of concurrent calls currently allowed.
+        """
+        return int(self.__limit)
+
+    def acquire(self, tokens: int, priority: RequestPriority = "bulk") -> float:
+        """
+        Wait for the turn of a call: no call of a higher priority, or of the same priority
+        but earlier, is waiting, the concurrency limit is not reached and the buckets allow it.
+
+        Args:
+            tokens(int): The estimated tokens of the call.
+            priority(RequestPriority): The priority of the call.
+
+        Returns:
+            (float): The seconds waited.
+        """
+        started_at = time.perf_counter()
+        ticket = (PRIORITIES[priority], next(self.__tickets))
+        with self.__condition:
+            heapq.heappush(self.__waiting, ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self.__waiting[0] == ticket and self.__in_flight < self.limit:
+                        timeout = self.__store.take(
+                            self.deployment,
+                            tokens,
+                            self.requests_per_minute,
+                            self.tokens_per_minute,
+                            RESERVES[priority],
+                        )
+                        if timeout <= 0:
+                            break
+                    self.__condition.wait(timeout)
+            finally:
+                self.__waiting.remove(ticket)
+                heapq.heapify(self.__waiting)
+                # The next call in line may go
+                self.__condition.notify_all()
+            self.__in_flight += 1
+
+        waited = time.perf_counter() - started_at
+        RATE_LIMIT_WAIT_SECONDS.labels(
+            deployment=self.deployment, priority=priority
+        ).observe(waited)
+        return waited
+
+    def release(
+        self, throttled: bool = False, retry_after: float | None = None
+    ) -> None:
+        """
+        End a call, adapting the concurrency limit to its outcome.
+
+        Args:
+            throttled(bool): Whether the service throttled the call.
+            retry_after(float | None): The seconds the service asked to wait, if throttled.
+        """
+        with self.__condition:
+            self.__in_flight -= 1
+            if throttled:
+                self.__limit = max(1.0, self.__limit / 2)
+                self.__store.block(
+                    self.deployment, time.time() + (retry_after or DEFAULT_RETRY_AFTER)
+                )
+                RATE_LIMIT_THROTTLES.labels(deployment=self.deployment).inc()
+                logger.warning(
+                    "Azure OpenAI throttled %s, concurrency lowered to %d",
+                    self.deployment,
+                    self.limit,
+                )
+            else:
+                self.__limit = min(
+                    float(self.max_concurrency), self.__limit + 1 / self.__limit
+                )
+            RATE_LIMIT_CONCURRENCY.labels(deployment=self.deployment).set(self.limit)
+            self.__condition.notify_all()
+
+
+def get_deployment(url: httpx.URL) -> str:
+    """
+    Get the deployment an Azure OpenAI request is sent to.
+
+    Args:
+        url(httpx.URL): The URL of the request.
+
+    Returns:
+        (str): The deployment, or the host for the other APIs.
+    """
+    match = _DEPLOYMENT.search(url.path)
+    return match.group(1) if match else url.host
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """
+    Estimate the tokens an Azure OpenAI request counts against the limit, like the service:
+    from the size of the prompt and the maximum tokens of the completion.
+
+    Args:
+        request(httpx.Request): The request, with a JSON body.
+
+    Returns:
+        (int): The estimated tokens.
+    """
+    content = request.content
+    try:
+        body = json.loads(content) if content else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    completion = body.get("max_tokens") or body.get("max_completion_tokens")
+    if completion is None:
+        completion = DEFAULT_COMPLETION_TOKENS if "messages" in body else 0
+    return len(content) // CHARS_PER_TOKEN + int(completion)
+
+
+def get_retry_after(response: httpx.Response) -> float | None:
+    """
+    Get the seconds a throttling response asks to wait.
+
+    Args:
+        response(httpx.Response): The response.
+
+    Returns:
+        (float | None): The seconds, None if the response does not say.
+    """
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(response.headers[header]) / scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+@lru_cache
+def get_bucket_store() -> MemoryBucketStore | FileBucketStore:
+    """
+    Get the token buckets of the process, in the shared file if configured.
+
+    Returns:
+        (MemoryBucketStore | FileBucketStore): The buckets.
+    """
+    path = get_config().rate_limit_state_path
+    return FileBucketStore(path) if path else MemoryBucketStore()
+
+
+@lru_cache
+def get_limiter(deployment: str) -> AdaptiveLimiter:
+    """
+    Get the limiter of a deployment, with the limits of the embeddings deployment
+    or of the LLM one.
+
+    Args:
+        deployment(str): The deployment.
+
+    Returns:
+        (AdaptiveLimiter): The limiter, shared by the process.
+    """
+    config = get_config()
+    embeddings = deployment == config.azure_openai_embeddings_model
+    return AdaptiveLimiter(
+        deployment,
+        requests_per_minute=config.rate_limit_embeddings_rpm
+        if embeddings
+        else config.rate_limit_llm_rpm,
+        tokens_per_minute=config.rate_limit_embeddings_tpm
+        if embeddings
+        else config.rate_limit_llm_tpm,
+        max_concurrency=config.rate_limit_max_concurrency,
+        store=get_bucket_store(),
+    )
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    HTTP transport acquiring the limiter of the deployment before every request.
+
+    Attributes:
+        priority(RequestPriority): The priority of the requests sent through the transport.
+    """
+
+    def __init__(
+        self,
+        priority: RequestPriority,
+        transport: httpx.BaseTransport | None = None,
+    ):
+        self.priority: RequestPriority = priority
+        self.__transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = get_limiter(get_deployment(request.url))
+        limiter.acquire(estimate_tokens(request), self.priority)
+        throttled, retry_after = False, None
+        try:
+            response = self.__transport.handle_request(request)
+            if response.status_code == 429:
+                throttled, retry_after = True, get_retry_after(response)
+            return response
+        finally:
+            limiter.release(throttled, retry_after)
+
+    def close(self) -> None:
+        self.__transport.close()
+
+
+@lru_cache
+def get_http_client(priority: RequestPriority) -> httpx.Client | None:
+    """
+    Get the HTTP client of the OpenAI clients making calls of a priority.
+    It is shared by the process, so the connections are reused.
+
+    Args:
+        priority(RequestPriority): The priority of the calls.
+
+    Returns:
+        (httpx.Client | None): The rate-limited client, None to use the default one
+            when the rate limiter is disabled.
+    """
+    if not get_config().rate_limit_enabled:
+        return None
+    return DefaultHttpxClient(transport=RateLimitedTransport(priority))
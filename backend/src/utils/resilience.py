@@ -0,0 +1,452 @@
+"""
+Set of tools to bound the latency of the calls to the external services: Azure OpenAI,
+Weaviate, Unstructured and the blob storage.
+
+Every dependency has a timeout, after which the caller gets a `DependencyTimeoutError`, and a
+circuit breaker: after `breaker_failure_threshold` consecutive failures, the calls fail fast
+with a `CircuitOpenError` for `breaker_reset_timeout` seconds, then a single trial call decides
+whether the dependency is healthy again.
+
+The idempotent reads can be hedged: when the call is slower than the `hedge_percentile` of the
+recent calls of the same operation, a duplicate is sent and the first answer wins.
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Literal, TypeVar
+
+from utils.config import get_config
+from utils.metrics import (
+    CIRCUIT_BREAKER_REJECTIONS,
+    CIRCUIT_BREAKER_STATE,
+    CIRCUIT_BREAKER_TRANSITIONS,
+    DEPENDENCY_TIMEOUTS,
+    HEDGED_REQUESTS,
+)
+from utils.profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DependencyName = Literal[
+    "llm", "ollama", "embeddings", "weaviate", "unstructured", "storage"
+]
+BreakerState = Literal["closed", "half_open", "open"]
+
+BREAKER_STATES: dict[BreakerState, int] = {"closed": 0, "half_open": 1, "open": 2}
+
+# Latencies kept per operation to compute the hedging delay
+LATENCY_WINDOW = 500
+
+# Below this many latencies, the distribution is unknown and the calls are not hedged
+MIN_HEDGE_SAMPLES = 20
+
+# Threads running the calls bounded by a timeout or hedged, shared by the dependencies
+MAX_CALL_THREADS = 256
+
+
+class DependencyError(RuntimeError):
+    """
+    A dependency could not serve a call.
+
+    Attributes:
+        dependency(str): The name of the dependency.
+    """
+
+    def __init__(self, dependency: str, message: str):
+        super().__init__(message)
+        self.dependency = dependency
+
+
+class DependencyTimeoutError(DependencyError, TimeoutError):
+    """
+    A dependency did not answer within its timeout.
+    """
+
+
+class CircuitOpenError(DependencyError):
+    """
+    The circuit breaker of a dependency is open, the call was not made.
+
+    Attributes:
+        retry_after(float): The seconds until a trial call is allowed.
+    """
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(
+            dependency,
+            f"{dependency} is unavailable, retry in {retry_after:.0f} seconds",
+        )
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """
+    Tell the failures of a dependency from the errors of the caller: timeouts, connection
+    errors, throttling and server errors count, invalid requests do not.
+
+    Args:
+        error(BaseException): The error raised by the call.
+
+    Returns:
+        (bool): Whether the error counts towards opening the circuit breaker.
+    """
+    if isinstance(error, TimeoutError | ConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and isinstance(response, dict):
+        # botocore errors
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    elif status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return not isinstance(error, ValueError | TypeError | LookupError)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker counting the consecutive failures of a dependency.
+
+    Attributes:
+        name(str): The name of the dependency.
+        failure_threshold(int): The consecutive failures opening the breaker.
+        reset_timeout(float): The seconds the breaker stays open before a trial call.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__lock = threading.Lock()
+        self.__state: BreakerState = "closed"
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__trial_running = False
+        CIRCUIT_BREAKER_STATE.labels(dependency=name).set(0)
+
+    @property
+    def state(self) -> BreakerState:
+        """
+        The state of the breaker: `closed`, `half_open` or `open`.
+        """
+        return self.__state
+
+    def allow(self) -> None:
+        """
+        Check a call may be made. Once the reset timeout is over, a single trial call is let
+        through while the others keep failing fast.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+        """
+        with self.__lock:
+            if self.__state == "closed":
+                return
+            retry_after = self.__opened_at + self.reset_timeout - time.monotonic()
+            if retry_after <= 0 and not self.__trial_running:
+                self.__transition("half_open")
+                self.__trial_running = True
+                return
+        CIRCUIT_BREAKER_REJECTIONS.labels(dependency=self.name).inc()
+        raise CircuitOpenError(self.name, max(retry_after, 1.0))
+
+    def record_success(self) -> None:
+        """
+        Record a successful call, closing the breaker after a successful trial.
+        """
+        with self.__lock:
+            self.__failures = 0
+            self.__trial_running = False
+            if self.__state != "closed":
+                self.__transition("closed")
+
+    def record_failure(self) -> None:
+        """
+        Record a failed call, opening the breaker after too many or a failed trial.
+        """
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if self.__state == "half_open" or (
+                self.__state == "closed" and self.__failures >= self.failure_threshold
+            ):
+                self.__opened_at = time.monotonic()
+                self.__transition("open")
+
+    def __transition(self, state: BreakerState) -> None:
+        """
+        Change the state of the breaker, the lock being held.
+
+        Args:
+            state(BreakerState): The new state.
+        """
+        if state == "open":
+            logger.warning(
+                "Circuit breaker of %s opened after %d failures",
+                self.name,
+                self.__failures,
+            )
+        self.__state = state
+        CIRCUIT_BREAKER_STATE.labels(dependency=self.name).set(BREAKER_STATES[state])
+        CIRCUIT_BREAKER_TRANSITIONS.labels(dependency=self.name, state=state).inc()
+
+
+class LatencyTracker:
+    """
+    Recent latencies of an operation, to delay the hedged requests by a percentile of them.
+
+    Attributes:
+        window(int): The number of latencies kept.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.__lock = threading.Lock()
+        self.__latencies: deque[float] = deque(maxlen=window)
+        self.__sorted: list[float] = []
+
+    def record(self, latency: float) -> None:
+        """
+        Record the latency of a successful call.
+
+        Args:
+            latency(float): The latency in seconds.
+        """
+        with self.__lock:
+            if len(self.__latencies) == self.window:
+                evicted = self.__latencies[0]
+                del self.__sorted[bisect.bisect_left(self.__sorted, evicted)]
+            self.__latencies.append(latency)
+            bisect.insort(self.__sorted, latency)
+
+    def percentile(self, pct: float) -> float | None:
+        """
+        Get a percentile of the recent latencies.
+
+        Args:
+            pct(float): The percentile, between 0 and 100.
+
+        Returns:
+            (float | None): The latency in seconds, None if there are too few of them.
+        """
+        with self.__lock:
+            if len(self.__sorted) < MIN_HEDGE_SAMPLES:
+                return None
+            rank = min(len(self.__sorted) - 1, int(pct / 100 * len(self.__sorted)))
+            return self.__sorted[rank]
+
+
+@lru_cache
+def get_call_executor() -> ThreadPoolExecutor:
+    """
+    Get the threads running the calls bounded by a timeout or hedged.
+
+    Returns:
+        (ThreadPoolExecutor): The executor, shared by the process.
+    """
+    return ThreadPoolExecutor(
+        max_workers=MAX_CALL_THREADS, thread_name_prefix="dependency-call"
+    )
+
+
+class Dependency:
+    """
+    External service called through a circuit breaker, with a timeout and optional hedging.
+
+    Attributes:
+        name(str): The name of the dependency.
+        timeout(float): The default seconds a call may take.
+        breaker(CircuitBreaker): The circuit breaker of the dependency.
+    """
+
+    def __init__(self, name: str, timeout: float, breaker: CircuitBreaker):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = breaker
+        self.__trackers: dict[str, LatencyTracker] = {}
+        self.__lock = threading.Lock()
+
+    def call(
+        self,
+        operation: str,
+        function: Callable[..., T],
+        *args: Any,
+        hedge: bool = False,
+        timeout: float | None | Literal["default"] = "default",
+        **kwargs: Any,
+    ) -> T:
+        """
+        Call the dependency.
+
+        Args:
+            operation(str): The name of the operation, whose latencies set the hedging delay.
+            function(Callable[..., T]): The call.
+            *args(Any): The positional arguments of the call.
+            hedge(bool): Whether to send a duplicate when the call is slow, for idempotent
+                calls only.
+            timeout(float | None | Literal["default"]): The seconds the call may take,
+                the dependency's by default, None to rely on the client timeouts only,
+                e.g. for the long ingestion calls.
+            **kwargs(Any): The keyword arguments of the call.
+
+        Returns:
+            (T): The result of the call.
+
+        Raises:
+            CircuitOpenError: If the dependency is unhealthy.
+            DependencyTimeoutError: If the call took longer than the timeout.
+        """
+        self.breaker.allow()
+        timeout = self.timeout if timeout == "default" else timeout
+        config = get_config()
+        hedge = hedge and config.hedging_enabled
+        tracker = self.__get_tracker(operation)
+        started_at = time.perf_counter()
+        try:
+            if timeout is None and not hedge:
+                result = function(*args, **kwargs)
+            else:
+                result = self.__call_in_threads(
+                    function,
+                    args,
+                    kwargs,
+                    timeout,
+                    tracker.percentile(config.hedge_percentile) if hedge else None,
+                )
+        except BaseException as error:
+            if is_dependency_failure(error):
+                self.breaker.record_failure()
+            else:
+                # The dependency answered, the request was wrong
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        tracker.record(time.perf_counter() - started_at)
+        return result
+
+    def __call_in_threads(
+        self,
+        function: Callable[..., T],
+        args: tuple,
+        kwargs: dict[str, Any],
+        timeout: float | None,
+        hedge_delay: float | None,
+    ) -> T:
+        """
+        Run a call in the shared threads, so the caller stops waiting at the timeout,
+        and send a duplicate if it has not answered after the hedging delay.
+        A call running past the timeout finishes in the background.
+
+        Args:
+            function(Callable[..., T]): The call.
+            args(tuple): The positional arguments of the call.
+            kwargs(dict[str, Any]): The keyword arguments of the call.
+            timeout(float | None): The seconds the call may take, None for no limit.
+            hedge_delay(float | None): The seconds after which a duplicate is sent,
+                None not to hedge.
+
+        Returns:
+            (T): The result of the first call to succeed.
+
+        Raises:
+            DependencyTimeoutError: If no call succeeded within the timeout.
+        """
+        executor = get_call_executor()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def submit() -> Future:
+            # The tracing span, the profile and the other context variables follow the call
+            return executor.submit(
+                contextvars.copy_context().run,
+                run_profiled,
+                function,
+                *args,
+                **kwargs,
+            )
+
+        futures = [submit()]
+        if hedge_delay is not None:
+            delay = max(hedge_delay, get_config().hedge_min_delay)
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            done, _ = wait(futures, timeout=delay)
+            if not done and (deadline is None or time.monotonic() < deadline):
+                futures.append(submit())
+                HEDGED_REQUESTS.labels(dependency=self.name, outcome="sent").inc()
+
+        pending = set(futures)
+        error: BaseException | None = None
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        HEDGED_REQUESTS.labels(
+                            dependency=self.name, outcome="won"
+                        ).inc()
+                    return future.result()
+                error = future.exception()
+        if not pending and error is not None:
+            raise error
+
+        DEPENDENCY_TIMEOUTS.labels(dependency=self.name).inc()
+        raise DependencyTimeoutError(
+            self.name, f"{self.name} did not answer within {timeout} seconds"
+        )
+
+    def __get_tracker(self, operation: str) -> LatencyTracker:
+        """
+        Get the latency tracker of an operation.
+
+        Args:
+            operation(str): The name of the operation.
+
+        Returns:
+            (LatencyTracker): The tracker.
+        """
+        with self.__lock:
+            return self.__trackers.setdefault(operation, LatencyTracker())
+
+
+@lru_cache
+def get_dependency(name: DependencyName) -> Dependency:
+    """
+    Get a dependency with its configured timeout and circuit breaker.
+
+    Args:
+        name(DependencyName): The name of the dependency.
+
+    Returns:
+        (Dependency): The dependency, shared by the process.
+    """
+    config = get_config()
+    timeouts: dict[DependencyName, float] = {
+        "llm": config.llm_timeout,
+        "ollama": config.ollama_timeout,
+        "embeddings": config.embeddings_timeout,
+        "weaviate": config.weaviate_timeout,
+        "unstructured": config.unstructured_timeout,
+        "storage": config.storage_timeout,
+    }
+    return Dependency(
+        name,
+        timeouts[name],
+        CircuitBreaker(
+            name, config.breaker_failure_threshold, config.breaker_reset_timeout
+        ),
+    )
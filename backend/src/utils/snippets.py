@@ -0,0 +1,187 @@
+"""
+Set of tools to slim the sources returned by the query endpoints: metadata projection
+and query-highlighted snippets of bounded length instead of the full chunk text.
+"""
+
+import re
+
+from utils.types import Source
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+ELLIPSIS = "…"
+
+# Metadata left out unless requested: the elements Unstructured merged into the chunk
+# and the near-duplicate signature bands (`services.collections.SIGNATURE_PROPERTY`, not
+# imported to keep LlamaIndex and Weaviate out of the API startup)
+LARGE_METADATA = {"orig_elements", "minhash_bands"}
+
+_WORD = re.compile(r"\w+")
+_STOP_WORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "be",
+    "by",
+    "can",
+    "do",
+    "for",
+    "from",
+    "how",
+    "i",
+    "in",
+    "is",
+    "it",
+    "my",
+    "of",
+    "on",
+    "or",
+    "the",
+    "to",
+    "was",
+    "were",
+    "has",
+    "have",
+    "does",
+    "did",
+    "this",
+    "that",
+    "what",
+    "when",
+    "where",
+    "which",
+    "who",
+    "why",
+    "with",
+}
+
+
+def get_query_terms(query: str) -> set[str]:
+    """
+    Get the terms of a query worth highlighting.
+
+    Args:
+        query(str): The user query.
+
+    Returns:
+        (set[str]): The lowercase terms, without stop words.
+    """
+    return {
+        word
+        for word in (match.lower() for match in _WORD.findall(query))
+        if word not in _STOP_WORDS and len(word) > 1
+    }
+
+
+def make_snippet(text: str, query: str, max_length: int) -> str:
+    """
+    Extract the window of the text holding the most query terms, with the terms highlighted.
+
+    Args:
+        text(str): The chunk text.
+        query(str): The user query.
+        max_length(int): The maximum length of the snippet, without the highlight markers.
+
+    Returns:
+        (str): The snippet.
+    """
+    terms = get_query_terms(query)
+    pattern = (
+        re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b",
+            re.IGNORECASE,
+        )
+        if terms
+        else None
+    )
+    hits = list(pattern.finditer(text)) if pattern else []
+
+    # Start the window a little before the hit that opens the most distinct terms
+    start = 0
+    if hits and len(text) > max_length:
+        best_score = -1
+        for index, hit in enumerate(hits):
+            window_end = hit.start() + max_length
+            score = len(
+                {
+                    other.group(0).lower()
+                    for other in hits[index:]
+                    if other.end() <= window_end
+                }
+            )
+            if score > best_score:
+                best_score, start = score, hit.start()
+        start = max(0, min(start - max_length // 5, len(text) - max_length))
+        # Do not cut the first word
+        if start > 0:
+            space = text.find(" ", start)
+            start = space + 1 if 0 <= space < start + 20 else start
+
+    end = min(len(text), start + max_length)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    snippet = text[start:end].strip()
+    if pattern:
+        snippet = pattern.sub(
+            lambda match: f"{HIGHLIGHT_START}{match.group(0)}{HIGHLIGHT_END}", snippet
+        )
+    return (
+        (ELLIPSIS if start > 0 else "")
+        + snippet
+        + (ELLIPSIS if end < len(text) else "")
+    )
+
+
+def project_metadata(metadata: dict, fields: list[str] | None) -> dict:
+    """
+    Keep the requested metadata fields.
+
+    Args:
+        metadata(dict): The metadata of a chunk.
+        fields(list[str] | None): The fields to keep, all but the large ones if None.
+
+    Returns:
+        (dict): The projected metadata.
+    """
+    if fields is None:
+        return {
+            key: value for key, value in metadata.items() if key not in LARGE_METADATA
+        }
+    return {key: metadata[key] for key in fields if key in metadata}
+
+
+def shape_sources(
+    sources: list[Source],
+    query: str,
+    fields: list[str] | None = None,
+    include_text: bool = False,
+    snippet_length: int = 300,
+) -> list[Source]:
+    """
+    Shape the sources of a response for the client.
+
+    Args:
+        sources(list[Source]): The sources, with their full text and metadata.
+        query(str): The user query, to highlight in the snippets.
+        fields(list[str] | None): The metadata fields to return, all but the large ones if None.
+        include_text(bool): Whether to return the full text of the chunks.
+        snippet_length(int): The maximum length of the snippets, 0 to leave them out.
+
+    Returns:
+        (list[Source]): The shaped sources.
+    """
+    return [
+        Source(
+            text=source.text if include_text else None,
+            snippet=make_snippet(source.text, query, snippet_length)
+            if source.text and snippet_length > 0
+            else None,
+            metadata=project_metadata(source.metadata, fields),
+        )
+        for source in sources
+    ]
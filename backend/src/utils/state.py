@@ -0,0 +1,22 @@
+"""
+Set of LangGraph states for the agentic RAG process.
+Kept apart from `utils.types` so the API models can be imported without loading LangGraph.
+"""
+
+from collections.abc import Sequence
+from typing import Annotated
+
+from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+
+class AgenticRagState(TypedDict):
+    """
+    State for the agentic RAG process.
+
+    Attributes:
+        messages(Annotated[Sequence[BaseMessage], add_messages]): The messages of the conversation.
+    """
+
+    messages: Annotated[Sequence[BaseMessage], add_messages]
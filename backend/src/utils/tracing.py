@@ -0,0 +1,117 @@
+"""
+Set of tools to trace a request end to end, from the API through the Temporal workflows to the activities.
+"""
+
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+)
+
+from utils.config import get_config
+
+if TYPE_CHECKING:
+    from temporalio.client import Interceptor
+
+TRACER_NAME = "simple-rag"
+
+
+class FileSpanExporter(ConsoleSpanExporter):
+    """
+    Span exporter appending every span to a file as a line of JSON.
+    The file is closed when the tracer provider shuts down.
+    """
+
+    def __init__(self, file_path: Path):
+        """
+        Open the file to append the spans to.
+
+        Args:
+            file_path(Path): The JSON lines file.
+        """
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(out=open(file_path, "a"), formatter=_format_span_line)
+
+    def shutdown(self) -> None:
+        self.out.close()
+
+
+def _format_span_line(span: ReadableSpan) -> str:
+    """
+    Format a span as a single line of JSON.
+
+    Args:
+        span(ReadableSpan): The span.
+
+    Returns:
+        (str): The JSON of the span, with a trailing newline.
+    """
+    # The span only formats its JSON indented, on several lines
+    return json.dumps(json.loads(span.to_json())) + "\n"
+
+
+def setup_tracing(service_name: str) -> None:
+    """
+    Configure the global tracer provider with the exporter selected in the configuration.
+    When tracing is disabled, the no-op tracer provider is kept.
+
+    Args:
+        service_name(str): The name of the service reported in every span.
+    """
+    exporter = _build_exporter()
+    if exporter is None:
+        return
+
+    provider = TracerProvider(resource=Resource.create({SERVICE_NAME: service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def get_tracer() -> trace.Tracer:
+    """
+    Get the tracer used by the application.
+
+    Returns:
+        (trace.Tracer): The application's tracer.
+    """
+    return trace.get_tracer(TRACER_NAME)
+
+
+def get_temporal_interceptors() -> list["Interceptor"]:
+    """
+    Get the Temporal interceptors that propagate the trace context through the workflow headers.
+
+    Returns:
+        (list[Interceptor]): The Temporal client and worker interceptors.
+    """
+    from temporalio.contrib.opentelemetry import TracingInterceptor
+
+    return [TracingInterceptor(get_tracer())]
+
+
+def _build_exporter() -> SpanExporter | None:
+    """
+    Build the span exporter selected in the configuration.
+
+    Returns:
+        (SpanExporter | None): The span exporter, or None if tracing is disabled.
+    """
+    exporter = get_config().tracing_exporter
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter(endpoint=get_config().tracing_otlp_endpoint)
+    if exporter == "file":
+        return FileSpanExporter(Path(get_config().tracing_file_path))
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    return None
@@ -2,14 +2,65 @@
 Set of types relevant for the application operations.
 """
 
+import datetime
 import uuid
-from collections.abc import Sequence
-from typing import Annotated
+from typing import Annotated, Literal
+
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    DirectoryPath,
+    Field,
+    FilePath,
+    StringConstraints,
+)
+
+# Metadata set by the ingestion on every chunk, which the uploaded metadata cannot override
+RESERVED_METADATA_KEYS = {
+    "text",
+    "_node_content",
+    "doc_id",
+    "ref_doc_id",
+    "document_id",
+    "blob_path",
+    "filename",
+    "filetype",
+    "uploaded_at",
+    "minhash_bands",
+    "duplicate_of",
+}
+
+# Valid Weaviate property names
+MetadataKey = Annotated[
+    str, StringConstraints(pattern=r"^[A-Za-z_][A-Za-z0-9_]{0,63}$")
+]
+MetadataValue = str | int | float | bool
+
+
+def _check_metadata_keys(
+    metadata: dict[str, MetadataValue],
+) -> dict[str, MetadataValue]:
+    """
+    Reject the metadata keys reserved to the ingestion.
+
+    Args:
+        metadata(dict[str, MetadataValue]): The metadata.
+
+    Returns:
+        (dict[str, MetadataValue]): The metadata.
+
+    Raises:
+        ValueError: If a key is reserved.
+    """
+    reserved = sorted(set(metadata) & RESERVED_METADATA_KEYS)
+    if reserved:
+        raise ValueError(f"Reserved metadata keys: {', '.join(reserved)}")
+    return metadata
+
 
-from langchain_core.messages import BaseMessage
-from langgraph.graph.message import add_messages
-from pydantic import BaseModel, DirectoryPath, Field, FilePath
-from typing_extensions import TypedDict
+DocumentMetadata = Annotated[
+    dict[MetadataKey, MetadataValue], AfterValidator(_check_metadata_keys)
+]
 
 
 class EmbeddingFileRequest(BaseModel):
@@ -23,15 +74,93 @@ class EmbeddingFileRequest(BaseModel):
     file_path: FilePath
 
 
+IngestionLane = Literal["fast", "heavy"]
+
+# Priority of the calls to Azure OpenAI, the interactive ones going first
+RequestPriority = Literal["interactive", "bulk"]
+
+
+class IngestionClassification(BaseModel):
+    """
+    Lane an uploaded file is ingested in, and why.
+
+    Attributes:
+        lane(IngestionLane): `fast` for the small text files, `heavy` for the large or scanned ones.
+        reason(str): What decided the lane: `size`, `pages`, `image`, `scanned` or `small`.
+        mime_type(str): The MIME type of the file.
+        size(int): The size of the file in bytes.
+        pages(int | None): The number of pages, None if the file is not a PDF or was not opened.
+    """
+
+    lane: IngestionLane
+    reason: str
+    mime_type: str
+    size: int
+    pages: int | None = None
+
+
+ExtractorName = Literal["native", "unstructured"]
+
+
+class ExtractionRoute(BaseModel):
+    """
+    Extractor chosen for a file, and why.
+
+    Attributes:
+        extractor(ExtractorName): `native` for the text formats parsed in process,
+            `unstructured` for the others.
+        strategy(str | None): The partition strategy of Unstructured, None for `native`.
+        reason(str): What decided the route: `text_format`, `text_layer`, `scanned`,
+            `image`, `unreadable_pdf` or `other`, `requested` for a strategy given by the
+            caller and `disabled` when the router is.
+    """
+
+    extractor: ExtractorName
+    strategy: str | None = None
+    reason: str
+
+
+class ExtractionReport(ExtractionRoute):
+    """
+    Route and duration of the extraction of a file.
+
+    Attributes:
+        seconds(float): The time taken to extract and chunk the file.
+        chunks(int): The number of chunks extracted.
+    """
+
+    seconds: float
+    chunks: int
+
+
 class EmbeddingFileWorkflowRequest(BaseModel):
     """
     Request to create embeddings for a file.
 
     Attributes:
         blob_path(str): The path to the file in the blob storage.
+        index_name(str): The index, or collection, to store the embeddings in.
+        lane(IngestionLane | None): The lane of the file, which sets its timeouts.
+        profile(bool): Whether to profile the ingestion into the `PROFILING_PATH` directory.
     """
 
     blob_path: str
+    index_name: str = "Documents"
+    lane: IngestionLane | None = None
+    profile: bool = False
+
+
+class BlobInfo(BaseModel):
+    """
+    Properties of a file stored in the blob storage.
+
+    Attributes:
+        uploaded_at(datetime.datetime): The time the file was uploaded.
+        metadata(dict[str, MetadataValue]): The metadata given with the file at upload.
+    """
+
+    uploaded_at: datetime.datetime
+    metadata: dict[str, MetadataValue] = {}
 
 
 class EmbeddingFolderRequest(BaseModel):
@@ -60,19 +189,234 @@ class EmbeddingResponse(BaseModel):
     details: dict[str, str | int | float | bool] = {}
 
 
+class DedupStats(BaseModel):
+    """
+    Outcome of the near-duplicate detection of an ingestion.
+
+    Attributes:
+        mode(str): What was done with the near-duplicates: `off`, `drop` or `link`.
+        chunks(int): The number of chunks checked.
+        unique(int): The number of chunks with no near-duplicate.
+        duplicates_in_file(int): The number of near-duplicates of another chunk of the same ingestion.
+        duplicates_in_index(int): The number of near-duplicates of a chunk already indexed.
+    """
+
+    mode: str
+    chunks: int = 0
+    unique: int = 0
+    duplicates_in_file: int = 0
+    duplicates_in_index: int = 0
+
+
+class ReindexWorkflowRequest(BaseModel):
+    """
+    Request to rebuild an index in a new collection and switch its alias to it.
+
+    Attributes:
+        alias(str): The index alias the queries use.
+        target_index(str | None): The collection to build, named after the alias and the start time if None.
+        source(str): Whether to rebuild from the files in the blob storage (`blobs`),
+            e.g. for a new chunk size, or from the chunks of the current collection (`chunks`).
+        reembed(bool): Whether to embed the chunks again, when rebuilding from chunks.
+            Without it, the stored vectors are copied, e.g. for new index settings.
+        parallelism(int): The number of files or chunk ranges processed at once.
+        batch_size(int): The number of chunks per range, when rebuilding from chunks.
+        min_document_ratio(float): The minimum ratio of chunks the new collection must hold
+            compared to the current one, when rebuilding from chunks.
+        max_failures(int): The number of files that may fail, when rebuilding from files.
+        switch_alias(bool): Whether to switch the alias once the new collection is validated.
+    """
+
+    alias: str = "Documents"
+    target_index: str | None = None
+    source: Literal["blobs", "chunks"] = "blobs"
+    reembed: bool = True
+    parallelism: int = Field(default=4, ge=1)
+    batch_size: int = Field(default=500, ge=1)
+    min_document_ratio: float = 0.95
+    max_failures: int = 0
+    switch_alias: bool = True
+
+
+class ReindexPlan(BaseModel):
+    """
+    Work units of a re-index, computed before the backfill.
+
+    Attributes:
+        source_index(str): The collection the alias points to.
+        target_index(str): The collection to build.
+        blob_paths(list[str]): The files to embed, when rebuilding from files.
+        cursors(list[uuid.UUID | None]): The first ID (exclusive) of every chunk range,
+            when rebuilding from chunks.
+        embed_task_queue(str | None): The task queue of the files to embed, the heavy lane
+            so the backfill does not delay the uploads.
+        alias_cache_ttl(int): The seconds the processes may keep writing to the current
+            collection after the switch, before their cached alias expires.
+    """
+
+    source_index: str
+    target_index: str
+    blob_paths: list[str] = []
+    cursors: list[uuid.UUID | None] = []
+    embed_task_queue: str | None = None
+    alias_cache_ttl: int = 0
+
+
+class ReindexChunksRequest(BaseModel):
+    """
+    Request to copy a range of chunks to the new collection.
+
+    Attributes:
+        source_index(str): The collection to copy from.
+        target_index(str): The collection to copy to.
+        after(uuid.UUID | None): The ID after which the range starts.
+        before(uuid.UUID | None): The ID at which the range ends, the end of the collection if None.
+        reembed(bool): Whether to embed the chunks again instead of copying their vectors.
+        batch_size(int): The number of chunks fetched at once.
+        delete_missing(bool): Whether a sync deletes the chunks of the new collection missing
+            from the current one, i.e. deleted from it during the backfill.
+    """
+
+    source_index: str
+    target_index: str
+    after: uuid.UUID | None = None
+    before: uuid.UUID | None = None
+    reembed: bool = True
+    batch_size: int = 500
+    delete_missing: bool = False
+
+
+class ReindexSyncResult(BaseModel):
+    """
+    Changes made to the new collection to catch up with the current one.
+
+    Attributes:
+        copied(int): The number of chunks copied from the current collection.
+        deleted(int): The number of chunks deleted from the new collection.
+    """
+
+    copied: int = 0
+    deleted: int = 0
+
+
+class ReindexValidationRequest(BaseModel):
+    """
+    Request to validate a new collection before switching to it.
+
+    Attributes:
+        source_index(str): The collection currently serving the queries.
+        target_index(str): The new collection.
+        min_document_ratio(float): The minimum ratio of chunks the new collection must hold.
+    """
+
+    source_index: str
+    target_index: str
+    min_document_ratio: float = 0.0
+
+
+class IndexAliasRequest(BaseModel):
+    """
+    Request to point an index alias to a collection.
+
+    Attributes:
+        alias(str): The index alias.
+        target_index(str): The collection.
+    """
+
+    alias: str
+    target_index: str
+
+
+class ReindexProgress(BaseModel):
+    """
+    Progress of a re-index.
+
+    Attributes:
+        phase(str): The current phase: planning, backfill, validation, switch, catch-up,
+            done or failed.
+        source_index(str | None): The collection serving the queries during the re-index.
+        target_index(str | None): The collection being built.
+        total(int): The number of work units, files or chunk ranges.
+        completed(int): The number of completed work units.
+        failed(int): The number of failed work units.
+        documents(int): The number of chunks written to the new collection.
+        deleted(int): The number of chunks deleted from the new collection, as they were
+            deleted from the current one during the backfill.
+        message(str | None): The reason of a failure.
+        warnings(list[str]): The changes of the current collection the re-index does not
+            carry over to the new one.
+    """
+
+    phase: str = "planning"
+    source_index: str | None = None
+    target_index: str | None = None
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    documents: int = 0
+    deleted: int = 0
+    message: str | None = None
+    warnings: list[str] = []
+
+
+QueryModeOption = Literal["auto", "text_search", "default", "hybrid"]
+
+
+class QueryFilters(BaseModel):
+    """
+    Filters narrowing the chunks a query searches, applied by Weaviate before the scoring.
+    The values of a list are alternatives, and the filters are all required.
+
+    Attributes:
+        blob_paths(list[str] | None): The paths of the files in the blob storage.
+        filenames(list[str] | None): The names of the uploaded files.
+        file_types(list[str] | None): The MIME types of the files, e.g. `application/pdf`.
+        uploaded_after(datetime.datetime | None): The earliest upload time, included.
+        uploaded_before(datetime.datetime | None): The latest upload time, excluded.
+        metadata(dict[str, MetadataValue]): The values of the metadata given at upload.
+    """
+
+    blob_paths: list[str] | None = None
+    filenames: list[str] | None = None
+    file_types: list[str] | None = None
+    uploaded_after: datetime.datetime | None = None
+    uploaded_before: datetime.datetime | None = None
+    metadata: dict[MetadataKey, MetadataValue] = {}
+
+
 class QueryRequest(BaseModel):
     """
     Request to query the embeddings.
 
     Attributes:
         query(str): The user query.
+        query_mode(str): The retrieval mode: `auto` lets the query router choose from the query,
+            `text_search` is BM25 only, `default` is vector only and `hybrid` combines both.
+        alpha(float | None): The hybrid weight of the vector search, from 0 (BM25) to 1 (vector).
+        filters(QueryFilters | None): The filters narrowing the searched chunks.
+        thread_id(str | None): The conversation of an agentic query, continued from its previous
+            turns, or None to answer the query on its own.
     """
 
     query: str
+    query_mode: QueryModeOption = "auto"
+    alpha: float | None = Field(default=None, ge=0.0, le=1.0)
+    filters: QueryFilters | None = None
+    thread_id: str | None = Field(default=None, min_length=1, max_length=128)
 
 
 class Source(BaseModel):
-    text: str
+    """
+    Chunk retrieved for a query.
+
+    Attributes:
+        text(str | None): The full text of the chunk, if requested.
+        snippet(str | None): The passage of the chunk matching the query, with the query terms highlighted.
+        metadata(dict): The metadata of the chunk.
+    """
+
+    text: str | None = None
+    snippet: str | None = None
     metadata: dict = {}
 
 
@@ -83,11 +427,13 @@ class QueryResponse(BaseModel):
     Attributes:
         message(str): The message of the response.
         sources(list[NodeWithScore]): The sources of the response.
+        thread_id(str | None): The conversation the response belongs to.
     """
 
     message: str | None = None
     reasoning: str | None = None
     sources: list[Source] = []
+    thread_id: str | None = None
 
 
 class DocumentResponse(BaseModel):
@@ -96,39 +442,30 @@ class DocumentResponse(BaseModel):
 
     Attributes:
         id(uuid.UUID): The ID of the document.
-        text(str): The text content of the document.
+        text(str | None): The text content of the document, if requested.
         metadata(dict): Additional metadata about the document.
+        vector(list[float] | None): The embedding of the document, if requested.
     """
 
     id: uuid.UUID
-    text: str
+    text: str | None = None
     metadata: dict = {}
+    vector: list[float] | None = None
 
 
 class GetDocumentsResponse(BaseModel):
     """
-    Response containing a list of documents with pagination info.
+    Response containing a page of documents with pagination info.
 
     Attributes:
         documents(list[DocumentResponse]): The list of documents.
         total_documents(int): The total number of documents available.
-        page(int): The current page number.
-        total_pages(int): The total number of pages available.
+        next_cursor(uuid.UUID | None): The cursor to fetch the next page, None on the last page.
     """
 
     documents: list[DocumentResponse]
     total_documents: int
-
-
-class AgenticRagState(TypedDict):
-    """
-    State for the agentic RAG process.
-
-    Attributes:
-        messages(Annotated[Sequence[BaseMessage], add_messages]): The messages of the conversation.
-    """
-
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+    next_cursor: uuid.UUID | None = None
 
 
 class DocumentGrade(BaseModel):
@@ -1,31 +1,163 @@
+import argparse
 import asyncio
 import concurrent.futures
+import contextlib
+import logging
+import resource
+import shutil
+import tempfile
 
+from prometheus_client import start_http_server
 from temporalio.client import Client
 from temporalio.worker import Worker
 
 # Import the activity and workflow from our other files
-from jobs.activities import embed_file
-from jobs.workflows import EmbedFilesWorkflow
+from jobs.activities import (
+    copy_chunks,
+    embed_file,
+    list_blob_paths,
+    list_unindexed_blob_paths,
+    plan_reindex,
+    switch_index_alias,
+    sync_chunks,
+    validate_reindex,
+)
+from jobs.converter import get_data_converter
+from jobs.workflows import EmbedFilesWorkflow, ReindexWorkflow
+from services.lanes import LANES, get_lane_depths, get_lane_queue
 from utils.config import get_config
+from utils.metrics import (
+    INGESTION_QUEUE_DEPTH,
+    WORKER_DISK_USAGE_RATIO,
+    WORKER_MEMORY_PEAK_BYTES,
+)
+from utils.tracing import get_temporal_interceptors, setup_tracing
+from utils.types import IngestionLane
 
+logger = logging.getLogger(__name__)
 
-async def main():
-    # Create client connected to server at the given address
-    client = await Client.connect(get_config().temporal_host)
+# The default queue runs the re-index workflows and the ingestions started before the lanes
+WORKER_QUEUES = ("default", *LANES)
+
+
+def create_worker(client: Client, queue: str, stack: contextlib.ExitStack) -> Worker:
+    """
+    Create the worker of a queue, with its own activity threads so a busy lane does not
+    take the threads of another.
 
-    # Run the worker
-    with concurrent.futures.ThreadPoolExecutor(max_workers=100) as activity_executor:
-        worker = Worker(
+    Args:
+        client (Client): The Temporal client.
+        queue (str): `default`, or the lane of the worker.
+        stack (contextlib.ExitStack): The stack shutting down the activity threads.
+
+    Returns:
+        (Worker): The worker.
+    """
+    config = get_config()
+    if queue == "default":
+        return Worker(
             client,
-            task_queue=get_config().temporal_queue,
-            workflows=[EmbedFilesWorkflow],
-            activities=[embed_file],
-            activity_executor=activity_executor,
+            task_queue=config.temporal_queue,
+            workflows=[EmbedFilesWorkflow, ReindexWorkflow],
+            activities=[
+                embed_file,
+                plan_reindex,
+                list_blob_paths,
+                list_unindexed_blob_paths,
+                copy_chunks,
+                sync_chunks,
+                validate_reindex,
+                switch_index_alias,
+            ],
+            activity_executor=stack.enter_context(
+                concurrent.futures.ThreadPoolExecutor(max_workers=100)
+            ),
+        )
+
+    lane: IngestionLane = "heavy" if queue == "heavy" else "fast"
+    concurrency = (
+        config.heavy_lane_concurrency
+        if lane == "heavy"
+        else config.fast_lane_concurrency
+    )
+    return Worker(
+        client,
+        task_queue=get_lane_queue(lane),
+        workflows=[EmbedFilesWorkflow],
+        activities=[embed_file],
+        activity_executor=stack.enter_context(
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        ),
+        max_concurrent_activities=concurrency,
+    )
+
+
+async def report_queue_depths(client: Client) -> None:
+    """
+    Periodically export the number of ingestions pending or running in every lane.
+
+    Args:
+        client (Client): The Temporal client.
+    """
+    while True:
+        try:
+            for lane, depth in (await get_lane_depths(client)).items():
+                INGESTION_QUEUE_DEPTH.labels(lane=lane).set(depth)
+        except Exception as error:
+            # The visibility store may be unavailable, the workers keep running
+            logger.warning("Could not count the ingestions by lane: %s", error)
+        await asyncio.sleep(get_config().queue_depth_interval)
+
+
+async def report_resource_usage() -> None:
+    """
+    Periodically export the peak memory of the worker and the usage of the disk holding its
+    temporary files, the spooled blobs and the page ranges of the large PDFs.
+    """
+    while True:
+        # The peak resident set size, in kilobytes on Linux
+        WORKER_MEMORY_PEAK_BYTES.set(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        )
+        try:
+            usage = shutil.disk_usage(get_config().spool_path or tempfile.gettempdir())
+            WORKER_DISK_USAGE_RATIO.set(usage.used / usage.total)
+        except OSError as error:
+            logger.warning("Could not read the disk usage: %s", error)
+        await asyncio.sleep(get_config().resource_report_interval)
+
+
+async def main(queues: list[str]):
+    # Create client connected to server at the given address
+    setup_tracing("rag-worker")
+    client = await Client.connect(
+        get_config().temporal_host,
+        interceptors=get_temporal_interceptors(),
+        data_converter=get_data_converter(),
+    )
+
+    # Expose the ingestion metrics, the worker runs in its own process
+    start_http_server(get_config().worker_metrics_port)
+
+    # Run the workers
+    with contextlib.ExitStack() as stack:
+        workers = [create_worker(client, queue, stack) for queue in queues]
+        for queue, worker in zip(queues, workers, strict=True):
+            print(f"Worker running on queue: {worker.task_queue} ({queue})")
+        await asyncio.gather(
+            *(worker.run() for worker in workers),
+            report_queue_depths(client),
+            report_resource_usage(),
         )
-        print(f"Worker running on queue: {get_config().temporal_queue}")
-        await worker.run()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Run the ingestion workers.")
+    parser.add_argument(
+        "--queues",
+        nargs="+",
+        choices=WORKER_QUEUES,
+        default=list(WORKER_QUEUES),
+        help="The queues to run a worker for, e.g. only `heavy` on the OCR machines",
+    )
+    asyncio.run(main(parser.parse_args().queues))
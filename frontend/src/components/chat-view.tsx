@@ -5,7 +5,8 @@ import { Send, FileText } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
 
 interface Source {
-  text: string;
+  text?: string;
+  snippet?: string;
   metadata: {
     filename: string;
     filetype: string;